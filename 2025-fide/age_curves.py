@@ -0,0 +1,100 @@
+"""
+Rating curves by age and by birth cohort, per country and gender.
+
+Two tables are built from the records that carry a birth year:
+
+    by_age:     country x gender x age            (age = year - birth_year)
+    by_cohort:  country x gender x cohort x year  (cohort = birth_year rounded down to cohort_size years)
+
+Both come from one grouped pass over the records. The records are reduced
+once to sparse rating histograms per country x gender x birth_year x year
+(rollup.Cuboid cells, so memory is bounded by the distinct ratings of each
+group, not by the number of records). Every table is then merged from
+those cells, including its rows for all countries and all genders. Each
+table is merged from the finest table already built, never from the
+records. Count, mean, median and quartiles are exact, with the rank
+convention of quantiles.py.
+
+Rows for all countries or all genders carry None in that key. Groups with
+fewer than min_count records are dropped from the export.
+"""
+
+import numpy as np
+
+from rollup import Cuboid, sorted_groups
+
+# Ages outside this range come from missing or implausible birth years
+AGE_RANGE = (5, 100)
+CURVE_PERCENTILES = (0.25, 0.75)
+BASE_KEYS = ('country', 'gender', 'birth_year', 'year')
+TABLE_KEYS = {
+    'by_age': ('age',),
+    'by_cohort': ('cohort', 'year')
+}
+STAT_COLUMNS = ('count', 'mean_rating', 'median_rating', 'p25_rating', 'p75_rating')
+
+
+def _merge(source, level, groups=None):
+    #Cuboid of `level` from a finer one: map every source group to its parent and add the counts
+    groups = source.groups if groups is None else groups
+    parent, parents = sorted_groups(groups[list(level)])
+    return Cuboid.from_cells(level, parents, parent[source.group], source.rating, source.count)
+
+
+class AgeCurves:
+    """Rating by age and by birth cohort x year, per country and gender, from one grouped pass."""
+
+    def __init__(self, cohort_size=10, min_count=5, age_range=AGE_RANGE):
+        if cohort_size < 1:
+            raise ValueError(f"cohort size must be at least 1, got {cohort_size}")
+        self.cohort_size = cohort_size
+        self.min_count = min_count
+        self.age_range = tuple(age_range)
+        self.base = None
+        self.records = 0
+        self.tables = {}
+
+    def build(self, store):
+        #Base cells from the records with an age in range, then both tables merged from them
+        frame = store.frame
+        low, high = self.age_range
+        valid = ((frame['age'] >= low) & (frame['age'] <= high)).fillna(False).to_numpy(dtype=bool)
+        keys = frame.loc[valid, list(BASE_KEYS)]
+        keys = keys.assign(birth_year=keys['birth_year'].to_numpy(dtype='int64'))
+        group, groups = sorted_groups(keys)
+        self.base = Cuboid.from_cells(BASE_KEYS, groups, group, frame['rating'].to_numpy()[valid], None)
+        self.records = int(valid.sum())
+
+        groups = self.base.groups.assign(age=self.base.groups['year'] - self.base.groups['birth_year'],
+                                         cohort=self.base.groups['birth_year'] // self.cohort_size * self.cohort_size)
+        self.tables = {name: self._table(groups, keys) for name, keys in TABLE_KEYS.items()}
+        return self
+
+    def _table(self, groups, keys):
+        #Rows of one table: country x gender, then all countries, all genders and both
+        full = _merge(self.base, ('country', 'gender') + keys, groups)
+        by_country = _merge(full, ('country',) + keys)
+        by_gender = _merge(full, ('gender',) + keys)
+        overall = _merge(by_gender, keys)
+        rows = []
+        for cuboid in (full, by_country, by_gender, overall):
+            for row in cuboid.stats(CURVE_PERCENTILES):
+                if row['count'] >= self.min_count:
+                    rows.append({'country': row.get('country'), 'gender': row.get('gender'),
+                                 **{key: row[key] for key in keys}, **{c: row[c] for c in STAT_COLUMNS}})
+        return rows
+
+    @property
+    def countries(self):
+        return sorted(self.base.groups['country'].unique().tolist()) if self.base is not None else []
+
+    def columns(self, name):
+        #One list per column of a table; countries as indexes into self.countries, means to 0.1 points
+        index = {country: i for i, country in enumerate(self.countries)}
+        rows = self.tables[name]
+        columns = {'country': [None if row['country'] is None else index[row['country']] for row in rows],
+                   'gender': [row['gender'] for row in rows]}
+        for key in TABLE_KEYS[name] + STAT_COLUMNS:
+            columns[key] = [row[key] for row in rows]
+        columns['mean_rating'] = np.round(columns['mean_rating'], 1).tolist()
+        return columns
@@ -0,0 +1,373 @@
+"""
+Exact, mergeable rating statistics per group.
+
+FIDE ratings are bounded integers, so every group keeps a fixed-size
+histogram of rating counts instead of the list of ratings itself. Count,
+mean, min, max, median and any percentile come out of the histogram
+exactly, memory per group does not depend on how many ratings it holds, and
+two partial aggregates (from different chunks or processes) merge by adding
+their histograms. The rank convention is the one of quantiles.py.
+
+AggregateState extends this with what incremental monthly updates need: the
+position of each group's first record, so group order and the top-N country
+cut can be re-derived after new rows are folded in.
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from quantiles import percentile_name, quantile_rank, rank_values
+
+RATING_MIN = 0
+RATING_MAX = 3500
+
+GROUP_KEYS = ('year', 'country', 'gender')
+
+
+class RatingBins:
+    """Fixed-width rating bins [min_rating, max_rating) for exported histograms."""
+
+    def __init__(self, bin_size=50, min_rating=800, max_rating=2800):
+        if bin_size <= 0 or max_rating <= min_rating or (max_rating - min_rating) % bin_size:
+            raise ValueError(f"rating range [{min_rating}, {max_rating}) must be a positive multiple of bin size {bin_size}")
+        self.bin_size = bin_size
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+
+    def __len__(self):
+        return (self.max_rating - self.min_rating) // self.bin_size
+
+    def metadata(self):
+        return {'bin_size': self.bin_size, 'min_rating': self.min_rating, 'max_rating': self.max_rating}
+
+
+class GroupAggregator:
+    """Rating histograms keyed by group, in order of first appearance.
+
+    Ratings outside [rating_min, rating_max] are clipped into the edge values
+    and counted in clipped, so one stray value does not stop a whole run.
+    """
+
+    def __init__(self, keys=GROUP_KEYS, rating_min=RATING_MIN, rating_max=RATING_MAX):
+        self.keys = tuple(keys)
+        self.rating_min = rating_min
+        self.rating_max = rating_max
+        self._groups = []
+        self._index = {}
+        self.clipped = 0
+        # int32 bins keep the per-group footprint at 4 bytes per rating value; sums use int64
+        self._hist = np.zeros((0, rating_max - rating_min + 1), dtype='int32')
+
+    @property
+    def width(self):
+        return self.rating_max - self.rating_min + 1
+
+    def __len__(self):
+        return len(self._groups)
+
+    def groups(self):
+        return list(self._groups)
+
+    def _rows_for(self, keys):
+        #Global histogram row for each key, registering unseen keys at the end
+        rows = np.empty(len(keys), dtype='int64')
+        for i, key in enumerate(keys):
+            row = self._index.get(key)
+            if row is None:
+                row = len(self._groups)
+                self._index[key] = row
+                self._groups.append(key)
+            rows[i] = row
+        if len(self._groups) > len(self._hist):
+            capacity = max(len(self._groups), 2 * len(self._hist))
+            grown = np.zeros((capacity, self.width), dtype='int32')
+            grown[:len(self._hist)] = self._hist
+            self._hist = grown
+        return rows
+
+    def add(self, key_columns, ratings):
+        #Fold one batch: key_columns is a list of equal-length arrays/Series, ratings are integers
+        self.add_with_groups(key_columns, ratings)
+        return self
+
+    def add_with_groups(self, key_columns, ratings):
+        #Like add(), but returns the group row of every record in the batch
+        ratings = np.asarray(ratings, dtype='int64')
+        if len(ratings) == 0:
+            return np.array([], dtype='int64')
+        outside = (ratings < self.rating_min) | (ratings > self.rating_max)
+        if outside.any():
+            self.clipped += int(outside.sum())
+            ratings = np.clip(ratings, self.rating_min, self.rating_max)
+        codes, uniques = pd.MultiIndex.from_arrays([pd.Series(c).reset_index(drop=True) for c in key_columns]).factorize()
+        keys = [tuple(_native(v) for v in key) for key in uniques]
+        local = np.bincount(codes * self.width + (ratings - self.rating_min),
+                            minlength=len(keys) * self.width).reshape(len(keys), self.width)
+        rows = self._rows_for(keys)
+        self._hist[rows] += local
+        return rows[codes]
+
+    def add_store(self, store):
+        #Fold every record of a RecordStore
+        return self.add([store[k] for k in self.keys], store['rating'].to_numpy())
+
+    def merge(self, other):
+        #Add another aggregator's partial histograms into this one
+        if other.keys != self.keys or (other.rating_min, other.rating_max) != (self.rating_min, self.rating_max):
+            raise ValueError("cannot merge aggregators with different keys or rating bounds")
+        if len(other):
+            rows = self._rows_for(other._groups)
+            self._hist[rows] += other._hist[:len(other)]
+        self.clipped += other.clipped
+        return self
+
+    def subset(self, rows):
+        #New aggregator holding only the given group rows, in that order
+        result = GroupAggregator(self.keys, self.rating_min, self.rating_max)
+        rows = np.asarray(rows, dtype='int64')
+        result._groups = [self._groups[r] for r in rows]
+        result._index = {key: i for i, key in enumerate(result._groups)}
+        result._hist = self._hist[rows].copy()
+        return result
+
+    def counts(self):
+        #Records per group, in group order
+        return self._hist[:len(self)].sum(axis=1, dtype='int64')
+
+    def histogram(self, key):
+        #Counts per rating value for one group (index 0 is rating_min)
+        return self._hist[self._index[key]].copy()
+
+    def binned(self, bins):
+        #(groups x len(bins)) counts per RatingBins bin; ratings outside the bins are left out
+        hist = self._hist[:len(self)]
+        dense = np.zeros((len(hist), len(bins) * bins.bin_size), dtype='int64')
+        lo = max(bins.min_rating, self.rating_min)
+        hi = min(bins.max_rating, self.rating_max + 1)
+        if lo < hi:
+            dense[:, lo - bins.min_rating:hi - bins.min_rating] = hist[:, lo - self.rating_min:hi - self.rating_min]
+        return dense.reshape(len(hist), len(bins), bins.bin_size).sum(axis=2)
+
+    def stats(self, percentiles=(), bins=None):
+        #One dict per group: keys, count, mean/median/min/max rating, requested percentiles and,
+        #with bins, a sparse histogram (hist_bins: non-empty bin indices, hist_counts: their counts)
+        hist = self._hist[:len(self)].astype('int64')
+        if not len(hist):
+            return []
+        values = np.arange(self.rating_min, self.rating_max + 1, dtype='int64')
+        counts = hist.sum(axis=1)
+        totals = hist @ values
+        cumulative = hist.cumsum(axis=1)
+        nonzero = hist > 0
+        mins = values[nonzero.argmax(axis=1)]
+        maxs = values[self.width - 1 - nonzero[:, ::-1].argmax(axis=1)]
+        medians = rank_values(cumulative, counts // 2, values)
+        extra = {f"{percentile_name(q)}_rating": rank_values(cumulative, quantile_rank(counts, q), values)
+                 for q in percentiles}
+        if bins is not None:
+            binned = self.binned(bins)
+            group, index = np.nonzero(binned)
+            starts = np.searchsorted(group, np.arange(len(binned) + 1))
+            index, binned_counts = index.tolist(), binned[group, index].tolist()
+
+        result = []
+        for i, key in enumerate(self._groups):
+            count = int(counts[i])
+            row = dict(zip(self.keys, key))
+            row.update({
+                'count': count,
+                'mean_rating': int(totals[i]) / count,
+                'median_rating': int(medians[i]),
+                'min_rating': int(mins[i]),
+                'max_rating': int(maxs[i])
+            })
+            for name, column in extra.items():
+                row[name] = int(column[i])
+            if bins is not None:
+                row['hist_bins'] = index[starts[i]:starts[i + 1]]
+                row['hist_counts'] = binned_counts[starts[i]:starts[i + 1]]
+            result.append(row)
+        return result
+
+
+def _native(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def group_index(stats):
+    """Lookup structures over a stats() list, keyed by str(year), country and gender.
+
+    by_year / by_country / by_year_gender hold row positions into the list;
+    country_trends holds, per country, one {year, avg, count} per year: the
+    unweighted mean of the groups' mean_rating (summed in list order, as
+    d3.mean does) and their total count. country_summary holds the same two
+    figures over all of a country's groups.
+    """
+    by_year, by_country, by_year_gender, trends, summary = {}, {}, {}, {}, {}
+    for row, group in enumerate(stats):
+        year, country = str(group['year']), group['country']
+        by_year.setdefault(year, []).append(row)
+        by_country.setdefault(country, []).append(row)
+        by_year_gender.setdefault(year, {}).setdefault(group['gender'], []).append(row)
+        trend = trends.setdefault(country, {}).setdefault(group['year'], [0.0, 0, 0])
+        trend[0] += group['mean_rating']
+        trend[1] += 1
+        trend[2] += group['count']
+        total = summary.setdefault(country, [0.0, 0, 0])
+        total[0] += group['mean_rating']
+        total[1] += 1
+        total[2] += group['count']
+
+    country_trends = {
+        country: [{'year': year, 'avg': total / n, 'count': count}
+                  for year, (total, n, count) in sorted(years.items())]
+        for country, years in trends.items()
+    }
+    country_summary = {country: {'avg': total / n, 'count': count} for country, (total, n, count) in summary.items()}
+    return {'by_year': by_year, 'by_country': by_country, 'by_year_gender': by_year_gender,
+            'country_trends': country_trends, 'country_summary': country_summary}
+
+
+def rating_extent(aggregated_list, bins=None):
+    #x-axis range the page derives from the whole export: edges of the non-empty bins, else mean ratings rounded to 50
+    with_bins = [g for g in aggregated_list if g.get('hist_bins')] if bins is not None else []
+    if with_bins:
+        return {'min': bins.min_rating + bins.bin_size * min(g['hist_bins'][0] for g in with_bins),
+                'max': bins.min_rating + bins.bin_size * max(g['hist_bins'][-1] for g in with_bins)}
+    if not aggregated_list:
+        return None
+    means = [g['mean_rating'] for g in aggregated_list]
+    return {'min': int(np.floor(min(means) / 50) * 50), 'max': int(np.ceil(max(means) / 50) * 50)}
+
+
+class AggregateState:
+    """Persistent year x country x gender histograms plus first-record positions.
+
+    Groups cover every country from start_year on. first_pos/first_seq locate
+    each group's first record in pd.merge(players, ratings) order: the players
+    row of the record, then a sequence number that follows ratings file order
+    within a player. New months are appended after everything seen so far.
+    months lists every month folded in, so a month is never counted twice.
+    """
+
+    VERSION = 2
+
+    def __init__(self, start_year, rating_min=400, rating_max=RATING_MAX):
+        self.start_year = start_year
+        self.aggregator = GroupAggregator(rating_min=rating_min, rating_max=rating_max)
+        self.first_pos = np.array([], dtype='int64')
+        self.first_seq = np.array([], dtype='int64')
+        self.next_seq = 0
+        self.years = set()
+        self.months = set()
+
+    @property
+    def last_month(self):
+        return max(self.months) if self.months else None
+
+    def check_months(self, months):
+        #Raise ValueError unless every month is newer than the last one folded in
+        months = sorted(set(months))
+        last = self.last_month
+        if last is not None and months and months[0] <= last:
+            folded = [m for m in months if m in self.months]
+            reason = f"already folded: {', '.join(folded)}" if folded else f"not after the last folded month {last}"
+            raise ValueError(f"month {months[0]} is {reason}")
+
+    def add_records(self, store, player_positions):
+        #Fold a RecordStore; player_positions gives each record's players.tsv row
+        if not len(store):
+            return self
+        rows = self.aggregator.add_with_groups([store[k] for k in self.aggregator.keys],
+                                               store['rating'].to_numpy())
+        seq = self.next_seq + np.arange(len(store), dtype='int64')
+        self.next_seq += len(store)
+        self.years.update(int(y) for y in store['year'].unique())
+        self.months.update(str(m) for m in store['month'].unique())
+
+        grown = len(self.aggregator) - len(self.first_pos)
+        sentinel = np.iinfo('int64').max
+        self.first_pos = np.concatenate([self.first_pos, np.full(grown, sentinel, dtype='int64')])
+        self.first_seq = np.concatenate([self.first_seq, np.full(grown, sentinel, dtype='int64')])
+
+        order = np.lexsort((seq, player_positions))
+        groups, first = np.unique(rows[order], return_index=True)
+        pos = player_positions[order][first]
+        seq = seq[order][first]
+        better = (pos < self.first_pos[groups]) | ((pos == self.first_pos[groups]) & (seq < self.first_seq[groups]))
+        self.first_pos[groups[better]] = pos[better]
+        self.first_seq[groups[better]] = seq[better]
+        return self
+
+    def select(self, top_countries=30):
+        #Groups of the top-N countries in first-appearance order; returns (aggregator, country names)
+        keys = self.aggregator.groups()
+        if not keys:
+            return self.aggregator.subset([]), []
+        order = np.lexsort((self.first_seq, self.first_pos))
+        rank = np.empty(len(order), dtype='int64')
+        rank[order] = np.arange(len(order))
+
+        groups = pd.DataFrame({
+            'country': [k[1] for k in keys],
+            'count': self.aggregator.counts(),
+            'rank': rank
+        })
+        per_country = groups.groupby('country', sort=False).agg(count=('count', 'sum'), first=('rank', 'min'))
+        per_country = per_country.sort_values(['count', 'first'], ascending=[False, True])
+        top = set(per_country.index[:top_countries])
+
+        kept = [row for row in order if keys[row][1] in top]
+        return self.aggregator.subset(kept), sorted(top)
+
+    def save(self, path):
+        #Written to a temporary file next to path and renamed over it, so path is never half-written
+        keys = self.aggregator.groups()
+        meta = {
+            'version': self.VERSION,
+            'start_year': self.start_year,
+            'rating_min': self.aggregator.rating_min,
+            'rating_max': self.aggregator.rating_max,
+            'next_seq': self.next_seq,
+            'years': sorted(self.years),
+            'months': sorted(self.months)
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    meta=np.array(json.dumps(meta)),
+                    year=np.array([k[0] for k in keys], dtype='int64'),
+                    country=np.array([k[1] for k in keys], dtype=str),
+                    gender=np.array([k[2] for k in keys], dtype=str),
+                    hist=self.aggregator._hist[:len(keys)],
+                    first_pos=self.first_pos,
+                    first_seq=self.first_seq
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != cls.VERSION:
+                raise ValueError(f"{path}: unsupported aggregate state version {meta.get('version')} "
+                                 f"(save it again with data_processor.py --save-state)")
+            state = cls(meta['start_year'], meta['rating_min'], meta['rating_max'])
+            keys = list(zip(data['year'].tolist(), data['country'].tolist(), data['gender'].tolist()))
+            state.aggregator._rows_for(keys)
+            state.aggregator._hist[:len(keys)] = data['hist']
+            state.first_pos = data['first_pos']
+            state.first_seq = data['first_seq']
+        state.next_seq = meta['next_seq']
+        state.years = set(meta['years'])
+        state.months = set(meta['months'])
+        return state
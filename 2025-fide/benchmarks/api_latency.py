@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint latency of the query API (run_visualization.py --api).
+
+Builds the queries the page sends (one histogram per year and gender, one
+trend per country) plus group listings, then times every endpoint twice:
+in-process against a QueryStore (compute only, result cache disabled) and
+over HTTP against run_visualization.py in a subprocess, where the first pass
+fills the server's LRU cache (miss) and later passes are answered from it
+(hit). Reports p50 and p99 milliseconds and the mean response size.
+
+    python benchmarks/api_latency.py --export viz/chess_data_aggregated.json --rounds 5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from query_api import QueryStore, default_export
+from serve_load import ROOT, free_port, start_server
+
+
+def page_queries(store):
+    #Endpoint -> request paths, the mix the page and a dashboard would send
+    years = sorted(store.rows['year'])
+    countries = sorted(store.rows['country'])
+    q = lambda endpoint, **params: f"/api/{endpoint}?{urllib.parse.urlencode(params)}"
+    return {
+        'meta': ['/api/meta'],
+        'histogram': [q('histogram', year=y) for y in years]
+                     + [q('histogram', year=y, gender=g) for y in years for g in ('M', 'F')],
+        'country': [q('country', country=c) for c in countries],
+        'groups': [q('groups', year=y, fields='country,gender,count,mean_rating') for y in years]
+                  + [q('groups', country=c) for c in countries],
+    }
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+    return pick(0.50), pick(0.99)
+
+
+def time_in_process(store, paths, rounds):
+    samples, size = [], 0
+    for _ in range(rounds):
+        for path in paths:
+            started = time.perf_counter()
+            status, body, _ = store.respond(path)
+            samples.append(time.perf_counter() - started)
+            size += len(body)
+    return samples, size / len(samples)
+
+
+def time_http(connection, paths):
+    samples, size, cached = [], 0, 0
+    for path in paths:
+        started = time.perf_counter()
+        connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+        response = connection.getresponse()
+        body = response.read()
+        samples.append(time.perf_counter() - started)
+        size += len(body)
+        cached += response.getheader('X-Cache') == 'hit'
+    return samples, size / len(samples), cached
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--export', default=None, help='aggregated export (default: viz/chess_data_aggregated.bin or .json)')
+    parser.add_argument('--rounds', type=int, default=5, help='passes over the query list (first HTTP pass misses)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    export = os.path.abspath(args.export or default_export(os.path.join(ROOT, 'viz')))
+    started = time.perf_counter()
+    store = QueryStore.load(export, cache_size=0)
+    print(f"{len(store.groups):,} groups from {export} indexed in {time.perf_counter() - started:.3f}s")
+    queries = page_queries(store)
+
+    port = free_port()
+    process = start_server('threaded', port, ['--api', export, '--api-cache-size', str(sum(map(len, queries.values())))])
+    connection = http.client.HTTPConnection('localhost', port, timeout=30)
+    print(f"{'endpoint':>10} {'queries':>8} {'compute p50/p99 ms':>19} {'http miss p50/p99':>18} "
+          f"{'http hit p50/p99':>17} {'bytes':>8}")
+    results = []
+    try:
+        for endpoint, paths in queries.items():
+            compute, size = time_in_process(store, paths, args.rounds)
+            miss, _, _ = time_http(connection, paths)
+            hit, wire, cached = [], 0, 0
+            for _ in range(max(1, args.rounds - 1)):
+                samples, wire, n = time_http(connection, paths)
+                hit.extend(samples)
+                cached += n
+            row = {'endpoint': endpoint, 'queries': len(paths), 'bytes': size, 'wire_bytes': wire,
+                   'compute_ms': percentiles(compute), 'http_miss_ms': percentiles(miss),
+                   'http_hit_ms': percentiles(hit), 'hit_ratio': cached / len(hit)}
+            print(f"{endpoint:>10} {len(paths):>8} {row['compute_ms'][0]:>9.3f}/{row['compute_ms'][1]:<9.3f} "
+                  f"{row['http_miss_ms'][0]:>8.3f}/{row['http_miss_ms'][1]:<9.3f} "
+                  f"{row['http_hit_ms'][0]:>7.3f}/{row['http_hit_ms'][1]:<9.3f} {size:>8,.0f}")
+            results.append(row)
+    finally:
+        connection.close()
+        process.terminate()
+        process.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'export': export, 'groups': len(store.groups), 'rounds': args.rounds, 'endpoints': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
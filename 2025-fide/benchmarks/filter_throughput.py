@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for data/filter.py.
+
+Compares the original extractor (one players.tsv scan and one full
+ratings.tsv pass per subset, one print() per kept line; reproduced in
+legacy_subset below) with the current script:
+
+- batch: every subset of --specs written by one `filter.py -b` run;
+- indexed: each small subset alone with `filter.py -i`, which reads only
+  the byte ranges of the kept players (index built once beforehand).
+
+Outputs are written to a scratch directory and compared byte for byte with
+the legacy ones. Times for filter.py include interpreter start-up.
+
+    python benchmarks/filter_throughput.py --data-dir data
+"""
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from country_lookup import CountryLookup
+
+FILTER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'filter.py')
+
+DEFAULT_SPECS = [
+    'all',
+    'europe -r Europe',
+    'fra -c FRA',
+    'ind -c IND',
+    'elite -e 2200-',
+    'women -g F',
+    'juniors -y 2005-',
+    'fra-women -c FRA -g F -e 1500-',
+]
+
+
+def legacy_subset(spec, suffix, lookup):
+    #The pre-batch filter.py loop for one subset, as it was
+    country, feds = spec.get('country', ''), None
+    if spec.get('region'):
+        feds = lookup.in_region(spec['region'])
+    min_elo, max_elo = spec.get('min_elo', 1000), spec.get('max_elo', 3000)
+    gender = spec.get('gender', '')
+    min_year, max_year = spec.get('min_year', 1900), spec.get('max_year', 2025)
+
+    players_id = set()
+    players_i = open('players.tsv')
+    players_o = open('players-%s.tsv' % suffix, 'w')
+    headers = next(players_i)
+    print(headers, end='', file=players_o)
+    for line in players_i:
+        pid, name, fed, sex, birthyear, max_rating, month = line.strip().split('\t')
+        if country and fed != country:
+            continue
+        if feds is not None and fed.upper() not in feds:
+            continue
+        if not min_elo <= int(max_rating) <= max_elo:
+            continue
+        if gender and sex != gender:
+            continue
+        if not min_year <= int(birthyear) <= max_year:
+            continue
+        print(pid, name, fed, sex, birthyear, max_rating, month, sep='\t', file=players_o)
+        players_id.add(pid)
+
+    ratings_i = open('ratings.tsv')
+    ratings_o = open('ratings-%s.tsv' % suffix, 'w')
+    headers = next(ratings_i)
+    print(headers, end='', file=ratings_o)
+    for line in ratings_i:
+        pid, month, rating, games = line.strip().split('\t')
+        if pid not in players_id:
+            continue
+        print(pid, month, rating, games, sep='\t', file=ratings_o)
+    for f in (players_i, players_o, ratings_i, ratings_o):
+        f.close()
+    return len(players_id)
+
+
+def parse_spec(text):
+    #'suffix -c FRA -e 2000-' -> (suffix, spec dict) for legacy_subset
+    words = shlex.split(text)
+    suffix, spec = words[0], {}
+    options = dict(zip(words[1::2], words[2::2]))
+    for opt, value in options.items():
+        if opt == '-c':
+            spec['country'] = value
+        elif opt == '-r':
+            spec['region'] = value
+        elif opt == '-g':
+            spec['gender'] = value
+        elif opt in ('-e', '-y'):
+            low, high = value.replace('+', '-').split('-')
+            names = ('min_elo', 'max_elo') if opt == '-e' else ('min_year', 'max_year')
+            defaults = (1000, 3000) if opt == '-e' else (1900, 2025)
+            spec[names[0]], spec[names[1]] = int(low or defaults[0]), int(high or defaults[1])
+    return suffix, spec
+
+
+def run_filter(args):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, FILTER] + args, check=True, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def same_outputs(suffix, legacy_suffix):
+    return all(open(f'{table}-{suffix}.tsv', 'rb').read() == open(f'{table}-{legacy_suffix}.tsv', 'rb').read()
+               for table in ('players', 'ratings'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', default='./data')
+    parser.add_argument('--specs', nargs='+', default=DEFAULT_SPECS, help='"<suffix> [filter.py options]" per subset')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.abspath(args.data_dir)
+    ratings_mb = os.path.getsize(os.path.join(data_dir, 'ratings.tsv')) / 1024 / 1024
+    lookup = CountryLookup.load(data_dir)
+    specs = [parse_spec(s) for s in args.specs]
+    workdir = tempfile.mkdtemp(prefix='filter-bench-')
+    cwd = os.getcwd()
+    try:
+        for name in ('players.tsv', 'ratings.tsv', 'countries.tsv', 'iso3.tsv'):
+            if os.path.exists(os.path.join(data_dir, name)):
+                os.symlink(os.path.join(data_dir, name), os.path.join(workdir, name))
+        os.chdir(workdir)
+        print(f"ratings.tsv: {ratings_mb:.1f} MB, {len(specs)} subset(s)")
+
+        legacy = {}
+        for suffix, spec in specs:
+            started = time.perf_counter()
+            players = legacy_subset(spec, 'legacy-' + suffix, lookup)
+            legacy[suffix] = (time.perf_counter() - started, players)
+        legacy_total = sum(seconds for seconds, _ in legacy.values())
+
+        with open('specs.txt', 'w') as f:
+            f.write('\n'.join(args.specs) + '\n')
+        batch_seconds = run_filter(['-b', 'specs.txt'])
+        batch_same = all(same_outputs(suffix, 'legacy-' + suffix) for suffix, _ in specs)
+
+        print(f"\n{'mode':<24} {'seconds':>8} {'MB/s':>8}  identical")
+        print(f"{'legacy, one per subset':<24} {legacy_total:>8.2f} {ratings_mb * len(specs) / legacy_total:>8.1f}")
+        print(f"{'filter.py -b (batch)':<24} {batch_seconds:>8.2f} {ratings_mb * len(specs) / batch_seconds:>8.1f}  "
+              f"{'yes' if batch_same else 'NO'}")
+        results = {'ratings_mb': ratings_mb, 'subsets': len(specs), 'legacy_seconds': legacy_total,
+                   'batch_seconds': batch_seconds, 'batch_identical': batch_same, 'indexed': []}
+
+        index_seconds = run_filter(['-i', 'index-warmup'])
+        print(f"\nindex build (first -i run, full pass): {index_seconds:.2f}s")
+        print(f"{'subset':<12} {'players':>8} {'legacy s':>9} {'-i s':>8}  identical")
+        for (suffix, spec), text in zip(specs, args.specs):
+            seconds = run_filter(['-i'] + shlex.split(text)[1:] + ['indexed-' + suffix])
+            same = same_outputs('indexed-' + suffix, 'legacy-' + suffix)
+            print(f"{suffix:<12} {legacy[suffix][1]:>8,} {legacy[suffix][0]:>9.2f} {seconds:>8.2f}  {'yes' if same else 'NO'}")
+            results['indexed'].append({'subset': suffix, 'players': legacy[suffix][1], 'legacy_seconds': legacy[suffix][0],
+                                       'indexed_seconds': seconds, 'identical': same})
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
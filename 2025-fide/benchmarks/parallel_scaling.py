@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for FIDEDataProcessor's multi-process mode.
+
+Runs load + process_data + the default filter chain + aggregation with
+1, 2, 4 and 8 workers (or --workers), reports wall time and speedup over
+one worker, and checks that every run produces the same records and
+aggregated groups as the serial run.
+
+    python benchmarks/parallel_scaling.py --data-dir data --workers 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processor import FIDEDataProcessor
+from filter_pipeline import FilterPipeline
+
+
+def run_once(data_dir, workers, chunksize):
+    processor = FIDEDataProcessor(data_dir=data_dir, chunksize=chunksize, workers=workers)
+    pipeline = FilterPipeline().year_range(start_year=2010).top_countries(n=30)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not processor.load_tsv_files() or not processor.process_data(pipeline=pipeline):
+            raise SystemExit(f"processing failed with {workers} worker(s)")
+        pipeline.apply(processor)
+        groups = processor.aggregate().stats()
+    elapsed = time.perf_counter() - start
+    return elapsed, processor, groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', default='./data')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1, help='keep the best of N runs per worker count')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    print(f"CPU cores available: {os.cpu_count()}")
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'records':>12}  identical")
+
+    results = []
+    baseline = None
+    for workers in args.workers:
+        best = None
+        for _ in range(args.repeat):
+            elapsed, processor, groups = run_once(args.data_dir, workers, args.chunksize)
+            best = elapsed if best is None else min(best, elapsed)
+        frame = processor.all_data.frame
+        if baseline is None:
+            baseline = (best, frame, groups)
+        identical = frame.equals(baseline[1]) and groups == baseline[2]
+        speedup = baseline[0] / best
+        print(f"{workers:>8} {best:>9.2f} {speedup:>7.2f}x {len(frame):>12,}  {'yes' if identical else 'NO'}")
+        results.append({'workers': workers, 'seconds': best, 'speedup': speedup,
+                        'records': len(frame), 'identical': identical})
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'data_dir': args.data_dir, 'cpu_count': os.cpu_count(), 'runs': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Stage-by-stage benchmark of FIDEDataProcessor on synthetic data.
+
+For each --rows size, generates a FIDE-like data directory with
+synthetic_data.py (or reuses one under --data-root, or uses --data-dir as
+is) and runs the processor's stages one at a time in a fresh Python process:
+
+    load_tsv_files, process_data, filter_by_year_range, filter_top_countries,
+    sample_by_rating, validate_data, aggregate, export_to_json,
+    export_aggregated_json, export_columnar, export_aggregated_columnar
+
+Every stage records wall time, records in and out, throughput, resident
+memory after the stage and the process peak RSS so far (one process per
+size, so peaks do not leak from one size to the next). The JSON report
+carries the git commit and library versions; --compare prints the ratio of
+each stage against an earlier report.
+
+    python benchmarks/pipeline_stages.py --rows 100k 1M 10M --json bench-main.json
+    python benchmarks/pipeline_stages.py --rows 100k 1M 10M --compare bench-main.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from instrumentation import Instrumentation, peak_rss_mb, rss_mb
+from synthetic_data import ROOT, generate, parse_size
+
+STAGES = ['load_tsv_files', 'process_data', 'filter_by_year_range', 'filter_top_countries', 'sample_by_rating',
+          'validate_data', 'aggregate', 'export_to_json', 'export_aggregated_json', 'export_columnar',
+          'export_aggregated_columnar']
+
+
+def git_commit():
+    #'abc1234' (with '+dirty' for uncommitted changes), or None outside a git checkout
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('+dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(data_dir, options, log):
+    #Run every stage in this process, in a scratch output directory; returns the per-stage rows
+    from data_processor import FIDEDataProcessor
+    from aggregation import RatingBins
+
+    # The processor's own instrumentation adds the sub-stages (merge, records, chunks, ...)
+    instrumentation = Instrumentation(enabled=True)
+    processor = FIDEDataProcessor(data_dir=data_dir, chunksize=options['chunksize'], workers=options['workers'],
+                                  cache_dir=options['cache_dir'], instrumentation=instrumentation)
+    state = {}
+    actions = {
+        'load_tsv_files': processor.load_tsv_files,
+        'process_data': lambda: processor.process_data(engine=options['engine'], join=options['join']),
+        'filter_by_year_range': lambda: processor.filter_by_year_range(options['start_year']),
+        'filter_top_countries': lambda: processor.filter_top_countries(options['top_countries']),
+        'sample_by_rating': lambda: processor.sample_by_rating(options['min_rating']),
+        'validate_data': processor.validate_data,
+        'aggregate': lambda: state.setdefault('aggregator', processor.aggregate()),
+        'export_to_json': lambda: processor.export_to_json('chess_data.json'),
+        'export_aggregated_json': lambda: processor.export_aggregated_json(
+            'chess_data_aggregated.json', state['aggregator'], RatingBins()),
+        'export_columnar': lambda: processor.export_columnar('chess_data.bin'),
+        'export_aggregated_columnar': lambda: processor.export_aggregated_columnar(
+            'chess_data_aggregated.bin', state['aggregator'], RatingBins())
+    }
+
+    rows = []
+    baseline = rss_mb()
+    for stage in STAGES:
+        rows_in = len(processor.all_data)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            result = actions[stage]()
+        seconds = time.perf_counter() - started
+        if result is False:
+            raise SystemExit(f"{stage} failed on {data_dir}; see the processor log")
+        rows_out = len(processor.all_data)
+        if stage == 'load_tsv_files':
+            rows_in = rows_out = len(processor.ratings_df) if processor.ratings_df is not None else 0
+        elif stage == 'process_data':
+            rows_in = len(processor.ratings_df) if processor.ratings_df is not None else None
+        row = {'stage': stage, 'seconds': seconds, 'rows_in': rows_in, 'rows_out': rows_out,
+               'rows_per_second': rows_in / seconds if rows_in and seconds > 0 else None,
+               'rss_mb': rss_mb(), 'peak_rss_mb': peak_rss_mb()}
+        if isinstance(result, str) and os.path.isfile(result):
+            row['output_mb'] = os.path.getsize(result) / 1024 / 1024
+        rows.append(row)
+    substages = [s for s in instrumentation.stages if s['depth'] > 0]
+    return {'baseline_rss_mb': baseline, 'stages': rows, 'substages': substages}
+
+
+def child_main(data_dir, options_json, report):
+    #Entry point of the per-size subprocess
+    options = json.loads(options_json)
+    workdir = tempfile.mkdtemp(prefix='pipeline-bench-')
+    cwd = os.getcwd()
+    log = io.StringIO()
+    try:
+        os.chdir(workdir)
+        result = run_stages(os.path.abspath(os.path.join(cwd, data_dir)), options, log)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    if options.get('log'):
+        with open(options['log'], 'a', encoding='utf-8') as f:
+            f.write(log.getvalue())
+    with open(report, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def measure(data_dir, options):
+    #run_stages in a fresh interpreter, so the peak RSS is this run's alone
+    fd, report = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', data_dir, json.dumps(options), report],
+                       check=True)
+        with open(report, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(report)
+
+
+def dataset(rows, args, scratch):
+    #(data directory, generator summary or None) for one --rows size
+    if args.data_dir:
+        return args.data_dir, None
+    root = args.data_root or scratch
+    data_dir = os.path.join(root, f"rows-{rows}{'-shuffled' if args.shuffle else ''}-seed{args.seed}")
+    if args.data_root and all(os.path.exists(os.path.join(data_dir, n)) for n in ('players.tsv', 'ratings.tsv')):
+        return data_dir, None
+    print(f"Generating {rows:,} rating rows in {data_dir}...")
+    return data_dir, generate(data_dir, rows, seed=args.seed, shuffle=args.shuffle)
+
+
+def print_run(run, previous=None):
+    label = f"{run['rows']:,} rating rows" if run['rows'] else run['data_dir']
+    print(f"\n{label}: {run['total_seconds']:.2f}s, peak RSS "
+          + (f"{run['peak_rss_mb']:.0f} MB" if run['peak_rss_mb'] is not None else "n/a"))
+    old = {s['stage']: s for s in previous['stages']} if previous else {}
+    print(f"{'stage':<28} {'seconds':>8} {'rows in':>12} {'rows/s':>12} {'RSS MB':>8} {'peak MB':>8}"
+          + (f" {'before':>8} {'ratio':>6}" if previous else ''))
+    for s in run['stages']:
+        line = (f"{s['stage']:<28} {s['seconds']:>8.3f} {s['rows_in'] or 0:>12,} {s['rows_per_second'] or 0:>12,.0f} "
+                f"{s['rss_mb'] or 0:>8.0f} {s['peak_rss_mb'] or 0:>8.0f}")
+        if s['stage'] in old:
+            before = old[s['stage']]['seconds']
+            line += f" {before:>8.3f} {s['seconds'] / before if before else 0:>5.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['--child']:
+        return child_main(*argv[1:])
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, nargs='+', default=[parse_size('100k'), parse_size('1M')],
+                        help='synthetic sizes in rating rows, e.g. 10k 1M 100M (default 100k 1M)')
+    parser.add_argument('--data-dir', default=None, help='benchmark this data directory instead of generating one')
+    parser.add_argument('--data-root', default=None,
+                        help='keep generated data sets here and reuse them on later runs (default: temporary)')
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--shuffle', action='store_true', help='generate ratings not grouped by player')
+    parser.add_argument('--engine', choices=['vectorized', 'rows'], default='vectorized')
+    parser.add_argument('--join', choices=['auto', 'runs', 'hash'], default='auto')
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--cache-dir', default=None, help='parsed-input cache (default: none, always parse)')
+    parser.add_argument('--start-year', type=int, default=2010)
+    parser.add_argument('--top-countries', type=int, default=30)
+    parser.add_argument('--min-rating', type=int, default=1000)
+    parser.add_argument('--log', default=None, help='append the processor output to this file')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', default=None, help='earlier report to compare stage times against')
+    args = parser.parse_args(argv)
+
+    options = {'engine': args.engine, 'join': args.join, 'chunksize': args.chunksize, 'workers': args.workers,
+               'cache_dir': args.cache_dir, 'start_year': args.start_year, 'top_countries': args.top_countries,
+               'min_rating': args.min_rating, 'log': os.path.abspath(args.log) if args.log else None}
+    previous = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            earlier = json.load(f)
+        previous = {run['rows']: run for run in earlier['runs']}
+        print(f"Comparing with {args.compare} (commit {earlier.get('commit') or 'unknown'})")
+
+    import numpy
+    import pandas
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': {k: v for k, v in options.items() if k != 'log'},
+        'runs': []
+    }
+    scratch = tempfile.mkdtemp(prefix='pipeline-data-')
+    try:
+        for rows in ([None] if args.data_dir else args.rows):
+            data_dir, generated = dataset(rows, args, scratch)
+            result = measure(data_dir, options)
+            stages = result['stages']
+            run = {
+                'rows': rows if rows is not None else stages[0]['rows_in'],
+                'data_dir': data_dir,
+                'ratings_mb': os.path.getsize(os.path.join(data_dir, 'ratings.tsv')) / 1024 / 1024,
+                'generated': generated,
+                'baseline_rss_mb': result['baseline_rss_mb'],
+                'total_seconds': sum(s['seconds'] for s in stages),
+                'peak_rss_mb': stages[-1]['peak_rss_mb'],
+                'stages': stages,
+                'substages': result['substages']
+            }
+            report['runs'].append(run)
+            print_run(run, previous.get(run['rows']))
+            if not args.data_root and not args.data_dir:
+                shutil.rmtree(data_dir)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report written to {args.json}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
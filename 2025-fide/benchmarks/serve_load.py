@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Load test for the visualization server (run_visualization.py).
+
+Starts the server in a subprocess, once per mode ('simple' is the old
+single-threaded HTTPServer, 'threaded' the caching server), then has
+--clients concurrent clients fetch the page, the aggregated data and D3 for
+--seconds each. Every mode is measured twice: 'cold' requests carry no
+validators, 'revalidate' requests send the ETag / Last-Modified of the first
+answer, as a browser reload does. Reports requests/s, p50 and p99 latency
+and the bytes on the wire.
+
+    python benchmarks/serve_load.py --clients 8 --seconds 5
+    python benchmarks/serve_load.py --url http://analytics-host:8000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = [
+    '/viz/chess_visualization.html',
+    '/viz/chess_data_aggregated.json',
+    '/vendor/d3-7.8.5/dist/d3.js',
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, extra=()):
+    #run_visualization.py in a subprocess, so client and server threads do not share one interpreter
+    command = [sys.executable, os.path.join(ROOT, 'run_visualization.py'), '--no-browser', '--port', str(port)]
+    if mode == 'simple':
+        command.append('--simple')
+    command.extend(extra)
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=0.2).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise SystemExit(f"{mode} server exited with code {process.returncode}")
+            time.sleep(0.05)
+    process.kill()
+    raise SystemExit(f"{mode} server did not start on port {port}")
+
+
+def fetch(connection, path, headers):
+    #(status, body bytes, response headers, connection to reuse or None)
+    connection.request('GET', path, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, len(body), response, (None if response.will_close else connection)
+
+
+def validators(host, port, paths):
+    #Per path, the conditional headers a browser would send on reload
+    conditional = {}
+    for path in paths:
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        _, _, response, _ = fetch(connection, path, {'Accept-Encoding': 'gzip'})
+        connection.close()
+        headers = {'Accept-Encoding': 'gzip'}
+        if response.getheader('ETag'):
+            headers['If-None-Match'] = response.getheader('ETag')
+        if response.getheader('Last-Modified'):
+            headers['If-Modified-Since'] = response.getheader('Last-Modified')
+        conditional[path] = headers
+    return conditional
+
+
+def run_load(host, port, paths, clients, seconds, conditional=None):
+    latencies, statuses, transferred = [], {}, [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def client(offset):
+        connection, local, sent, i = None, [], 0, offset
+        seen = {}
+        while time.perf_counter() < stop:
+            path = paths[i % len(paths)]
+            i += 1
+            headers = conditional[path] if conditional else {'Accept-Encoding': 'gzip'}
+            started = time.perf_counter()
+            if connection is None:
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+            try:
+                status, size, _, connection = fetch(connection, path, headers)
+            except (OSError, http.client.HTTPException):
+                connection, status, size = None, 'error', 0
+            local.append(time.perf_counter() - started)
+            seen[status] = seen.get(status, 0) + 1
+            sent += size
+        with lock:
+            latencies.extend(local)
+            transferred[0] += sent
+            for status, n in seen.items():
+                statuses[status] = statuses.get(status, 0) + n
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {'requests': len(latencies), 'seconds': elapsed, 'rps': len(latencies) / elapsed,
+            'p50_ms': pick(0.50), 'p99_ms': pick(0.99), 'mb': transferred[0] / 1024 / 1024,
+            'statuses': {str(k): v for k, v in sorted(statuses.items(), key=str)}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=['simple', 'threaded'], default=['simple', 'threaded'])
+    parser.add_argument('--url', help='measure an already running server instead of starting one')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--paths', nargs='+', default=PATHS)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    targets = [(args.url, None)] if args.url else [(mode, mode) for mode in args.modes]
+    print(f"{args.clients} client(s), {args.seconds:g}s per run, paths: {', '.join(args.paths)}")
+    print(f"{'server':>10} {'run':>11} {'requests':>10} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'MB sent':>9}  statuses")
+
+    results = []
+    for label, mode in targets:
+        process = None
+        if mode is None:
+            url = urllib.parse.urlsplit(label)
+            host, port = url.hostname, url.port or 80
+            label = 'url'
+        else:
+            host, port = 'localhost', free_port()
+            process = start_server(mode, port)
+        try:
+            runs = [('cold', None), ('revalidate', validators(host, port, args.paths))]
+            for kind, conditional in runs:
+                result = run_load(host, port, args.paths, args.clients, args.seconds, conditional)
+                result.update(server=label, run=kind)
+                statuses = ' '.join(f"{k}:{v}" for k, v in result['statuses'].items())
+                print(f"{label:>10} {kind:>11} {result['requests']:>10,} {result['rps']:>9.0f} "
+                      f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['mb']:>9.1f}  {statuses}")
+                results.append(result)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'clients': args.clients, 'seconds': args.seconds, 'paths': args.paths, 'runs': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
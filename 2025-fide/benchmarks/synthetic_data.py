@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Synthetic FIDE-like input for benchmarks.
+
+Writes players.tsv and ratings.tsv with the headers data/filter.py asserts,
+plus copies of the repository's countries.tsv and iso3.tsv, at any size from
+a few thousand to 100M+ rating rows. Players are generated in blocks, so
+memory stays bounded by --block whatever the target size.
+
+The distributions follow the shape of the real export rather than its exact
+values:
+
+- federations are Zipf-skewed (a few dozen federations hold most players),
+  with a handful of FIDE-flagged players;
+- about 11% of players are women; birth years centre on the late 1980s and
+  about 1% are unknown (0);
+- rated months per player are log-normal: most players have a few lists,
+  a long tail has hundreds. Each player's months are consecutive and end at
+  or before 2025-12;
+- ratings follow a per-player random walk with drift between 1000 and 2880,
+  games per month are Poisson with a per-player rate (many zeros).
+
+ratings.tsv keeps each player's months together in ascending id order, like
+FIDE's export; --shuffle mixes the rows of each block to exercise the
+non-grouped code paths.
+
+    python benchmarks/synthetic_data.py --rows 10M --out data/synthetic
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLAYERS_HEADER = "#id\tname\tfed\tsex\tbirthyear\tmax_rating\tmonth\n"
+RATINGS_HEADER = "#id\tmonth\trating\tgames\n"
+
+FIRST_YEAR, LAST_YEAR = 2000, 2025
+MONTHS = np.array([f"{y}-{m:02d}" for y in range(FIRST_YEAR, LAST_YEAR + 1) for m in range(1, 13)], dtype=object)
+
+# Largest federations by rated players, most first; the rest of countries.tsv follows in file order
+LEADING_FEDERATIONS = ['GER', 'RUS', 'IND', 'FRA', 'ESP', 'ITA', 'POL', 'USA', 'CZE', 'NED', 'TUR', 'IRI',
+                       'UKR', 'HUN', 'ARG', 'SRB', 'BRA', 'AUT', 'SUI', 'BEL', 'ENG', 'GRE', 'CRO', 'SWE',
+                       'SVK', 'COL', 'PER', 'CHI', 'MEX', 'DEN', 'CHN', 'NOR', 'ISR', 'BAN', 'SLO', 'ROU']
+FIDE_FLAG = 'FID'
+FIDE_FLAG_SHARE = 0.002
+
+SURNAMES = np.array(['Smith', 'Muller', 'Ivanov', 'Kumar', 'Garcia', 'Rossi', 'Nowak', 'Martin', 'Novak',
+                     'de Jong', 'Yilmaz', 'Hosseini', 'Kovalenko', 'Nagy', 'Fernandez', 'Petrovic',
+                     'Silva', 'Gruber', 'Meier', 'Peeters', 'Jones', 'Papadopoulos', 'Horvat',
+                     'Andersson', 'Wang', 'Hansen', 'Cohen', 'Rahman', 'Popescu', 'Kim'], dtype=object)
+GIVEN = np.array(['A.', 'B.', 'C.', 'D.', 'E.', 'F.', 'G.', 'H.', 'I.', 'J.', 'K.', 'L.', 'M.', 'N.',
+                  'O.', 'P.', 'R.', 'S.', 'T.', 'V.'], dtype=object)
+
+
+def parse_size(text):
+    #'250k', '10M', '1_000_000' -> int
+    text = text.strip().replace('_', '')
+    scale = {'k': 10**3, 'm': 10**6, 'g': 10**9}.get(text[-1:].lower(), 1)
+    number = text[:-1] if scale > 1 else text
+    try:
+        return int(float(number) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a size: {text!r} (examples: 50000, 250k, 10M)")
+
+
+def federation_weights(reference_dir):
+    #(codes, probabilities): Zipf over the federations of countries.tsv, plus a sliver of FIDE-flagged players
+    countries = pd.read_csv(os.path.join(reference_dir, 'countries.tsv'), sep='\t', dtype=str)
+    known = [c for c in countries['ioc'].dropna().str.strip().str.upper() if c and c != FIDE_FLAG]
+    leading = [c for c in LEADING_FEDERATIONS if c in known]
+    codes = leading + [c for c in dict.fromkeys(known) if c not in leading]
+    weights = 1.0 / np.arange(1, len(codes) + 1) ** 0.9
+    weights = weights / weights.sum() * (1 - FIDE_FLAG_SHARE)
+    return np.array(codes + [FIDE_FLAG], dtype=object), np.append(weights, FIDE_FLAG_SHARE)
+
+
+def player_block(rng, first_id, count, feds, mean_months):
+    #One block of players and their ratings rows (DataFrames in file column order) and rows per player
+    ids = first_id + np.cumsum(rng.integers(1, 40, count))
+
+    # Log-normal rated months per player (sigma 1.1: median is about a third of the mean)
+    sigma = 1.1
+    mu = np.log(mean_months) - sigma ** 2 / 2
+    lengths = np.clip(rng.lognormal(mu, sigma, count).astype('int64'), 1, len(MONTHS))
+    # Active players run to the last list; the others stopped some years back
+    stopped = rng.exponential(40, count).astype('int64') * (rng.random(count) < 0.55)
+    end = np.maximum(len(MONTHS) - 1 - stopped, lengths - 1)
+    start = end - lengths + 1
+
+    total = int(lengths.sum())
+    starts = np.cumsum(lengths) - lengths
+    player = np.repeat(np.arange(count), lengths)
+    step = np.arange(total) - np.repeat(starts, lengths)
+
+    # Rating: start level + per-player drift + a random walk, bounded like the real lists
+    base = np.clip(rng.normal(1550, 280, count), 1000, 2500)
+    drift = rng.normal(1.5, 4, count)
+    noise = rng.normal(0, 14, total)
+    walk = np.cumsum(noise)
+    walk -= np.repeat(walk[starts] - noise[starts], lengths)
+    rating = np.clip(base[player] + drift[player] * step + walk, 1000, 2880).astype('int64')
+    games = rng.poisson(rng.exponential(1.8, count)[player])
+
+    month_index = start[player] + step
+    max_rating = np.maximum.reduceat(rating, starts)
+
+    sex = np.where(rng.random(count) < 0.11, 'F', 'M')
+    birthyear = np.clip(rng.normal(1988, 17, count), 1925, 2019).astype('int64')
+    birthyear[rng.random(count) < 0.01] = 0
+    name = SURNAMES[rng.integers(0, len(SURNAMES), count)] + ', ' + GIVEN[rng.integers(0, len(GIVEN), count)]
+
+    players = pd.DataFrame({
+        'id': ids, 'name': name, 'fed': feds[0][rng.choice(len(feds[0]), count, p=feds[1])],
+        'sex': sex, 'birthyear': birthyear, 'max_rating': max_rating, 'month': MONTHS[end]
+    })
+    ratings = pd.DataFrame({'id': ids[player], 'month': MONTHS[month_index], 'rating': rating, 'games': games})
+    return players, ratings, lengths
+
+
+def generate(out_dir, rows, seed=2025, mean_months=30, block=50_000, shuffle=False, reference_dir=None,
+             progress=True):
+    #Write a synthetic data directory with about `rows` rating rows (whole players only); returns a summary
+    reference_dir = reference_dir or os.path.join(ROOT, 'data')
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ('countries.tsv', 'iso3.tsv'):
+        target = os.path.join(out_dir, name)
+        if os.path.abspath(target) != os.path.abspath(os.path.join(reference_dir, name)):
+            shutil.copyfile(os.path.join(reference_dir, name), target)
+
+    rng = np.random.default_rng(seed)
+    feds = federation_weights(reference_dir)
+    started = time.perf_counter()
+    written, players_written, next_id = 0, 0, 100000
+    with open(os.path.join(out_dir, 'players.tsv'), 'w', encoding='utf-8', newline='') as players_out, \
+         open(os.path.join(out_dir, 'ratings.tsv'), 'w', encoding='utf-8', newline='') as ratings_out:
+        players_out.write(PLAYERS_HEADER)
+        ratings_out.write(RATINGS_HEADER)
+        while written < rows:
+            count = max(1, min(block, (rows - written) // mean_months + 1))
+            players, ratings, per_player = player_block(rng, next_id, count, feds, mean_months)
+            # Keep whole players up to the target
+            keep = min(count, int(np.searchsorted(np.cumsum(per_player), rows - written)) + 1)
+            players = players.iloc[:keep]
+            ratings = ratings.iloc[:int(per_player[:keep].sum())]
+            if shuffle:
+                ratings = ratings.iloc[rng.permutation(len(ratings))]
+
+            players.to_csv(players_out, sep='\t', header=False, index=False, lineterminator='\n')
+            ratings.to_csv(ratings_out, sep='\t', header=False, index=False, lineterminator='\n')
+            written += len(ratings)
+            players_written += len(players)
+            next_id = int(players['id'].iloc[-1])
+            if progress:
+                print(f"\r  {written:,} / {rows:,} rating rows", end='', file=sys.stderr, flush=True)
+    if progress:
+        print(file=sys.stderr)
+
+    return {
+        'rows': written,
+        'players': players_written,
+        'seed': seed,
+        'shuffled': shuffle,
+        'seconds': time.perf_counter() - started,
+        'ratings_mb': os.path.getsize(os.path.join(out_dir, 'ratings.tsv')) / 1024 / 1024
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, default=parse_size('1M'),
+                        help='rating rows to write, e.g. 10k, 2.5M, 100M (default 1M)')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'data', 'synthetic'), help='output directory')
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--mean-months', type=int, default=30, help='average rated months per player')
+    parser.add_argument('--block', type=parse_size, default=50_000, help='players generated per block')
+    parser.add_argument('--shuffle', action='store_true', help="mix rows within each block (players not grouped)")
+    parser.add_argument('--force', action='store_true', help='overwrite existing players.tsv/ratings.tsv')
+    args = parser.parse_args(argv)
+
+    existing = [n for n in ('players.tsv', 'ratings.tsv') if os.path.exists(os.path.join(args.out, n))]
+    if existing and not args.force:
+        print(f"ERROR: {', '.join(existing)} already in {args.out} (use --force to overwrite)")
+        return
+    summary = generate(args.out, args.rows, args.seed, args.mean_months, args.block, args.shuffle)
+    print(f"✓ Wrote {summary['players']:,} players and {summary['rows']:,} rating rows "
+          f"({summary['ratings_mb']:.1f} MB) to {args.out} in {summary['seconds']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Compact column-oriented export for the browser.
+
+The JSON exports repeat every key on every record. This format stores each
+column once as a little-endian typed array that the page can wrap in a
+TypedArray without parsing:
+
+    b'FIDC' | uint32 header length | JSON header (space padded) | column data
+
+The header holds the export metadata, the row count, extra top-level
+sections of the JSON document (such as the aggregated 'index') and one
+entry per column: dtype, byte offset from the start of the column data (8-byte
+aligned), and optionally a dictionary (string columns are stored as integer
+codes into it, -1 for missing), a null sentinel (nullable integers) or a
+'string' flag (integer ids the JSON export writes as strings). Columns of
+integer lists (sparse histograms) are flattened: 'count' items at 'offset'
+and length + 1 int32 row starts at 'starts_offset'.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'FIDC'
+VERSION = 1
+
+
+def _smallest_int(values, nullable=False):
+    #Narrowest signed dtype holding values (and the null sentinel, its minimum)
+    for dtype in ('int8', 'int16', 'int32'):
+        info = np.iinfo(dtype)
+        low = info.min + 1 if nullable else info.min
+        if len(values) == 0 or (values.min() >= low and values.max() <= info.max):
+            return dtype
+    return None
+
+
+def _is_list_column(series):
+    return series.dtype == object and len(series) > 0 and isinstance(series.iloc[0], list)
+
+
+def encode_column(name, series, as_string=False):
+    #(spec, arrays) for one column: 'values', plus 'starts' for list columns; spec omits offsets
+    spec = {'name': name}
+    dtype = series.dtype
+    if _is_list_column(series):
+        lengths = np.array([len(v) for v in series], dtype='int64')
+        starts = np.zeros(len(series) + 1, dtype='int32')
+        np.cumsum(lengths, out=starts[1:])
+        flat = np.array([x for v in series for x in v], dtype='int64')
+        values = flat.astype(_smallest_int(flat) or 'float64')
+        spec.update({'list': True, 'dtype': values.dtype.name, 'count': len(flat)})
+        return spec, {'values': _little_endian(values), 'starts': _little_endian(starts)}
+    if isinstance(dtype, pd.CategoricalDtype) or not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)):
+        if isinstance(dtype, pd.CategoricalDtype):
+            codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, uniques = pd.factorize(series)
+        spec['dictionary'] = [str(u) for u in uniques]
+        # Dictionaries are short; codes still need room for -1
+        values = codes.astype(_smallest_int(np.array([-1, len(uniques)])))
+    elif pd.api.types.is_bool_dtype(dtype):
+        values = series.to_numpy(dtype='uint8')
+        spec['bool'] = True
+    elif pd.api.types.is_integer_dtype(dtype):
+        # Integers beyond int32 fall back to float64 (exact up to 2**53), with NaN as null
+        nullable = bool(series.isna().any())
+        target = _smallest_int(series.dropna().to_numpy(dtype='int64'), nullable) or 'float64'
+        if not nullable:
+            values = series.to_numpy(dtype='int64').astype(target)
+        elif target == 'float64':
+            spec['null'] = None
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            spec['null'] = int(np.iinfo(target).min)
+            values = series.to_numpy(dtype='float64', na_value=spec['null']).astype(target)
+        spec['integer'] = True
+        if as_string:
+            spec['string'] = True
+    else:
+        values = series.to_numpy(dtype='float64')
+    spec['dtype'] = values.dtype.name
+    return spec, {'values': _little_endian(values)}
+
+
+def _little_endian(values):
+    return np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+
+
+def write_columnar(output_file, metadata, frame, string_columns=(), sections=None):
+    #Write frame (one column per field) and metadata in the FIDC layout; returns the file size.
+    #sections are extra JSON-able top-level entries (e.g. 'index') kept in the header
+    specs, arrays, offset = [], [], 0
+    for name in frame.columns:
+        spec, encoded = encode_column(name, frame[name], name in string_columns)
+        for key, values in encoded.items():
+            spec['offset' if key == 'values' else key + '_offset'] = offset
+            offset += -(-values.nbytes // 8) * 8
+            arrays.append(values)
+        specs.append(spec)
+
+    header = json.dumps({
+        'format': 'fide-columnar',
+        'version': VERSION,
+        'length': len(frame),
+        'metadata': metadata,
+        'sections': sections or {},
+        'columns': specs
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    with open(output_file, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint32(len(header)).astype('<u4').tobytes())
+        f.write(header)
+        for values in arrays:
+            data = values.tobytes()
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+    return os.path.getsize(output_file)
+
+
+def read_columnar(path):
+    #The document the JSON export holds: {'metadata': ..., 'data': [record dicts], **sections}
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    if buffer[:4] != MAGIC:
+        raise ValueError(f"{path}: not a FIDC columnar file")
+    header_length = int(np.frombuffer(buffer, dtype='<u4', count=1, offset=4)[0])
+    header = json.loads(buffer[8:8 + header_length].decode('utf-8'))
+    if header.get('version') != VERSION:
+        raise ValueError(f"{path}: unsupported columnar version {header.get('version')}")
+    start = 8 + header_length
+
+    names, columns = [], []
+    for spec in header['columns']:
+        values = np.frombuffer(buffer, dtype=np.dtype(spec['dtype']).newbyteorder('<'),
+                               count=spec.get('count', header['length']), offset=start + spec['offset']).tolist()
+        if spec.get('list'):
+            starts = np.frombuffer(buffer, dtype='<i4', count=header['length'] + 1,
+                                   offset=start + spec['starts_offset']).tolist()
+            values = [values[a:b] for a, b in zip(starts[:-1], starts[1:])]
+        elif 'dictionary' in spec:
+            dictionary = spec['dictionary']
+            values = [dictionary[v] if v >= 0 else None for v in values]
+        elif spec.get('bool'):
+            values = [bool(v) for v in values]
+        elif spec.get('integer'):
+            null = spec.get('null')
+            values = [None if v == null or v != v else (str(int(v)) if spec.get('string') else int(v)) for v in values]
+        names.append(spec['name'])
+        columns.append(values)
+    document = {'metadata': header['metadata'], 'data': [dict(zip(names, row)) for row in zip(*columns)]}
+    document.update(header.get('sections', {}))
+    return document
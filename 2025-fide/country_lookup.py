@@ -0,0 +1,121 @@
+"""
+Federation code -> country and region lookup.
+
+countries.tsv maps FIDE federation (IOC) codes to a country name and an
+ISO alpha3 code; iso3.tsv maps alpha3 codes to a region and subregion. Both
+are joined once on alpha3 into a table indexed by federation code. Codes
+missing from the table resolve to themselves with region 'Unknown', as
+before, but callers get a mask of them so they can be reported.
+
+The lookup is shared by data_processor.py and data/filter.py;
+CountryLookup.load caches it per input files.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN = 'Unknown'
+
+COLUMNS = ['name', 'code', 'alpha3', 'region', 'subregion']
+
+_loaded = {}
+
+
+def _text(frame, column, default):
+    #Column as stripped strings (NaN -> 'nan', as str() gives), or default when absent
+    if frame is None or column not in frame.columns:
+        return np.full(0 if frame is None else len(frame), default, dtype=object)
+    return np.array([str(v).strip() for v in frame[column].tolist()], dtype=object)
+
+
+def _read(path):
+    frame = pd.read_csv(path, sep='\t', encoding='utf-8')
+    frame.columns = frame.columns.str.replace('^#', '', regex=True).str.strip()
+    return frame
+
+
+class CountryLookup:
+    """Indexed federation table: name, code, alpha3, region, subregion per code."""
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def from_frames(cls, countries_df, iso3_df=None):
+        #One join on alpha3; duplicated codes keep their first position and last values
+        codes = np.array([c.upper() for c in _text(countries_df, 'ioc', '')], dtype=object)
+        countries = pd.DataFrame({
+            'name': _text(countries_df, 'country', UNKNOWN),
+            'code': codes,
+            'alpha3': _text(countries_df, 'alpha3', '')
+        })
+        countries = countries[countries['code'] != '']
+        order = pd.unique(countries['code'])
+        countries = countries.drop_duplicates('code', keep='last').set_index('code', drop=False).loc[order]
+
+        regions = pd.DataFrame({
+            'alpha3': _text(iso3_df, 'alpha3', ''),
+            'region': _text(iso3_df, 'region', ''),
+            'subregion': _text(iso3_df, 'subregion', '')
+        }).drop_duplicates('alpha3', keep='last').set_index('alpha3')
+
+        table = countries.join(regions, on='alpha3')
+        table[['region', 'subregion']] = table[['region', 'subregion']].fillna(UNKNOWN)
+        table.index.name = None
+        return cls(table[COLUMNS].astype(object))
+
+    @classmethod
+    def load(cls, data_dir, countries_file='countries.tsv', iso3_file='iso3.tsv'):
+        #Build from the TSVs in data_dir, reusing the last build while the files are unchanged
+        paths = [os.path.abspath(os.path.join(data_dir, f)) for f in (countries_file, iso3_file)]
+        key = tuple((p, os.path.getsize(p), os.path.getmtime(p)) for p in paths if os.path.exists(p))
+        if key not in _loaded:
+            frames = [_read(p) if os.path.exists(p) else None for p in paths]
+            _loaded[key] = cls.from_frames(*frames)
+        return _loaded[key]
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, code):
+        return code in self.table.index
+
+    def get(self, code):
+        #Info dict for one federation code, or None when it is not mapped
+        if code not in self.table.index:
+            return None
+        return self.table.loc[code].to_dict()
+
+    @staticmethod
+    def fallback(code):
+        return {'name': code, 'code': code, 'region': UNKNOWN, 'subregion': UNKNOWN, 'alpha3': ''}
+
+    def resolve(self, codes):
+        #Per-row name/code/region/subregion arrays for an array of codes, plus a mapped mask
+        codes = np.asarray(codes, dtype=object)
+        positions, uniques = pd.factorize(codes)
+        found = self.table.reindex(uniques)
+        mapped = found['code'].notna().to_numpy()
+        columns = {}
+        for name in ('name', 'code', 'region', 'subregion'):
+            values = np.array(found[name].tolist(), dtype=object)
+            values[~mapped] = uniques[~mapped] if name in ('name', 'code') else UNKNOWN
+            columns[name] = values[positions]
+        columns['mapped'] = mapped[positions]
+        return columns
+
+    def in_region(self, region):
+        #Federation codes whose region or subregion equals region (case-insensitive)
+        region = region.strip().lower()
+        match = (self.table['region'].str.lower() == region) | (self.table['subregion'].str.lower() == region)
+        return set(self.table.index[match.to_numpy(dtype=bool)])
+
+    def without_region(self):
+        #Mapped codes whose alpha3 has no iso3.tsv row (e.g. historical federations)
+        return self.table.index[(self.table['region'] == UNKNOWN).to_numpy()].tolist()
+
+    def as_dict(self):
+        #Plain {code: info} dict, the shape of FIDEDataProcessor.country_map
+        return {code: dict(zip(COLUMNS, values)) for code, values in zip(self.table.index, self.table[COLUMNS].itertuples(index=False))}
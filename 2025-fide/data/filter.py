@@ -2,13 +2,16 @@
 
 # arguments handling #########################################################
 
+import os
 import sys
 import getopt
+import shlex
 import textwrap
 
 
 DEFAULTS = {
 	"country":  '',
+	"region":   '',
 	"min_elo":  1000,
 	"max_elo":  3000,
 	"gender":   '',
@@ -16,96 +19,254 @@ DEFAULTS = {
 	"max_year": 2025,
 }
 
+# ratings.tsv lines collected per output before one bulk write
+FLUSH_LINES = 8192
+# with -i, subsets needing more than this share of ratings.tsv are read in one full pass instead
+INDEX_MAX_FRACTION = 0.5
+INDEX_FILE = 'ratings.tsv.idx.npz'
+
 def exit_usage(name, message=None, code=0):
 	if message:
 		sys.stderr.write("%s\n" % message)
 	sys.stderr.write(textwrap.dedent("""\
-	Usage: %(name)s [-hc:e:g:y:] <suffix>
+	Usage: %(name)s [-hic:r:e:g:y:] <suffix>
+	       %(name)s [-hic:r:e:g:y:] -b <specfile>
 		-h  --help             print this help message then exit
 		-c  --country <XXX>    keep players from country <XXX> (defaults to %(country)s)
+		-r  --region <name>    keep players whose federation lies in region or subregion <name> (defaults to %(region)s)
 		-e  --elo [min]-[max]  keep players with highest ELO between <min> and <max> (defaults to %(min_elo)s-%(max_elo)s)
 		-g  --gender [M|F]     keep players matching gender (defaults to %(gender)s)
 		-y  --year [min]-[max] keep players with birthyear between <min> and <max> (defaults to %(min_year)s-%(max_year)s)
+		-b  --batch <specfile> write every subset listed in <specfile> in one pass over ratings.tsv;
+		                       one "<suffix> [options]" per line, options above act as defaults
+		-i  --index            read only the ratings.tsv byte ranges of the kept players, using
+		                       (and building when missing or stale) %(index)s
 		<suffix>               use 'xxx-<suffix>.tsv' filenames for output
-	""") % dict(name=name, **DEFAULTS))
+	""") % dict(name=name, index=INDEX_FILE, **DEFAULTS))
 	sys.exit(code)
 
 
+def parse_range(r, di, da):
+	i, a = r.replace('+', '-').split('-')
+	return int(i or di), int(a or da)
+
+def parse_spec(argv, base):
+	#filter options of argv applied over base; returns (spec, remaining args, batch file, use index)
+	options, args = getopt.gnu_getopt(argv, "hib:c:r:e:g:y:",
+	                              ["help", "index", "batch=", "country=", "region=", "elo=", "gender=", "year="])
+	spec = dict(base)
+	batch, index = None, False
+	for opt, value in options:
+		if opt in ["-h", "--help"]:
+			exit_usage(prog_name)
+		elif opt in ["-b", "--batch"]:
+			batch = value
+		elif opt in ["-i", "--index"]:
+			index = True
+		elif opt in ["-c", "--country"]:
+			spec["country"] = value
+		elif opt in ["-r", "--region"]:
+			spec["region"] = value
+		elif opt in ["-e", "--elo"]:
+			spec["min_elo"], spec["max_elo"] = parse_range(value, spec["min_elo"], spec["max_elo"])
+		elif opt in ["-g", "--gender"]:
+			assert value in 'FM'
+			spec["gender"] = value
+		elif opt in ["-y", "--year"]:
+			spec["min_year"], spec["max_year"] = parse_range(value, spec["min_year"], spec["max_year"])
+	return spec, args, batch, index
+
+
 prog_name, *args = sys.argv
 try:
-	options, args = getopt.getopt(args, "hc:e:g:y:",
-	                              ["help", "country=", "elo=", "gender=", "year="])
+	base, args, batch, use_index = parse_spec(args, DEFAULTS)
 except getopt.GetoptError as message:
 	exit_usage(prog_name, message, 1)
 
-try:
-	suffix, = args
-except:
-	exit_usage(prog_name, "one argument is expected", 1)
+specs = []
+if batch:
+	if args:
+		exit_usage(prog_name, "no argument is expected with --batch", 1)
+	with open(batch) as f:
+		for number, line in enumerate(f, 1):
+			if not line.strip() or line.lstrip().startswith('#'):
+				continue
+			try:
+				spec, suffix_args, _, _ = parse_spec(shlex.split(line), base)
+			except (getopt.GetoptError, ValueError) as message:
+				exit_usage(prog_name, "%s:%d: %s" % (batch, number, message), 1)
+			if len(suffix_args) != 1:
+				exit_usage(prog_name, "%s:%d: one suffix is expected" % (batch, number), 1)
+			spec["suffix"] = suffix_args[0]
+			specs.append(spec)
+	if not specs:
+		exit_usage(prog_name, "%s lists no subset" % batch, 1)
+else:
+	try:
+		suffix, = args
+	except:
+		exit_usage(prog_name, "one argument is expected", 1)
+	base["suffix"] = suffix
+	specs.append(base)
 
+if len({spec["suffix"] for spec in specs}) < len(specs):
+	exit_usage(prog_name, "every subset needs its own suffix", 1)
 
-country = DEFAULTS["country"]
-min_elo = DEFAULTS["min_elo"]
-max_elo = DEFAULTS["max_elo"]
-gender =  DEFAULTS["gender"]
-min_year = DEFAULTS["min_year"]
-max_year = DEFAULTS["max_year"]
 
-def parse_range(r, di, da):
-	i, a = r.replace('+', '-').split('-')
-	return int(i or di), int(a or da)
+# federation lookup ##########################################################
 
-for opt, value in options:
-	if opt in ["-h", "--help"]:
-		exit_usage(prog_name)
-	elif opt in ["-c", "--country"]:
-		country = value
-	elif opt in ["-e", "--elo"]:
-		min_elo, max_elo = parse_range(value, min_elo, max_elo)
-	elif opt in ["-g", "--gender"]:
-		assert value in 'FM'
-		gender = value
-	elif opt in ["-y", "--year"]:
-		min_year, max_year = parse_range(value, min_year, max_year)
+def federation_codes(path='countries.tsv'):
+	#ioc column of countries.tsv, read as plain text so -c needs no pandas
+	if not os.path.exists(path):
+		return set()
+	with open(path, encoding='utf-8') as f:
+		header = [name.lstrip('#').strip() for name in f.readline().rstrip('\n').split('\t')]
+		if 'ioc' not in header:
+			return set()
+		column = header.index('ioc')
+		rows = (line.rstrip('\n').split('\t') for line in f)
+		return {fields[column].strip().upper() for fields in rows if len(fields) > column}
+
+for spec in specs:
+	spec["feds"] = None
+if any(spec["country"] for spec in specs):
+	codes = federation_codes()
+	for spec in specs:
+		if spec["country"] and spec["country"].upper() not in codes:
+			sys.stderr.write("warning: federation %s is not in countries.tsv\n" % spec["country"])
+if any(spec["region"] for spec in specs):
+	#regions need the countries.tsv x iso3.tsv join shared with data_processor.py
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	from country_lookup import CountryLookup
+	lookup = CountryLookup.load('.')
+	for spec in specs:
+		if spec["region"]:
+			spec["feds"] = lookup.in_region(spec["region"])
+			if not spec["feds"]:
+				exit_usage(prog_name, "no federation in region '%s'" % spec["region"], 1)
 
 
 # matching players ##########################################################
 
-players_id = set()
+def matches(spec, fed, sex, birthyear, max_rating):
+	#Same checks, in the same order, as the original one-subset loop
+	if spec["country"] and fed != spec["country"]:
+		return False
+	if spec["feds"] is not None and fed.upper() not in spec["feds"]:
+		return False
+	if not spec["min_elo"] <= int(max_rating) <= spec["max_elo"]:
+		return False
+	if spec["gender"] and sex != spec["gender"]:
+		return False
+	if not spec["min_year"] <= int(birthyear) <= spec["max_year"]:
+		return False
+	return True
+
+# player id -> indices of the subsets keeping that player
+targets = {}
 
 players_i = open('players.tsv')
-players_o = open('players-%s.tsv' % suffix, 'w')
+players_o = [open('players-%s.tsv' % spec["suffix"], 'w') for spec in specs]
 
 headers = next(players_i)
 assert headers == "#id	name	fed	sex	birthyear	max_rating	month\n"
-print(headers, end='', file=players_o)
+for out in players_o:
+	out.write(headers)
 
 for line in players_i:
-	pid, name, fed, sex, birthyear, max_rating, month = line.strip().split('\t')
-	if country and fed != country:
-		continue
-	if not min_elo <= int(max_rating) <= max_elo:
-		continue
-	if gender and sex != gender:
-		continue
-	if not min_year <= int(birthyear) <= max_year:
-		continue
-	print(pid, name, fed, sex, birthyear, max_rating, month, sep='\t', file=players_o)
-	players_id.add(pid)
+	line = line.strip()
+	pid, name, fed, sex, birthyear, max_rating, month = line.split('\t')
+	kept = [i for i, spec in enumerate(specs) if matches(spec, fed, sex, birthyear, max_rating)]
+	if kept:
+		for i in kept:
+			players_o[i].write(line + '\n')
+		targets[pid] = kept
+players_i.close()
+for out in players_o:
+	out.close()
+
+
+# matching ratings ##########################################################
 
+def load_index(path):
+	#Contiguous runs of each player's lines in path, as (ids, starts, ends); rebuilt when path changed
+	import numpy as np
+	stat = os.stat(path)
+	if os.path.exists(INDEX_FILE):
+		index = np.load(INDEX_FILE)
+		if int(index["size"]) == stat.st_size and int(index["mtime_ns"]) == stat.st_mtime_ns:
+			return index["ids"], index["starts"], index["ends"]
+	sys.stderr.write("building %s...\n" % INDEX_FILE)
+	ids, starts, ends = [], [], []
+	with open(path, 'rb') as f:
+		position = len(next(f))
+		previous = None
+		for line in f:
+			pid = line[:line.find(b'\t')]
+			if pid != previous:
+				ids.append(pid)
+				starts.append(position)
+				ends.append(position)
+				previous = pid
+			position += len(line)
+			ends[-1] = position
+	ids = np.array([pid.decode('utf-8').strip() for pid in ids])
+	starts, ends = np.array(starts, dtype='int64'), np.array(ends, dtype='int64')
+	np.savez(INDEX_FILE, ids=ids, starts=starts, ends=ends, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+	return ids, starts, ends
 
-# matching ratings
+def indexed_ranges(path):
+	#Merged byte ranges of ratings.tsv holding the kept players' lines, or None when a full pass is cheaper
+	import numpy as np
+	ids, starts, ends = load_index(path)
+	keep = np.isin(ids, np.array(list(targets))) if targets else np.zeros(len(ids), dtype=bool)
+	starts, ends = starts[keep], ends[keep]
+	if ends.sum() - starts.sum() > INDEX_MAX_FRACTION * os.path.getsize(path):
+		return None
+	order = np.argsort(starts, kind='stable')
+	ranges = []
+	for start, end in zip(starts[order].tolist(), ends[order].tolist()):
+		if ranges and start <= ranges[-1][1]:
+			ranges[-1][1] = max(ranges[-1][1], end)
+		else:
+			ranges.append([start, end])
+	return ranges
+
+def read_ranges(path, ranges):
+	#Lines of ratings.tsv within ranges, in file order
+	with open(path, 'rb') as f:
+		for start, end in ranges:
+			f.seek(start)
+			yield from f.read(end - start).decode('utf-8').splitlines(keepends=True)
 
 ratings_i = open('ratings.tsv')
-ratings_o = open('ratings-%s.tsv' % suffix, 'w')
+ratings_o = [open('ratings-%s.tsv' % spec["suffix"], 'w') for spec in specs]
 
 headers = next(ratings_i)
 assert headers == "#id	month	rating	games\n"
-print(headers, end='', file=ratings_o)
+for out in ratings_o:
+	out.write(headers)
+
+lines = ratings_i
+if use_index:
+	ranges = indexed_ranges('ratings.tsv')
+	if ranges is not None:
+		ratings_i.close()
+		lines = read_ranges('ratings.tsv', ranges)
 
-for line in ratings_i:
-	pid, month, rating, games = line.strip().split('\t')
-	if pid not in players_id:
+buffers = [[] for _ in specs]
+for line in lines:
+	kept = targets.get(line[:line.find('\t')])
+	if kept is None:
 		continue
-	print(pid, month, rating, games, sep='\t', file=ratings_o)
-	
\ No newline at end of file
+	line = line.strip() + '\n'
+	for i in kept:
+		buffer = buffers[i]
+		buffer.append(line)
+		if len(buffer) >= FLUSH_LINES:
+			ratings_o[i].write(''.join(buffer))
+			buffer.clear()
+for buffer, out in zip(buffers, ratings_o):
+	out.write(''.join(buffer))
+	out.close()
+ratings_i.close()
@@ -8,25 +8,336 @@ Data files used:
 """
 
 import pandas as pd
+import numpy as np
 import json
+import argparse
+import io
 import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import warnings
+
+from record_store import RecordStore
+from filter_pipeline import FilterPipeline
+from aggregation import GroupAggregator, AggregateState, RatingBins, group_index, rating_extent
+from tsv_cache import TSVCache, iter_entry_chunks
+from country_lookup import CountryLookup
+from columnar_export import write_columnar
+from json_stream import write_json_stream, BATCH_SIZE as JSON_BATCH_SIZE
+from player_runs import merge_join, player_features, run_reduce
+from instrumentation import Instrumentation, instrumented, PROFILE_MODES
+from quantiles import EXPORT_PERCENTILES, QuantileSketch, RatingHistogram, percentile_name
+from rollup import HIERARCHIES, RollupCube, parse_levels
+from age_curves import AgeCurves, CURVE_PERCENTILES
 warnings.filterwarnings('ignore')
 
+def _map_unique(series, func):
+    #Apply a scalar conversion once per distinct value and broadcast it back to every row
+    codes, uniques = pd.factorize(series)
+    mapped = np.array([func(v) for v in uniques] + [func(np.nan)], dtype=object)
+    codes = np.where(codes < 0, len(uniques), codes)
+    return mapped[codes]
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if pd.notna(value) else None
+    except:
+        return None
+
+
+def clean_tsv_frame(df):
+    #Normalize a freshly read TSV frame: strip the '#' header marker and string-ify ids
+    df.columns = df.columns.str.replace('^#', '', regex=True).str.strip()
+    
+    if 'id' in df.columns:
+        df['id'] = df['id'].astype(str).str.strip()
+    
+    return df
+
+
+def read_tsv(filepath):
+    #Parse one input TSV into its cleaned frame
+    return clean_tsv_frame(pd.read_csv(filepath, sep='\t', encoding='utf-8'))
+
+
+def ratings_shard_ranges(filepath, shards):
+    #Split ratings.tsv into byte ranges whose boundaries fall where the player id changes
+    size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        f.readline()
+        bounds = [f.tell()]
+        for k in range(1, shards):
+            target = bounds[0] + (size - bounds[0]) * k // shards
+            if target <= bounds[-1]:
+                continue
+            f.seek(target)
+            f.readline()
+            line = f.readline()
+            first_id = line.split(b'\t', 1)[0]
+            position = f.tell()
+            while line:
+                position = f.tell()
+                line = f.readline()
+                if line.split(b'\t', 1)[0] != first_id:
+                    break
+            if not line:
+                position = size
+            if position > bounds[-1]:
+                bounds.append(position)
+        if bounds[-1] < size:
+            bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+_shard_processor = None
+
+
+def _init_shard_worker(data_dir, ratings_file, chunksize, players_df, countries_df, iso3_df):
+    #Process pool initializer: the small tables are shipped once per worker, not once per task
+    global _shard_processor
+    _shard_processor = FIDEDataProcessor(data_dir=data_dir, chunksize=chunksize, ratings_file=ratings_file)
+    _shard_processor.players_df = players_df
+    _shard_processor.countries_df = countries_df
+    _shard_processor.iso3_df = iso3_df
+    _shard_processor.create_country_mapping()
+
+
+def _process_shard(task):
+    #Parse, join and filter one byte range of ratings.tsv; returns the partial result
+    byte_range, engine, pipeline = task
+    processor = _shard_processor
+    processor.all_data = RecordStore()
+    processor.years = set()
+    processor.countries_list = []
+    processor.unmapped_codes = Counter()
+    processor.pushdown_removed = 0
+    processor._record_order = []
+    processor._load_predicate = pipeline.load_predicate() if pipeline is not None else None
+    process = processor._process_rows if engine == 'rows' else processor._process_vectorized
+    
+    merged_count = processor._process_chunks(processor.iter_ratings_chunks(byte_range), process, keep_order=True)
+    order = np.concatenate(processor._record_order) if processor._record_order else np.array([], dtype='int64')
+    return (processor.all_data.frame, order, processor.years, processor.countries_list,
+            processor.unmapped_codes, processor.pushdown_removed, merged_count)
+
+
+INT_LIST = re.compile(r'\[\n\s+(-?\d+(?:,\n\s+-?\d+)*)\n\s*\]')
+
+
+def _dump_json(output_file, document):
+    # indent=2 puts every histogram entry on its own line; integer lists are written on one line
+    # instead (real newlines never occur inside JSON strings, so only structure is touched)
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    text = INT_LIST.sub(lambda m: '[' + re.sub(r',\n\s+', ', ', m.group(1)) + ']', text)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(text.encode('utf-8'))
+
+
+def aggregated_metadata(aggregated_list, total_records, years, countries, bins=None):
+    metadata = {
+        'generated': datetime.now().isoformat(),
+        'total_records': total_records,
+        'aggregated_groups': len(aggregated_list),
+        'year_range': {
+            'min': int(min(years)) if years else None,
+            'max': int(max(years)) if years else None
+        },
+        'countries': countries,
+        'gender_values': ['M', 'F', 'U']
+    }
+    if bins is not None:
+        # Layout of each group's sparse hist_bins/hist_counts
+        metadata['histogram'] = bins.metadata()
+    return metadata
+
+
+def write_aggregated_json(output_file, aggregated_list, total_records, years, countries, bins=None):
+    #Write the aggregated export; shared by the full pipeline and incremental updates
+    output_data = {
+        'metadata': aggregated_metadata(aggregated_list, total_records, years, countries, bins),
+        'data': aggregated_list,
+        # Row positions by year / country / year+gender and per-country yearly trends for the page
+        'index': group_index(aggregated_list)
+    }
+    
+    _dump_json(output_file, output_data)
+    
+    file_size = os.path.getsize(output_file) / (1024 * 1024)
+    print(f"✓ Exported aggregated data to {output_file} ({file_size:.2f} MB)")
+
+
+def write_aggregated_columnar(output_file, aggregated_list, total_records, years, countries, bins=None):
+    #Same content as write_aggregated_json in the compact columnar layout (columnar_export.py)
+    metadata = aggregated_metadata(aggregated_list, total_records, years, countries, bins)
+    size = write_columnar(output_file, metadata, pd.DataFrame(aggregated_list),
+                          sections={'index': group_index(aggregated_list)})
+    print(f"✓ Exported aggregated columnar data to {output_file} ({size / 1024:.1f} KB)")
+
+
+def write_aggregated_partitions(output_dir, aggregated_list, total_records, years, countries, bins=None,
+                                by='year', formats=('json', 'columnar')):
+    #Split the aggregated export into one file per year (or country) plus a small manifest.json.
+    #The manifest carries everything the page needs before any partition arrives: metadata, the
+    #partition list with sizes, the rating extent and the per-country trends and summaries.
+    os.makedirs(output_dir, exist_ok=True)
+    metadata = aggregated_metadata(aggregated_list, total_records, years, countries, bins)
+    index = group_index(aggregated_list)
+    groups = sorted(index['by_year'].items(), key=lambda item: int(item[0])) if by == 'year' else index['by_country'].items()
+    
+    partitions = []
+    for i, (key, rows) in enumerate(groups):
+        part = [aggregated_list[r] for r in rows]
+        key = int(key) if by == 'year' else key
+        # Country names are not safe file names; their position in the manifest is
+        name = f"year-{key}" if by == 'year' else f"country-{i:03d}"
+        document_metadata = {'partition_by': by, 'key': key, 'groups': len(part),
+                             'records': sum(g['count'] for g in part)}
+        entry = dict(document_metadata, files={}, bytes={})
+        if 'json' in formats:
+            entry['files']['json'] = name + '.json'
+            entry['bytes']['json'] = _dump_json(os.path.join(output_dir, name + '.json'),
+                                                {'metadata': document_metadata, 'data': part, 'index': group_index(part)})
+        if 'columnar' in formats:
+            entry['files']['columnar'] = name + '.bin'
+            entry['bytes']['columnar'] = write_columnar(os.path.join(output_dir, name + '.bin'), document_metadata,
+                                                        pd.DataFrame(part), sections={'index': group_index(part)})
+        del entry['partition_by']
+        partitions.append(entry)
+    
+    manifest = {
+        'metadata': metadata,
+        'partition_by': by,
+        'years': sorted(int(y) for y in index['by_year']),
+        'rating_extent': rating_extent(aggregated_list, bins),
+        'partitions': partitions,
+        'country_trends': index['country_trends'],
+        'country_summary': index['country_summary']
+    }
+    manifest_size = _dump_json(os.path.join(output_dir, 'manifest.json'), manifest)
+    total = sum(sum(p['bytes'].values()) for p in partitions)
+    print(f"✓ Exported {len(partitions)} {by} partition(s) to {output_dir} "
+          f"({total / 1024:.1f} KB, manifest {manifest_size / 1024:.1f} KB)")
+
+
+def write_cube(output_dir, cube, total_records, years, countries, formats=('json', 'columnar')):
+    #One file per cube level plus a manifest.json listing every level with its groups, partial
+    #aggregate cells, source level, build time and file sizes
+    os.makedirs(output_dir, exist_ok=True)
+    levels = []
+    print(f"\n  {'level':<26} {'groups':>8} {'cells':>10} {'build s':>8} {'KB':>9}  from")
+    for cuboid in cube:
+        started = time.perf_counter()
+        data = cuboid.stats(EXPORT_PERCENTILES)
+        seconds = cuboid.seconds + time.perf_counter() - started
+        name = cuboid.name.replace('/', '-')
+        document_metadata = {'level': cuboid.name, 'groups': len(data), 'records': sum(g['count'] for g in data)}
+        entry = dict(document_metadata, cells=len(cuboid.count), source=cuboid.source, build_seconds=seconds,
+                     files={}, bytes={})
+        if 'json' in formats:
+            entry['files']['json'] = name + '.json'
+            entry['bytes']['json'] = _dump_json(os.path.join(output_dir, name + '.json'),
+                                                {'metadata': document_metadata, 'data': data})
+        if 'columnar' in formats:
+            entry['files']['columnar'] = name + '.bin'
+            entry['bytes']['columnar'] = write_columnar(os.path.join(output_dir, name + '.bin'), document_metadata,
+                                                        pd.DataFrame(data))
+        levels.append(entry)
+        print(f"  {cuboid.name:<26} {len(data):>8,} {entry['cells']:>10,} {seconds:>8.3f} "
+              f"{sum(entry['bytes'].values()) / 1024:>9.1f}  {cuboid.source or 'records'}")
+    
+    manifest = {
+        'metadata': {
+            'generated': datetime.now().isoformat(),
+            'total_records': total_records,
+            'year_range': {
+                'min': int(min(years)) if years else None,
+                'max': int(max(years)) if years else None
+            },
+            'countries': countries,
+            'hierarchies': {dimension: list(hierarchy) for dimension, hierarchy in HIERARCHIES.items()}
+        },
+        'levels': levels
+    }
+    _dump_json(os.path.join(output_dir, 'manifest.json'), manifest)
+    total = sum(sum(level['bytes'].values()) for level in levels)
+    print(f"✓ Exported {len(levels)} cube level(s) to {output_dir} ({total / 1024:.1f} KB)")
+
+
+def write_age_curves(output_file, curves, total_records, years):
+    #Both age-curve tables as column lists, written without indentation: one row per
+    #country x gender x age (or cohort x year) group would otherwise take a dozen lines
+    document = {
+        'metadata': {
+            'generated': datetime.now().isoformat(),
+            'total_records': total_records,
+            'records_with_age': curves.records,
+            'year_range': {
+                'min': int(min(years)) if years else None,
+                'max': int(max(years)) if years else None
+            },
+            'age_range': {'min': curves.age_range[0], 'max': curves.age_range[1]},
+            'cohort_size': curves.cohort_size,
+            'min_count': curves.min_count,
+            'percentiles': [percentile_name(q) for q in CURVE_PERCENTILES],
+            'countries': curves.countries,
+            'gender_values': ['M', 'F', 'U']
+        },
+        'by_age': curves.columns('by_age'),
+        'by_cohort': curves.columns('by_cohort')
+    }
+    text = json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    size = len(text.encode('utf-8'))
+    print(f"✓ Exported age curves to {output_file} ({len(document['by_age']['count']):,} age rows, "
+          f"{len(document['by_cohort']['count']):,} cohort rows, {size / 1024:.1f} KB)")
+    return size
+
+
 class FIDEDataProcessor:
-    def __init__(self, data_dir='./data'):
+    def __init__(self, data_dir='./data', chunksize=None, workers=1, ratings_file='ratings.tsv', cache_dir=None,
+                 instrumentation=None):
         
         self.data_dir = data_dir
+        # Ratings table to read, relative to data_dir (e.g. a single new month for incremental updates)
+        self.ratings_path = os.path.join(data_dir, ratings_file)
+        # When set, ratings.tsv is streamed in chunks of this many rows instead of loaded whole
+        self.chunksize = chunksize
+        # With more than one worker, ratings.tsv is split into player-aligned shards
+        # that are parsed, joined and filtered in a process pool
+        self.workers = workers
+        # When set, parsed TSV tables are cached there as memory-mappable columns (see tsv_cache.py)
+        self.cache = TSVCache(cache_dir) if cache_dir else None
+        # Cache entry of ratings.tsv for the streaming path, probed once by load_tsv_files
+        self._ratings_entry = None
         self.players_df = None
         self.ratings_df = None
         self.countries_df = None
         self.iso3_df = None
-        self.all_data = []
+        self.all_data = RecordStore()
+        self._load_predicate = None
+        self.pushdown_removed = 0
+        self._record_order = None
         self.countries_list = []
+        # Federation code -> valid records whose code is missing from countries.tsv
+        self.unmapped_codes = Counter()
         self.years = set()
+        # Stage timers and memory figures (see instrumentation.py); disabled unless one is passed in
+        self.instrumentation = instrumentation or Instrumentation()
+    
+    def stage_rows(self):
+        #Rows in flight for stage statistics: processed records, else the loaded ratings
+        if len(self.all_data) or self.ratings_df is None:
+            return len(self.all_data)
+        return len(self.ratings_df)
         
+    @instrumented('load_tsv_files')
     def load_tsv_files(self):
         
         files_to_load = {
@@ -39,80 +350,90 @@ class FIDEDataProcessor:
         print("Loading FIDE data files...")
         
         for filename, attr_name in files_to_load.items():
-            filepath = os.path.join(self.data_dir, filename)
+            filepath = self.ratings_path if attr_name == 'ratings_df' else os.path.join(self.data_dir, filename)
             
             if not os.path.exists(filepath):
                 print(f"   {filename} - NOT FOUND")
                 return False
             
+            if attr_name == 'ratings_df' and self.workers > 1:
+                print(f"   {filename} (split into shards for {self.workers} workers)")
+                continue
+            
+            if attr_name == 'ratings_df' and self.chunksize:
+                # Streaming keeps memory bounded, so a miss is not filled: that would need the whole table
+                note = ''
+                if self.cache is not None:
+                    self._ratings_entry = self.cache.lookup(filepath)
+                    if self._ratings_entry is not None:
+                        self.cache.hits += 1
+                        note = ', from cache'
+                    else:
+                        self.cache.misses += 1
+                        note = ', not cached: streaming never fills the cache, run once without --chunksize to fill it'
+                print(f"   {filename} (streamed in chunks of {self.chunksize:,} rows{note})")
+                continue
+            
             try:
-                # Read TSV with proper settings
-                df = pd.read_csv(
-                    filepath, 
-                    sep='\t',
-                    encoding='utf-8'
-                )
-                
-                # Clean column names
-                df.columns = df.columns.str.replace('^#', '', regex=True).str.strip()
-                
-                
-                if 'id' in df.columns:
-                    df['id'] = df['id'].astype(str).str.strip()
+                # Read TSV with proper settings and clean column names and ids
+                started = datetime.now()
+                if self.cache is not None:
+                    df, hit = self.cache.load(filepath, read_tsv)
+                    source = f"cache {'hit' if hit else 'miss'}, "
+                else:
+                    df, source = read_tsv(filepath), ''
+                seconds = (datetime.now() - started).total_seconds()
                 
                 # Display loaded info
                 setattr(self, attr_name, df)
-                print(f"   {filename} ({len(df):,} rows) | Columns: {list(df.columns)}")
+                print(f"   {filename} ({len(df):,} rows, {source}{seconds:.2f}s) | Columns: {list(df.columns)}")
                 
             except Exception as e:
                 print(f"   {filename} - ERROR: {e}")
                 return False
         
+        if self.cache is not None:
+            print(f"  {self.cache.report()}")
         return True
     
+    def iter_ratings_chunks(self, byte_range=None):
+        #Yield ratings.tsv (or one byte range of it) as cleaned frames of at most self.chunksize rows
+        filepath = self.ratings_path
+        if byte_range is None and self.chunksize and self._ratings_entry is not None:
+            # A cached parse is sliced straight from the memory-mapped columns
+            yield from iter_entry_chunks(self._ratings_entry, self.chunksize)
+            return
+        if byte_range is None:
+            source, names = filepath, None
+        else:
+            start, end = byte_range
+            with open(filepath, 'rb') as f:
+                names = f.readline().decode('utf-8').rstrip('\r\n').split('\t')
+                f.seek(start)
+                source = io.BytesIO(f.read(end - start))
+        
+        reader = pd.read_csv(source, sep='\t', encoding='utf-8', chunksize=self.chunksize,
+                             header=0 if names is None else None, names=names)
+        if not self.chunksize:
+            reader = [reader]
+        for chunk in reader:
+            yield clean_tsv_frame(chunk)
+    
     def create_country_mapping(self):
         #Create mapping from federation code to country name and region
-        self.country_map = {}
-        
-        if self.countries_df is not None:
-            for idx, row in self.countries_df.iterrows():
-                try:
-                    # In countries.tsv: columns are #country, ioc, alpha3
-                    fed_code = str(row.get('ioc', '')).strip().upper()
-                    country_name = str(row.get('country', 'Unknown')).strip()
-                    alpha3 = str(row.get('alpha3', '')).strip()
-                    
-                    if fed_code:
-                        self.country_map[fed_code] = {
-                            'name': country_name,
-                            'code': fed_code,
-                            'alpha3': alpha3,
-                            'region': 'Unknown',
-                            'subregion': 'Unknown'
-                        }
-                except:
-                    continue
-        
-        
-        if self.iso3_df is not None:
-            for idx, row in self.iso3_df.iterrows():
-                try:
-                    alpha3 = str(row.get('alpha3', '')).strip()
-                    region = str(row.get('region', '')).strip()
-                    subregion = str(row.get('subregion', '')).strip()
-                    
-                    
-                    for code, info in self.country_map.items():
-                        if info['alpha3'] == alpha3:
-                            info['region'] = region
-                            info['subregion'] = subregion
-                except:
-                    continue
+        self.country_lookup = CountryLookup.from_frames(self.countries_df, self.iso3_df)
+        self.country_map = self.country_lookup.as_dict()
     
-    def process_data(self, use_medium=False):
+    @instrumented('process_data')
+    def process_data(self, use_medium=False, engine='vectorized', pipeline=None, join='auto'):
+        #join: 'auto' joins player by player when ratings.tsv keeps each player's lines together
+        #and falls back to a hash join otherwise; 'runs' requires that layout; 'hash' always uses pd.merge
        
         suffix = '-medium' if use_medium else ''
         
+        # Row-local filters of the pipeline (leading year ranges) are applied while loading
+        self._load_predicate = pipeline.load_predicate() if pipeline is not None else None
+        
         print(f"\nProcessing data (using {'medium' if use_medium else 'full'} dataset)...")
         
        
@@ -120,27 +441,169 @@ class FIDEDataProcessor:
             print(f"ERROR: 'id' not found in players.tsv. Available columns: {list(self.players_df.columns)}")
             return False
         
+        if engine == 'rows':
+            process = self._process_rows
+        elif engine == 'vectorized':
+            process = self._process_vectorized
+        else:
+            print(f"ERROR: unknown engine '{engine}' (expected 'vectorized' or 'rows')")
+            return False
+        
+        self.create_country_mapping()
+        missing = self.country_lookup.without_region()
+        if missing:
+            listed = ', '.join(missing[:10]) + (f" and {len(missing) - 10} more" if len(missing) > 10 else '')
+            print(f"  Federations without an iso3.tsv region: {listed}")
+        
+        if self.workers > 1:
+            return self._process_parallel(engine, pipeline)
+        
+        if self.chunksize:
+            return self._process_streaming(process)
+        
         if 'id' not in self.ratings_df.columns:
             print(f"ERROR: 'id' not found in ratings.tsv. Available columns: {list(self.ratings_df.columns)}")
             return False
         
         print(f"  Merging players with ratings...")
         
+        with self.instrumentation.stage('merge', rows=lambda: len(self.ratings_df)):
+            merged_df = self._merge_players(join)
+        if merged_df is None:
+            return False
+        
+        print(f"  Merged records: {len(merged_df):,}")
         
-        merged_df = pd.merge(
+        with self.instrumentation.stage('records', rows=self.stage_rows):
+            process(merged_df)
+        self._report_processed()
+        
+        return True
+    
+    def _merge_players(self, join):
+        #Players joined with the whole ratings table, in pd.merge(players, ratings) order; None on error
+        merged_df = merge_join(self.players_df, self.ratings_df) if join != 'hash' else None
+        if merged_df is not None:
+            print(f"  Join: player runs (ratings grouped by player)")
+            return merged_df
+        if join == 'runs':
+            print("ERROR: ratings.tsv does not list each player's lines together (or players.tsv repeats an id); "
+                  "sort it by player or use --join auto")
+            return None
+        if join == 'auto':
+            print(f"  Join: hash (ratings not grouped by player)")
+        return pd.merge(
             self.players_df,
             self.ratings_df,
             on='id',
             how='inner'
         )
+    
+    def _process_streaming(self, process):
+        #Join each ratings chunk against an in-memory players index and process it right away.
+        #Peak memory is bounded by the chunk size (plus the players table and retained records),
+        #never by the size of ratings.tsv.
+        print(f"  Streaming ratings in chunks of {self.chunksize:,} rows...")
         
-        print(f"  Merged records: {len(merged_df):,}")
+        self._record_order = []
+        with self.instrumentation.stage('chunks', rows=self.stage_rows):
+            merged_count = self._process_chunks(self.iter_ratings_chunks(), process, keep_order=True)
+        orders, self._record_order = self._record_order, None
+        if merged_count is None:
+            return False
+        self._restore_merge_order(orders)
         
-       
-        self.create_country_mapping()
+        print(f"  Merged records: {merged_count:,}")
+        self._report_processed()
         
-       
+        return True
+    
+    def _process_chunks(self, chunks, process, keep_order=False):
+        #Join ratings chunks against the players index and process them; returns the merged row count
+        players = self.players_df
+        if keep_order:
+            # Players row position, used to restore pd.merge(players, ratings) order afterwards
+            players = players.assign(_order=np.arange(len(players)))
+        players_index = players.set_index('id')
+        
+        merged_count = 0
+        for chunk in chunks:
+            if 'id' not in chunk.columns:
+                print(f"ERROR: 'id' not found in ratings.tsv. Available columns: {list(chunk.columns)}")
+                return None
+            
+            # Suffixes mirror pd.merge(players, ratings): ratings' month stays 'month_y'
+            merged = chunk.join(players_index, on='id', how='inner', lsuffix='_y', rsuffix='_x')
+            merged_count += len(merged)
+            process(merged)
+        
+        return merged_count
+    
+    def _process_parallel(self, engine, pipeline):
+        #Fan player-aligned shards of ratings.tsv out to a process pool and merge the partial stores.
+        #Records are put back in pd.merge(players, ratings) order, so the output matches the serial path.
+        shards = ratings_shard_ranges(self.ratings_path, self.workers)
+        print(f"  Processing {len(shards)} shard(s) with {self.workers} workers...")
+        
+        tasks = [(byte_range, engine, pipeline) for byte_range in shards]
+        initargs = (self.data_dir, os.path.relpath(self.ratings_path, self.data_dir), self.chunksize,
+                    self.players_df, self.countries_df, self.iso3_df)
+        with self.instrumentation.stage('shards'), \
+             ProcessPoolExecutor(max_workers=self.workers, initializer=_init_shard_worker, initargs=initargs) as pool:
+            results = list(pool.map(_process_shard, tasks))
+        
+        merged_count = 0
+        orders = []
+        for frame, order, years, countries, unmapped, removed, merged in results:
+            if merged is None:
+                return False
+            self.all_data.append(RecordStore(frame))
+            orders.append(order)
+            self.years.update(years)
+            self.countries_list = list(set(self.countries_list) | set(countries))
+            self.unmapped_codes.update(unmapped)
+            self.pushdown_removed += removed
+            merged_count += merged
+        
+        self._restore_merge_order(orders)
+        
+        print(f"  Merged records: {merged_count:,}")
+        self._report_processed()
+        
+        return True
+    
+    @instrumented('restore_order')
+    def _restore_merge_order(self, orders):
+        #Stable sort on players row position: ratings file order within a player, as pd.merge gives
+        if len(self.all_data) and orders:
+            order = np.concatenate(orders)
+            # Player-sorted input comes out in that order already; only sort when it does not
+            if len(order) > 1 and not (order[1:] >= order[:-1]).all():
+                self.all_data = self.all_data.take(np.argsort(order, kind='stable'))
+    
+    def player_positions(self, store=None):
+        #Row position in players.tsv of each record's player (first occurrence for duplicated ids)
+        store = self.all_data if store is None else store
+        positions = pd.Series(np.arange(len(self.players_df)), index=self.players_df['id'])
+        positions = positions[~positions.index.duplicated()]
+        codes, uniques = pd.factorize(store['player_id'])
+        lookup = positions.reindex([str(u) for u in uniques]).to_numpy()
+        return lookup[codes].astype('int64')
+    
+    def _report_processed(self):
+        self.countries_list = sorted(self.countries_list)
+        print(f"  Processed records: {len(self.all_data):,}")
+        print(f"  Countries found: {len(self.countries_list)}")
+        if self.unmapped_codes:
+            listed = ', '.join(f"{code or '(blank)'} ({count:,})" for code, count in self.unmapped_codes.most_common(10))
+            more = f" and {len(self.unmapped_codes) - 10} more" if len(self.unmapped_codes) > 10 else ''
+            print(f"  Unmapped federation codes: {listed}{more} (kept under their own code, region 'Unknown')")
+        print(f"  Year range: {min(self.years)} - {max(self.years)}" if self.years else "  No years found")
+    
+    def _process_rows(self, merged_df):
+        #Reference row-by-row engine, kept to diff against the vectorized path
         processed_count = 0
+        records = []
         for idx, row in merged_df.iterrows():
             try:
                 player_id = str(row['id'])
@@ -168,13 +631,7 @@ class FIDEDataProcessor:
                 
                 
                 fed_code = str(row.get('fed', '')).strip().upper()
-                country_info = self.country_map.get(fed_code, {
-                    'name': fed_code,
-                    'code': fed_code,
-                    'region': 'Unknown',
-                    'subregion': 'Unknown',
-                    'alpha3': ''
-                })
+                country_info = self.country_map.get(fed_code) or CountryLookup.fallback(fed_code)
                 
                 gender = str(row.get('sex', '')).strip().upper()
                 if gender not in ['M', 'F']:
@@ -213,83 +670,191 @@ class FIDEDataProcessor:
                     'name': player_name
                 }
                 
-                self.all_data.append(record)
-                self.years.add(year)
-                processed_count += 1
-                
                 if country_info['name'] not in self.countries_list:
                     self.countries_list.append(country_info['name'])
+                if fed_code not in self.country_map:
+                    self.unmapped_codes[fed_code] += 1
+                
+                if self._load_predicate is not None and not self._load_predicate(np.array([year]))[0]:
+                    self.pushdown_removed += 1
+                    continue
+                
+                records.append(record)
+                if self._record_order is not None:
+                    self._record_order.append(np.array([row['_order']]))
+                self.years.add(year)
+                processed_count += 1
                 
             except Exception as e:
                 continue
         
-        self.countries_list = sorted(self.countries_list)
-        print(f"  Processed records: {len(self.all_data):,}")
-        print(f"  Countries found: {len(self.countries_list)}")
-        print(f"  Year range: {min(self.years)} - {max(self.years)}" if self.years else "  No years found")
+        self.all_data.append(RecordStore.from_records(records))
+    
+    def _process_vectorized(self, merged_df):
+        #Columnar engine: same records and countries_list as _process_rows, computed per column
+        n = len(merged_df)
+        if 'month_y' in merged_df.columns:
+            month_raw = merged_df['month_y']
+        elif 'month' in merged_df.columns:
+            month_raw = merged_df['month']
+        else:
+            month_raw = pd.Series([np.nan] * n, index=merged_df.index, dtype=object)
         
-        return True
+        if 'rating' in merged_df.columns:
+            rating = pd.to_numeric(merged_df['rating'], errors='coerce').to_numpy(dtype='float64')
+        else:
+            rating = np.full(n, np.nan)
+        
+        month_str = _map_unique(month_raw, lambda v: None if pd.isna(v) else str(v).strip())
+        month_date = pd.to_datetime(pd.Series(month_str, dtype=object), format='%Y-%m', errors='coerce')
+        year = month_date.dt.year.to_numpy(dtype='float64')
+        
+        # NaN/inf ratings and unparsable months are exactly the rows the row engine skips
+        keep = np.isfinite(rating) & (rating >= 400) & ~np.isnan(year)
+        if not keep.any():
+            return
+        
+        rows = merged_df[keep]
+        year = year[keep].astype('int64')
+        rating = rating[keep].astype('int64')
+        month_str = month_str[keep]
+        
+        fed_code = _map_unique(rows['fed'], lambda v: str(v).strip().upper()) if 'fed' in rows.columns else np.full(len(rows), '', dtype=object)
+        
+        # Resolve each federation code once, then broadcast to every row
+        resolved = self.country_lookup.resolve(fed_code)
+        country, country_code = resolved['name'], resolved['code']
+        region, subregion = resolved['region'], resolved['subregion']
+        if not resolved['mapped'].all():
+            self.unmapped_codes.update(pd.Series(fed_code[~resolved['mapped']]).value_counts().to_dict())
+        
+        # countries_list covers every valid record, including ones a pushed-down filter drops
+        self.countries_list = list(set(self.countries_list) | set(np.unique(country).tolist()))
+        
+        if self._load_predicate is not None:
+            selected = self._load_predicate(year)
+            self.pushdown_removed += int(len(selected) - selected.sum())
+            if not selected.any():
+                return
+            rows = rows[selected]
+            year, rating, month_str = year[selected], rating[selected], month_str[selected]
+            country, country_code = country[selected], country_code[selected]
+            region, subregion = region[selected], subregion[selected]
+        
+        if self._record_order is not None:
+            self._record_order.append(rows['_order'].to_numpy())
+        
+        player_id = _map_unique(rows['id'], str)
+        gender = _map_unique(rows['sex'], lambda v: str(v).strip().upper()) if 'sex' in rows.columns else np.full(len(rows), '', dtype=object)
+        gender = np.where(np.isin(gender, ['M', 'F']), gender, 'U').astype(object)
+        
+        if 'name' in rows.columns:
+            player_name = _map_unique(rows['name'], lambda v: str(v)[:50])
+        else:
+            player_name = np.array([f'Player_{pid}'[:50] for pid in player_id], dtype=object)
+        
+        birth_year = _map_unique(rows['birthyear'], _int_or_none) if 'birthyear' in rows.columns else np.full(len(rows), None, dtype=object)
+        games = _map_unique(rows['games'], lambda v: _int_or_none(v) or 0) if 'games' in rows.columns else np.zeros(len(rows), dtype=object)
+        
+        # birth_year == 0 is falsy in the row engine, so it yields no age either
+        has_birth = np.array([b is not None and b != 0 for b in birth_year], dtype=bool)
+        age = np.full(len(rows), None, dtype=object)
+        age[has_birth] = (year[has_birth] - birth_year[has_birth].astype('int64')).astype(object)
+        
+        columns = {
+            'player_id': player_id,
+            'year': year,
+            'month': month_str,
+            'rating': rating,
+            'games': games,
+            'country': country,
+            'country_code': country_code,
+            'region': region,
+            'subregion': subregion,
+            'gender': gender,
+            'birth_year': birth_year,
+            'age': age,
+            'name': player_name
+        }
+        self.all_data.append(RecordStore.from_columns(columns))
+        self.years.update(np.unique(year).tolist())
     
+    @instrumented('filter_by_year_range')
     def filter_by_year_range(self, start_year=2010, end_year=None):
         #Filter data to a specific year range
         if end_year is None:
             end_year = max(self.years) if self.years else 2024
         
         original_count = len(self.all_data)
-        self.all_data = [d for d in self.all_data if start_year <= d['year'] <= end_year]
+        year = self.all_data['year'].to_numpy()
+        self.all_data = self.all_data.filter((year >= start_year) & (year <= end_year))
         self.years = {y for y in self.years if start_year <= y <= end_year}
         
         print(f"\nFiltered to years {start_year}-{end_year}: {len(self.all_data):,} records (removed {original_count - len(self.all_data):,})")
     
+    @instrumented('filter_top_countries')
     def filter_top_countries(self, n=20):
         #Keep only top N countries by player count
-        country_counts = {}
-        for record in self.all_data:
-            country = record['country']
-            country_counts[country] = country_counts.get(country, 0) + 1
-        
-        top_countries = sorted(country_counts.items(), key=lambda x: x[1], reverse=True)[:n]
+        top_countries = self.all_data.counts_by('country')[:n]
         top_country_names = {c[0] for c in top_countries}
         
         original_count = len(self.all_data)
-        self.all_data = [d for d in self.all_data if d['country'] in top_country_names]
+        self.all_data = self.all_data.filter(self.all_data.isin('country', top_country_names))
         self.countries_list = sorted(list(top_country_names))
         
         print(f"\nFiltered to top {n} countries: {len(self.all_data):,} records (removed {original_count - len(self.all_data):,})")
         print(f"  Countries: {', '.join(self.countries_list[:10])}...")
     
+    @instrumented('sample_by_rating')
     def sample_by_rating(self, min_rating=1000):
         #Keep only players with max rating >= min_rating
-        player_max_ratings = {}
-        
-        for record in self.all_data:
-            pid = record['player_id']
-            rating = record['rating']
-            if pid not in player_max_ratings:
-                player_max_ratings[pid] = rating
-            else:
-                player_max_ratings[pid] = max(player_max_ratings[pid], rating)
+        ratings = self.all_data['rating']
+        runs = run_reduce(self.all_data['player_id'], max_rating=(ratings.to_numpy(), np.maximum))
+        if runs is not None:
+            # Records grouped by player: one reduceat over the runs instead of a hash groupby
+            player_max_ratings = np.repeat(runs['max_rating'], runs['rows'])
+        else:
+            player_max_ratings = ratings.groupby(self.all_data['player_id'], observed=True).transform('max').to_numpy()
         
         original_count = len(self.all_data)
-        self.all_data = [d for d in self.all_data if player_max_ratings[d['player_id']] >= min_rating]
+        self.all_data = self.all_data.filter(player_max_ratings >= min_rating)
         
         print(f"\nFiltered to players with max rating >= {min_rating}: {len(self.all_data):,} records (removed {original_count - len(self.all_data):,})")
     
+    def player_summary(self):
+        #Per player: records, first and last month, max and mean rating and games, in first-appearance order.
+        #One pass over the run boundaries when records are grouped by player, a groupby otherwise.
+        features = player_features(self.all_data)
+        if features is not None:
+            return features
+        frame = self.all_data.frame
+        return pd.DataFrame({
+            'player_id': frame['player_id'],
+            'month': frame['month'].astype(object),
+            'rating': frame['rating'].astype('int64'),
+            'games': frame['games'].astype('int64')
+        }).groupby('player_id', sort=False, observed=True).agg(
+            records=('rating', 'size'),
+            first_month=('month', 'min'),
+            last_month=('month', 'max'),
+            max_rating=('rating', 'max'),
+            mean_rating=('rating', 'mean'),
+            games=('games', 'sum')
+        ).reset_index()
+    
+    @instrumented('validate_data')
     def validate_data(self):
         
         print("\n" + "="*60)
         print("DATA VALIDATION & STATISTICS")
         print("="*60)
         print(f"  Total records: {len(self.all_data):,}")
-        print(f"  Unique players: {len(set(d['player_id'] for d in self.all_data)):,}")
+        print(f"  Unique players: {self.all_data.unique_count('player_id'):,}")
         print(f"  Years range: {min(self.years)} - {max(self.years)}" if self.years else "  No years found")
         print(f"  Countries: {len(self.countries_list)}")
         
        
-        genders = {}
-        for record in self.all_data:
-            g = record['gender']
-            genders[g] = genders.get(g, 0) + 1
+        genders = dict(self.all_data.counts_by('gender'))
         print(f"\n  Gender distribution:")
         for g in ['M', 'F', 'U']:
             count = genders.get(g, 0)
@@ -297,121 +862,215 @@ class FIDEDataProcessor:
             print(f"    {g}: {count:,} ({pct:.1f}%)")
         
       
-        ratings = [d['rating'] for d in self.all_data]
+        # Exact quantiles from one bincount over the bounded ratings, no sort
+        ratings = RatingHistogram().add(self.all_data['rating'].to_numpy()).summary(EXPORT_PERCENTILES)
         print(f"\n  Rating statistics:")
-        print(f"    Min: {min(ratings)}")
-        print(f"    Max: {max(ratings)}")
-        print(f"    Mean: {sum(ratings) / len(ratings):.0f}")
-        print(f"    Median: {sorted(ratings)[len(ratings)//2]}")
+        print(f"    Min: {ratings['min']}")
+        print(f"    Max: {ratings['max']}")
+        print(f"    Mean: {ratings['mean']:.0f}")
+        print(f"    Median: {ratings['median']}")
+        print(f"    Percentiles: " + ', '.join(f"{percentile_name(q)} {ratings[percentile_name(q)]}" for q in EXPORT_PERCENTILES))
         
-        # Top 10 countries
-        country_counts = {}
-        for record in self.all_data:
-            country = record['country']
-            country_counts[country] = country_counts.get(country, 0) + 1
+        players = self.player_summary()
+        print(f"\n  Per player:")
+        print(f"    Rated months: {players['records'].mean():.1f} on average (max {players['records'].max()})")
+        print(f"    Peak rating: median {int(players['max_rating'].median())}")
+        # Per-player averages are floats: estimated with the mergeable sketch
+        averages = QuantileSketch().add(players['mean_rating'].to_numpy()).summary((0.10, 0.90))
+        print(f"    Average rating: p10 {averages['p10']:.0f}, median {averages['median']:.0f}, "
+              f"p90 {averages['p90']:.0f} (sketch)")
         
+        # Top 10 countries
         print(f"\n  Top 10 countries by record count:")
-        for country, count in sorted(country_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
+        for country, count in self.all_data.counts_by('country')[:10]:
             print(f"    {country}: {count:,}")
     
-    def export_to_json(self, output_file='chess_data.json'):
-       
-        output_data = {
-            'metadata': {
-                'generated': datetime.now().isoformat(),
-                'total_records': len(self.all_data),
-                'unique_players': len(set(d['player_id'] for d in self.all_data)),
-                'year_range': {
-                    'min': int(min(self.years)) if self.years else None,
-                    'max': int(max(self.years)) if self.years else None
-                },
-                'countries': self.countries_list,
-                'gender_values': ['M', 'F', 'U']
+    def _export_metadata(self):
+        return {
+            'generated': datetime.now().isoformat(),
+            'total_records': len(self.all_data),
+            'unique_players': self.all_data.unique_count('player_id'),
+            'year_range': {
+                'min': int(min(self.years)) if self.years else None,
+                'max': int(max(self.years)) if self.years else None
             },
-            'data': self.all_data
+            'countries': self.countries_list,
+            'gender_values': ['M', 'F', 'U']
         }
+    
+    @instrumented('export_to_json')
+    def export_to_json(self, output_file='chess_data.json', compress=False):
+        #Same bytes as json.dump(output, indent=2), written batch by batch from the record store
+        if compress and not output_file.endswith('.gz'):
+            output_file += '.gz'
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        written, seconds = write_json_stream(output_file, self._export_metadata(), self.all_data.iter_batches(JSON_BATCH_SIZE),
+                                             string_columns=('player_id',), compress=compress)
         
         file_size = os.path.getsize(output_file) / (1024 * 1024)
-        print(f"\n✓ Exported to {output_file} ({file_size:.2f} MB)")
+        throughput = written / (1024 * 1024) / max(seconds, 1e-9)
+        print(f"\n✓ Exported to {output_file} ({file_size:.2f} MB, {throughput:.1f} MB/s)")
         
         return output_file
     
-    def export_aggregated_json(self, output_file='chess_data_aggregated.json'):
-        
-        aggregated_data = {}
-        
-        # Group by year and country
-        for record in self.all_data:
-            year = record['year']
-            country = record['country']
-            gender = record['gender']
-            rating = record['rating']
-            
-            key = f"{year}_{country}_{gender}"
-            
-            if key not in aggregated_data:
-                aggregated_data[key] = {
-                    'year': year,
-                    'country': country,
-                    'gender': gender,
-                    'ratings': [],
-                    'count': 0
-                }
-            
-            aggregated_data[key]['ratings'].append(rating)
-            aggregated_data[key]['count'] += 1
-        
-        # Calculate statistics for each group
-        aggregated_list = []
-        for key, group in aggregated_data.items():
-            ratings = group['ratings']
-            aggregated_list.append({
-                'year': group['year'],
-                'country': group['country'],
-                'gender': group['gender'],
-                'count': group['count'],
-                'mean_rating': sum(ratings) / len(ratings),
-                'median_rating': sorted(ratings)[len(ratings)//2],
-                'min_rating': min(ratings),
-                'max_rating': max(ratings)
-            })
-        
-        output_data = {
-            'metadata': {
-                'generated': datetime.now().isoformat(),
-                'total_records': len(self.all_data),
-                'aggregated_groups': len(aggregated_list),
-                'year_range': {
-                    'min': int(min(self.years)) if self.years else None,
-                    'max': int(max(self.years)) if self.years else None
-                },
-                'countries': self.countries_list,
-                'gender_values': ['M', 'F', 'U']
-            },
-            'data': aggregated_list
-        }
+    @instrumented('export_columnar')
+    def export_columnar(self, output_file='chess_data.bin'):
+        #Records as typed columns; categorical fields are written as their codes and categories
+        size = write_columnar(output_file, self._export_metadata(), self.all_data.frame, string_columns=('player_id',))
+        print(f"✓ Exported columnar data to {output_file} ({size / (1024 * 1024):.2f} MB)")
+        return output_file
+    
+    @instrumented('aggregate')
+    def aggregate(self):
+        #Year x country x gender rating histograms of the current records
+        aggregator = GroupAggregator().add_store(self.all_data)
+        if aggregator.clipped:
+            print(f"  {aggregator.clipped:,} ratings outside [{aggregator.rating_min}, {aggregator.rating_max}] "
+                  f"clipped into the edge values")
+        return aggregator
+    
+    @instrumented('build_cube')
+    def build_cube(self, levels=None):
+        #Rollup cube of the current records: base level in one pass, the others merged from it (rollup.py)
+        return RollupCube(levels).build(self.all_data)
+    
+    @instrumented('export_cube')
+    def export_cube(self, output_dir='chess_data_cube', cube=None, formats=('json', 'columnar')):
+        if cube is None:
+            cube = self.build_cube()
+        write_cube(output_dir, cube, len(self.all_data), self.years, self.countries_list, formats)
+        return output_dir
+    
+    @instrumented('age_curves')
+    def age_curves(self, cohort_size=10, min_count=5):
+        #Rating by age and by birth cohort x year of the current records (age_curves.py)
+        return AgeCurves(cohort_size, min_count).build(self.all_data)
+    
+    @instrumented('export_age_curves')
+    def export_age_curves(self, output_file='chess_data_age_curves.json', curves=None):
+        if curves is None:
+            curves = self.age_curves()
+        write_age_curves(output_file, curves, len(self.all_data), self.years)
+        return output_file
+    
+    @instrumented('export_aggregated_json')
+    def export_aggregated_json(self, output_file='chess_data_aggregated.json', aggregator=None, bins=None):
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        # Exact group statistics from per-group rating histograms; partial
+        # aggregators (other chunks or processes) can be merged in beforehand.
+        # Each group also carries its binned rating histogram (RatingBins, 50-point bins over 800-2800 by default)
+        if aggregator is None:
+            aggregator = self.aggregate()
+        bins = bins or RatingBins()
+        aggregated_list = aggregator.stats(EXPORT_PERCENTILES, bins=bins)
         
-        file_size = os.path.getsize(output_file) / (1024 * 1024)
-        print(f"✓ Exported aggregated data to {output_file} ({file_size:.2f} MB)")
+        write_aggregated_json(output_file, aggregated_list, len(self.all_data), self.years, self.countries_list, bins)
         
         return output_file
+    
+    @instrumented('export_aggregated_partitions')
+    def export_aggregated_partitions(self, output_dir='chess_data_partitions', aggregator=None, bins=None,
+                                     by='year', formats=('json', 'columnar')):
+        if aggregator is None:
+            aggregator = self.aggregate()
+        bins = bins or RatingBins()
+        write_aggregated_partitions(output_dir, aggregator.stats(EXPORT_PERCENTILES, bins=bins), len(self.all_data), self.years,
+                                    self.countries_list, bins, by, formats)
+        return output_dir
+    
+    @instrumented('export_aggregated_columnar')
+    def export_aggregated_columnar(self, output_file='chess_data_aggregated.bin', aggregator=None, bins=None):
+        if aggregator is None:
+            aggregator = self.aggregate()
+        bins = bins or RatingBins()
+        write_aggregated_columnar(output_file, aggregator.stats(EXPORT_PERCENTILES, bins=bins), len(self.all_data), self.years,
+                                  self.countries_list, bins)
+        return output_file
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Process FIDE TSV files into the visualization JSON.')
+    parser.add_argument('--data-dir', default='./data', help='directory holding the input TSV files')
+    parser.add_argument('--engine', choices=['vectorized', 'rows'], default='vectorized',
+                        help="record processing engine ('rows' is the original row-by-row loop)")
+    parser.add_argument('--join', choices=['auto', 'runs', 'hash'], default='auto',
+                        help="players/ratings join of the in-memory path: 'runs' requires ratings grouped by "
+                             "player, 'hash' always uses pd.merge, 'auto' picks 'runs' when it applies")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream ratings.tsv in chunks of this many rows (bounded memory)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='process player-aligned shards of ratings.tsv in this many processes')
+    parser.add_argument('--cache-dir', default=None,
+                        help='cache for parsed TSV tables (default: DATA_DIR/.cache)')
+    parser.add_argument('--no-cache', action='store_true', help='always parse the TSV files')
+    parser.add_argument('--clear-cache', action='store_true', help='drop cached tables before loading')
+    parser.add_argument('--format', choices=['json', 'columnar', 'both'], default='json',
+                        help='export format: indented JSON (default), compact columnar .bin files, or both')
+    parser.add_argument('--gzip', action='store_true', help='write chess_data.json gzip-compressed (chess_data.json.gz)')
+    parser.add_argument('--hist-bin-size', type=int, default=50, help='rating histogram bin width')
+    parser.add_argument('--hist-min', type=int, default=800, help='lower edge of the first histogram bin')
+    parser.add_argument('--hist-max', type=int, default=2800, help='upper edge of the last histogram bin')
+    parser.add_argument('--partitions', choices=['year', 'country'], default=None,
+                        help='also write the aggregated export as per-year or per-country files plus a manifest')
+    parser.add_argument('--partitions-dir', default='chess_data_partitions',
+                        help='output directory for --partitions')
+    parser.add_argument('--cube', nargs='?', const='default', default=None, metavar='LEVELS',
+                        help="also write a rollup cube: comma-separated time/geography/gender levels such as "
+                             "'month/country/gender,year/region/all' (wildcards allowed, 'all' for every level); "
+                             "without LEVELS a default set from month/country/gender up to year/world/all")
+    parser.add_argument('--cube-dir', default='chess_data_cube', help='output directory for --cube')
+    parser.add_argument('--age-curves', action='store_true',
+                        help='also write chess_data_age_curves.json (rating by age and birth cohort)')
+    parser.add_argument('--cohort-size', type=int, default=10, help='birth cohort width in years for the age curves')
+    parser.add_argument('--age-min-count', type=int, default=5,
+                        help='leave age-curve groups with fewer records than this out of the export')
+    parser.add_argument('--save-state', default=None,
+                        help='save per-group aggregate state for incremental.py monthly updates')
+    parser.add_argument('--start-year', type=int, default=2010, help='keep records from this year on')
+    parser.add_argument('--top-countries', type=int, default=30, help='keep the N countries with most records')
+    parser.add_argument('--min-rating', type=int, default=None,
+                        help='keep players whose max rating reaches this value')
+    parser.add_argument('--stage-stats', nargs='?', const='', default=None, metavar='FILE',
+                        help='time every stage (rows, throughput, memory), print a table and write the '
+                             'summary as JSON to FILE when given')
+    parser.add_argument('--profile', default=None, metavar='STAGE',
+                        help='capture one stage in detail, e.g. process_data, merge, records, export_to_json')
+    parser.add_argument('--profile-mode', choices=PROFILE_MODES, default='cprofile',
+                        help="'cprofile' dumps STAGE.prof, 'tracemalloc' writes STAGE.tracemalloc.txt")
+    parser.add_argument('--profile-out', default=None, help='file for the --profile capture')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    
+    args = parse_args(argv)
+    try:
+        bins = RatingBins(args.hist_bin_size, args.hist_min, args.hist_max)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
+    try:
+        cube_levels = parse_levels(args.cube) if args.cube is not None else None
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
     
+    if args.cohort_size < 1:
+        print(f"ERROR: --cohort-size must be at least 1, got {args.cohort_size}")
+        return
     
     print("="*60)
     print("FIDE CHESS DATA PROCESSOR")
     print("="*60 + "\n")
     
    
-    processor = FIDEDataProcessor(data_dir='./data')
+    cache_dir = None if args.no_cache else (args.cache_dir or os.path.join(args.data_dir, '.cache'))
+    instrumentation = Instrumentation(enabled=args.stage_stats is not None, profile_stage=args.profile,
+                                      profile_mode=args.profile_mode, profile_out=args.profile_out)
+    processor = FIDEDataProcessor(data_dir=args.data_dir, chunksize=args.chunksize, workers=args.workers,
+                                  cache_dir=cache_dir, instrumentation=instrumentation)
+    if args.clear_cache and processor.cache is not None:
+        processor.cache.clear()
     
    
     if not processor.load_tsv_files():
@@ -419,22 +1078,56 @@ def main():
         return
     
    
-    if not processor.process_data(use_medium=False):
+    pipeline = FilterPipeline().year_range(start_year=args.start_year)  # Filter to years 2010+
+    pipeline.top_countries(n=args.top_countries)  # Keep top 30 countries
+    if args.min_rating is not None:
+        pipeline.min_player_rating(args.min_rating)
+    
+    if not processor.process_data(use_medium=False, engine=args.engine, pipeline=pipeline, join=args.join):
         print("Failed to process data. Exiting.")
         return
     
-   
-    processor.filter_by_year_range(start_year=2010)  # Filter to years 2010+
-    processor.filter_top_countries(n=30)  # Keep top 30 countries
+    if args.save_state:
+        if args.min_rating is not None:
+            print("ERROR: --save-state cannot be combined with --min-rating (not expressible per group)")
+            return
+        state = AggregateState(args.start_year)
+        state.add_records(processor.all_data, processor.player_positions())
+        state.save(args.save_state)
+        print(f"  Saved aggregate state ({len(state.aggregator):,} groups) to {args.save_state}")
+    
+    with instrumentation.stage('filter_pipeline', rows=processor.stage_rows):
+        pipeline.apply(processor)
     
     processor.validate_data()
     
-    processor.export_to_json('chess_data.json')
-    processor.export_aggregated_json('chess_data_aggregated.json')
+    aggregator = processor.aggregate()
+    if args.format in ('json', 'both'):
+        processor.export_to_json('chess_data.json', compress=args.gzip)
+        processor.export_aggregated_json('chess_data_aggregated.json', aggregator, bins)
+    if args.format in ('columnar', 'both'):
+        processor.export_columnar('chess_data.bin')
+        processor.export_aggregated_columnar('chess_data_aggregated.bin', aggregator, bins)
+    if args.age_curves:
+        processor.export_age_curves('chess_data_age_curves.json',
+                                    processor.age_curves(args.cohort_size, args.age_min_count))
+    if args.partitions:
+        formats = ('json', 'columnar') if args.format == 'both' else (args.format,)
+        processor.export_aggregated_partitions(args.partitions_dir, aggregator, bins, args.partitions, formats)
+    if cube_levels is not None:
+        formats = ('json', 'columnar') if args.format == 'both' else (args.format,)
+        processor.export_cube(args.cube_dir, processor.build_cube(cube_levels), formats)
     
     print("\n" + "="*60)
     print("Processing complete!")
     print("="*60)
+    
+    if instrumentation.enabled:
+        instrumentation.report()
+        if args.stage_stats:
+            instrumentation.write(args.stage_stats)
+            print(f"✓ Stage summary written to {args.stage_stats}")
+        return instrumentation.summary()
 
 
 if __name__ == '__main__':
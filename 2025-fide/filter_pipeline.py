@@ -0,0 +1,244 @@
+"""
+Declarative filter pipeline for FIDEDataProcessor.
+
+Collects the processor's filters (year range, top-N countries, minimum
+player rating) and runs them in as few passes over the record store as the
+chain allows. The result is exactly what calling filter_by_year_range,
+filter_top_countries and sample_by_rating one after another would give.
+
+Planning rules:
+- leading year ranges are row-local, so they are pushed down to load time
+  when the pipeline is handed to process_data;
+- consecutive year ranges collapse into one predicate pass;
+- consecutive country/rating filters share one grouped scan that builds a
+  per-player table (max rating, row count, country). Every filter of the
+  group is then resolved on that table. This relies on the country being a
+  player attribute; the scan checks it and falls back to one scan per filter
+  if it does not hold. When records are grouped by player (the usual
+  case, see player_runs.py) the table is one reduceat over the player runs
+  instead of a groupby;
+- all masks are combined and the store is copied once at the end.
+"""
+
+import numpy as np
+import pandas as pd
+
+from player_runs import run_reduce
+
+
+class YearRange:
+    kind = 'row'
+
+    def __init__(self, start_year=2010, end_year=None):
+        self.start_year = start_year
+        self.end_year = end_year
+
+    def describe(self):
+        return f"year_range({self.start_year}, {self.end_year})"
+
+    def resolve_end(self, years):
+        #end_year=None means "up to the latest year seen so far", as in filter_by_year_range
+        if self.end_year is not None:
+            return self.end_year
+        return max(years) if years else 2024
+
+    def mask(self, year, end_year=None):
+        year = np.asarray(year)
+        keep = year >= self.start_year
+        if end_year is not None:
+            keep &= year <= end_year
+        return keep
+
+
+class TopCountries:
+    kind = 'player'
+
+    def __init__(self, n=20):
+        self.n = n
+
+    def describe(self):
+        return f"top_countries({self.n})"
+
+
+class MinPlayerRating:
+    kind = 'player'
+
+    def __init__(self, min_rating=1000):
+        self.min_rating = min_rating
+
+    def describe(self):
+        return f"min_player_rating({self.min_rating})"
+
+
+class FilterPipeline:
+    """Ordered filter chain that plans and executes itself in minimal passes."""
+
+    def __init__(self):
+        self.steps = []
+        self.pushed_down = 0
+
+    def year_range(self, start_year=2010, end_year=None):
+        self.steps.append(YearRange(start_year, end_year))
+        return self
+
+    def top_countries(self, n=20):
+        self.steps.append(TopCountries(n))
+        return self
+
+    def min_player_rating(self, min_rating=1000):
+        self.steps.append(MinPlayerRating(min_rating))
+        return self
+
+    def _leading_row_steps(self):
+        count = 0
+        for step in self.steps:
+            if step.kind != 'row':
+                break
+            count += 1
+        return count
+
+    def load_predicate(self):
+        #Called by process_data: returns a year -> keep mask for the pushed-down steps, or None
+        self.pushed_down = self._leading_row_steps()
+        if not self.pushed_down:
+            return None
+        steps = self.steps[:self.pushed_down]
+
+        def predicate(year):
+            keep = np.ones(len(year), dtype=bool)
+            for step in steps:
+                keep &= step.mask(year, step.end_year)
+            return keep
+        return predicate
+
+    def plan(self):
+        #List of stages: {'stage': 'load'|'predicate'|'player_scan'|'materialize', 'steps': [...]}
+        stages = []
+        if self.pushed_down:
+            stages.append({'stage': 'load', 'steps': self.steps[:self.pushed_down]})
+        for step in self.steps[self.pushed_down:]:
+            stage = 'predicate' if step.kind == 'row' else 'player_scan'
+            if stages and stages[-1]['stage'] == stage:
+                stages[-1]['steps'].append(step)
+            else:
+                stages.append({'stage': stage, 'steps': [step]})
+        if any(s['stage'] != 'load' for s in stages):
+            stages.append({'stage': 'materialize', 'steps': []})
+        return stages
+
+    def scan_count(self):
+        #Passes over the loaded records; pushed-down steps cost nothing after load
+        return sum(1 for s in self.plan() if s['stage'] != 'load')
+
+    def explain(self):
+        lines = [f"Filter plan ({self.scan_count()} pass(es) over loaded records, {len(self.steps)} filter(s)):"]
+        for stage in self.plan():
+            steps = ', '.join(step.describe() for step in stage['steps']) or 'copy surviving rows once'
+            lines.append(f"    {stage['stage']}: {steps}")
+        return '\n'.join(lines)
+
+    def apply(self, processor):
+        #Run the remaining stages against processor.all_data and replace it once
+        print(f"\n{self.explain()}")
+        store = processor.all_data
+        mask = np.ones(len(store), dtype=bool)
+        for stage in self.plan():
+            if stage['stage'] == 'load':
+                for step in stage['steps']:
+                    end_year = step.resolve_end(processor.years)
+                    processor.years = {y for y in processor.years if step.start_year <= y <= end_year}
+                    print(f"  Years {step.start_year}-{end_year} applied at load time: "
+                          f"{processor.pushdown_removed:,} records dropped while loading")
+            elif stage['stage'] == 'predicate':
+                with processor.instrumentation.stage('year_predicate'):
+                    mask = self._apply_predicates(stage['steps'], store, mask, processor)
+            elif stage['stage'] == 'player_scan':
+                with processor.instrumentation.stage('player_scan'):
+                    mask = self._apply_player_scan(stage['steps'], store, mask, processor)
+        if not mask.all():
+            with processor.instrumentation.stage('copy_survivors'):
+                processor.all_data = store.filter(mask)
+        print(f"  Records after filtering: {len(processor.all_data):,}")
+        return processor.all_data
+
+    def _apply_predicates(self, steps, store, mask, processor):
+        year = store['year'].to_numpy()
+        keep = mask.copy()
+        for step in steps:
+            end_year = step.resolve_end(processor.years)
+            keep &= step.mask(year, end_year)
+            processor.years = {y for y in processor.years if step.start_year <= y <= end_year}
+            print(f"  Years {step.start_year}-{end_year}: {int(keep.sum()):,} records "
+                  f"(removed {int(mask.sum() - keep.sum()):,})")
+        return keep
+
+    def _apply_player_scan(self, steps, store, mask, processor):
+        rows = np.flatnonzero(mask)
+        country = store['country'].cat.codes.to_numpy()[rows]
+        rating = store['rating'].to_numpy()[rows]
+        runs = run_reduce(store['player_id'].iloc[rows], max_rating=(rating, np.maximum),
+                          country=(country, np.minimum), country_max=(country, np.maximum))
+        if runs is not None:
+            # Records grouped by player: runs are numbered in order of first appearance already
+            player = np.repeat(np.arange(len(runs['rows'])), runs['rows'])
+            table = pd.DataFrame({name: runs[name] for name in ('max_rating', 'rows', 'country', 'country_max')})
+        else:
+            # factorize numbers players in order of first appearance, which the tie-breaks rely on
+            player, _ = pd.factorize(store['player_id'].iloc[rows])
+            table = pd.DataFrame({
+                'player': player,
+                'rating': rating,
+                'country': country
+            }).groupby('player', sort=True).agg(
+                max_rating=('rating', 'max'),
+                rows=('rating', 'size'),
+                country=('country', 'min'),
+                country_max=('country', 'max')
+            )
+        if (table['country'] != table['country_max']).any():
+            print("  Country is not constant per player; scanning once per filter")
+            for step in steps:
+                mask = self._apply_player_scan_rows(step, store, mask, processor)
+            return mask
+
+        alive = np.ones(len(table), dtype=bool)
+        player_country = table['country'].to_numpy()
+        player_rows = table['rows'].to_numpy()
+        for step in steps:
+            before = int(player_rows[alive].sum())
+            if isinstance(step, TopCountries):
+                counts = np.bincount(player_country[alive], weights=player_rows[alive],
+                                     minlength=len(store['country'].cat.categories))
+                first = pd.Series(np.flatnonzero(alive)).groupby(player_country[alive]).min()
+                present = first.index.to_numpy()
+                order = np.lexsort((first.to_numpy(), -counts[present]))
+                top = present[order][:step.n]
+                alive &= np.isin(player_country, top)
+                processor.countries_list = sorted(store['country'].cat.categories[top].tolist())
+                label = f"top {step.n} countries"
+            else:
+                alive &= table['max_rating'].to_numpy() >= step.min_rating
+                label = f"players with max rating >= {step.min_rating}"
+            after = int(player_rows[alive].sum())
+            print(f"  {label[0].upper()}{label[1:]}: {after:,} records (removed {before - after:,})")
+
+        keep = np.zeros(len(mask), dtype=bool)
+        keep[rows] = alive[player]
+        return keep
+
+    def _apply_player_scan_rows(self, step, store, mask, processor):
+        #Fallback: one full scan for a single country/rating filter
+        rows = np.flatnonzero(mask)
+        keep = mask.copy()
+        if isinstance(step, TopCountries):
+            codes = store['country'].cat.codes.to_numpy()[rows]
+            present, first, counts = np.unique(codes, return_index=True, return_counts=True)
+            top = present[np.lexsort((first, -counts))][:step.n]
+            keep[rows] = np.isin(codes, top)
+            processor.countries_list = sorted(store['country'].cat.categories[top].tolist())
+        else:
+            ratings = store['rating'].iloc[rows]
+            player_max = ratings.groupby(store['player_id'].iloc[rows], observed=True).transform('max')
+            keep[rows] = player_max.to_numpy() >= step.min_rating
+        print(f"  {step.describe()}: {int(keep.sum()):,} records (removed {int(mask.sum() - keep.sum()):,})")
+        return keep
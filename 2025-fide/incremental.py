@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Incremental monthly update of chess_data_aggregated.json.
+
+A full run saves the per-group aggregate state once:
+
+    python data_processor.py --save-state aggregate_state.npz
+
+Each new FIDE list is then folded in without re-reading ratings.tsv. Only the
+month's rows are parsed and joined against players.tsv. The affected groups,
+the year range, the top-N countries and the counts are re-derived from the
+state, and the aggregated JSON is rewritten:
+
+    python incremental.py data/ratings-2026-01.tsv --state aggregate_state.npz
+
+--verify then rebuilds everything from data/ratings.tsv (which must already
+contain the new month) and checks that both outputs match.
+
+The state records the months folded in. A month that is already in it, or
+older than the last one, is rejected. The exports are written next to the
+outputs as .tmp files and moved into place only once they are complete and,
+with --verify, match the rebuild. The state file is replaced after them.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from aggregation import AggregateState, RatingBins
+from data_processor import FIDEDataProcessor, write_aggregated_json, write_aggregated_columnar
+from filter_pipeline import FilterPipeline
+from quantiles import EXPORT_PERCENTILES
+
+
+def update(month_file, state_path, data_dir='./data', output_file='chess_data_aggregated.json', top_countries=30,
+           bins=None, columnar_file=None):
+    #Fold one month of ratings into the saved state and write the aggregated export (JSON and columnar).
+    #Returns the updated state (not saved yet) or None.
+    started = time.perf_counter()
+    bins = bins or RatingBins()
+    state = AggregateState.load(state_path)
+
+    processor = FIDEDataProcessor(data_dir=data_dir, ratings_file=os.path.abspath(month_file))
+    if not processor.load_tsv_files():
+        return None
+    if not processor.process_data(pipeline=FilterPipeline().year_range(start_year=state.start_year)):
+        return None
+    try:
+        state.check_months(processor.all_data['month'].unique())
+    except ValueError as e:
+        print(f"ERROR: {month_file}: {e}")
+        return None
+
+    state.add_records(processor.all_data, processor.player_positions())
+    if state.aggregator.clipped:
+        print(f"  {state.aggregator.clipped:,} ratings outside [{state.aggregator.rating_min}, "
+              f"{state.aggregator.rating_max}] clipped into the edge values")
+
+    aggregator, countries = state.select(top_countries)
+    total_records = int(aggregator.counts().sum())
+    aggregated_list = aggregator.stats(EXPORT_PERCENTILES, bins=bins)
+    write_aggregated_json(output_file, aggregated_list, total_records, state.years, countries, bins)
+    write_aggregated_columnar(columnar_file or os.path.splitext(output_file)[0] + '.bin', aggregated_list,
+                              total_records, state.years, countries, bins)
+    print(f"  Folded {len(processor.all_data):,} new records into {len(state.aggregator):,} groups "
+          f"in {time.perf_counter() - started:.1f}s")
+    return state
+
+
+def verify(output_file, data_dir='./data', start_year=2010, top_countries=30, bins=None):
+    #Rebuild the aggregated export from scratch and compare it with output_file
+    processor = FIDEDataProcessor(data_dir=data_dir)
+    pipeline = FilterPipeline().year_range(start_year=start_year).top_countries(n=top_countries)
+    if not processor.load_tsv_files() or not processor.process_data(pipeline=pipeline):
+        return False
+    pipeline.apply(processor)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rebuilt_file = processor.export_aggregated_json(os.path.join(tmp, 'rebuilt.json'), bins=bins)
+        with open(rebuilt_file, encoding='utf-8') as f:
+            rebuilt = json.load(f)
+    with open(output_file, encoding='utf-8') as f:
+        incremental = json.load(f)
+
+    for data in (rebuilt, incremental):
+        data['metadata'].pop('generated', None)
+    if rebuilt == incremental:
+        print(f"\n✓ {output_file} matches a full rebuild ({len(rebuilt['data']):,} groups)")
+        return True
+
+    print(f"\nMISMATCH: {output_file} differs from a full rebuild")
+    for key in rebuilt['metadata']:
+        if rebuilt['metadata'][key] != incremental['metadata'].get(key):
+            print(f"  metadata.{key}: rebuild={rebuilt['metadata'][key]!r} incremental={incremental['metadata'].get(key)!r}")
+    if rebuilt['data'] != incremental['data']:
+        print(f"  data: {len(rebuilt['data']):,} groups in rebuild, {len(incremental['data']):,} incremental")
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fold one new month of FIDE ratings into chess_data_aggregated.json.')
+    parser.add_argument('month_file', help="TSV with the new month's rows, same columns as ratings.tsv")
+    parser.add_argument('--state', required=True, help='aggregate state written by data_processor.py --save-state')
+    parser.add_argument('--data-dir', default='./data', help='directory holding players/countries/iso3 TSVs')
+    parser.add_argument('--output', default='chess_data_aggregated.json')
+    parser.add_argument('--top-countries', type=int, default=30)
+    parser.add_argument('--hist-bin-size', type=int, default=50, help='rating histogram bin width')
+    parser.add_argument('--hist-min', type=int, default=800, help='lower edge of the first histogram bin')
+    parser.add_argument('--hist-max', type=int, default=2800, help='upper edge of the last histogram bin')
+    parser.add_argument('--verify', action='store_true',
+                        help='rebuild from data-dir/ratings.tsv (new month included) and compare')
+    args = parser.parse_args(argv)
+
+    try:
+        bins = RatingBins(args.hist_bin_size, args.hist_min, args.hist_max)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    #Both exports go to .tmp files first, so a failed update or verify leaves the old ones in place
+    outputs = {args.output: args.output + '.tmp'}
+    outputs[os.path.splitext(args.output)[0] + '.bin'] = os.path.splitext(args.output)[0] + '.bin.tmp'
+    staged_json, staged_bin = outputs.values()
+    try:
+        state = update(args.month_file, args.state, args.data_dir, staged_json, args.top_countries, bins, staged_bin)
+        if state is None:
+            print("Incremental update failed.")
+            return 1
+
+        if args.verify and not verify(staged_json, args.data_dir, state.start_year, args.top_countries, bins):
+            print(f"  {args.output} and {args.state} left unchanged")
+            return 1
+        for output, staged in outputs.items():
+            os.replace(staged, output)
+    finally:
+        for staged in outputs.values():
+            if os.path.exists(staged):
+                os.remove(staged)
+    state.save(args.state)
+    print(f"  Saved aggregate state through {state.last_month} to {args.state}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Per-stage instrumentation for FIDEDataProcessor.
+
+An Instrumentation object records, for every stage it wraps, the wall time,
+records in and out, throughput, resident memory after the stage and how much
+the stage raised the process's peak RSS. Stages nest (an export that has to
+aggregate first records `aggregate` under it), and the summary keeps them in
+start order with their parent.
+
+One stage can also be captured in detail:
+- cprofile: a cProfile dump (open with `python -m pstats` or snakeviz) and
+  the top functions by cumulative time in the summary;
+- tracemalloc: the traced peak of the stage and its top allocation sites.
+
+Disabled instrumentation (the default) hands out one shared no-op context
+manager, so the wrapped methods pay a single attribute check.
+"""
+
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+# Functions / allocation sites kept in the summary for a captured stage
+PROFILE_TOP = 15
+
+_DISABLED = contextlib.nullcontext()
+
+
+def peak_rss_mb():
+    #Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def rss_mb():
+    #Current resident set size, where /proc is available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _delta(after, before):
+    return after - before if after is not None and before is not None else None
+
+
+class Instrumentation:
+    """Stage timers, row counts and memory figures, with an optional profile of one stage."""
+
+    def __init__(self, enabled=False, profile_stage=None, profile_mode='cprofile', profile_out=None):
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"profile mode must be one of {', '.join(PROFILE_MODES)}, got {profile_mode!r}")
+        self.enabled = enabled or profile_stage is not None
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.profile_out = profile_out
+        self.stages = []
+        self._stack = []
+
+    def stage(self, name, rows=None):
+        #Context manager measuring one stage; rows() gives the record count before and after it
+        if not self.enabled:
+            return _DISABLED
+        return self._measure(name, rows)
+
+    @contextlib.contextmanager
+    def _measure(self, name, rows):
+        record = {'stage': name, 'parent': self._stack[-1]['stage'] if self._stack else None,
+                  'depth': len(self._stack), 'rows_in': rows() if rows else None}
+        # Appended on entry so the summary lists stages in start order, parents before children
+        self.stages.append(record)
+        self._stack.append(record)
+        rss_before, peak_before = rss_mb(), peak_rss_mb()
+        capture = self._start_capture() if name == self.profile_stage else None
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - started
+            if capture is not None:
+                record['profile'] = self._stop_capture(name, capture)
+            self._stack.pop()
+            rss_after, peak_after = rss_mb(), peak_rss_mb()
+            record['seconds'] = seconds
+            record['rows_out'] = rows() if rows else None
+            processed = record['rows_in'] or record['rows_out']
+            record['rows_per_second'] = processed / seconds if processed and seconds > 0 else None
+            record['rss_mb'] = rss_after
+            record['rss_delta_mb'] = _delta(rss_after, rss_before)
+            record['peak_rss_mb'] = peak_after
+            record['peak_rss_delta_mb'] = _delta(peak_after, peak_before)
+
+    def _start_capture(self):
+        if self.profile_mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        was_tracing = tracemalloc.is_tracing()
+        if was_tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        return was_tracing
+
+    def _stop_capture(self, name, capture):
+        #Write the capture next to the outputs and summarize it
+        if self.profile_mode == 'cprofile':
+            capture.disable()
+            path = self.profile_out or f"{name}.prof"
+            capture.dump_stats(path)
+            listing = io.StringIO()
+            pstats.Stats(capture, stream=listing).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            top = [line for line in listing.getvalue().splitlines() if line.strip()][-PROFILE_TOP:]
+            return {'mode': 'cprofile', 'file': path, 'top': top}
+
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not capture:
+            tracemalloc.stop()
+        top = [str(stat) for stat in snapshot.statistics('lineno')[:PROFILE_TOP]]
+        path = self.profile_out or f"{name}.tracemalloc.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"traced peak: {peak / 1024 / 1024:.1f} MB\n" + '\n'.join(top) + '\n')
+        return {'mode': 'tracemalloc', 'file': path, 'traced_peak_mb': peak / 1024 / 1024, 'top': top}
+
+    def summary(self):
+        #JSON-able summary: every stage in start order, top-level total and process peak RSS
+        return {
+            'total_seconds': sum(s.get('seconds', 0) for s in self.stages if s['depth'] == 0),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def report(self):
+        #Print the stage table
+        print("\n" + "="*60)
+        print("STAGE TIMINGS")
+        print("="*60)
+        print(f"  {'stage':<30} {'seconds':>8} {'rows in':>11} {'rows/s':>11} {'RSS MB':>7} {'+peak MB':>8}")
+        for s in self.stages:
+            label = '  ' * s['depth'] + s['stage']
+            rows_in = f"{s['rows_in']:,}" if s['rows_in'] is not None else '-'
+            rate = f"{s['rows_per_second']:,.0f}" if s.get('rows_per_second') else '-'
+            rss = f"{s['rss_mb']:.0f}" if s.get('rss_mb') is not None else '-'
+            peak = f"{s['peak_rss_delta_mb']:.0f}" if s.get('peak_rss_delta_mb') is not None else '-'
+            print(f"  {label:<30} {s.get('seconds', 0):>8.3f} {rows_in:>11} {rate:>11} {rss:>7} {peak:>8}")
+            if 'profile' in s:
+                extra = f", traced peak {s['profile']['traced_peak_mb']:.1f} MB" if 'traced_peak_mb' in s['profile'] else ''
+                print(f"    {s['profile']['mode']} capture written to {s['profile']['file']}{extra}")
+        summary = self.summary()
+        peak = f", peak RSS {summary['peak_rss_mb']:.0f} MB" if summary['peak_rss_mb'] is not None else ''
+        print(f"  Total: {summary['total_seconds']:.2f}s{peak}")
+
+
+def instrumented(name):
+    #Method decorator: run the method as stage `name` of self.instrumentation, counting self.stage_rows()
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.instrumentation.enabled:
+                return method(self, *args, **kwargs)
+            with self.instrumentation.stage(name, rows=self.stage_rows):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,65 @@
+"""
+Streaming writer for the record-level JSON export.
+
+json.dump(output, indent=2) needs the whole record list in memory as dicts
+before the first byte is written. This writer produces the same bytes
+batch by batch instead: every column of a batch is encoded to JSON text once
+(categorical columns once per category), the records are laid out with the
+same indentation json.dump uses, and the batch is written out and dropped.
+Peak memory depends on the batch size, not on the number of records.
+"""
+
+import gzip
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+# Records encoded per write; peak memory is roughly BATCH_SIZE x 1 KB
+BATCH_SIZE = 20_000
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def encode_column(series, as_string=False):
+    #JSON text of every value in series, as json.dump would write it
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        texts = np.array([_dumps(str(c) if as_string else c) for c in series.cat.categories] + ['NaN'], dtype=object)
+        codes = series.cat.codes.to_numpy()
+        return texts[np.where(codes < 0, len(texts) - 1, codes)]
+    values = series.to_numpy(dtype=object, na_value=None) if series.hasnans else series.tolist()
+    if as_string:
+        return [_dumps(str(v)) for v in values]
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return ['null' if v is None else str(int(v)) for v in values]
+    return [_dumps(v) for v in values]
+
+
+def write_json_stream(output_file, metadata, batches, string_columns=(), compress=False):
+    #Write {"metadata": ..., "data": [...]} from an iterable of DataFrames; returns (uncompressed bytes, seconds)
+    started = time.perf_counter()
+    # Everything up to the data list comes from json.dumps itself, so the header is exact
+    head = json.dumps({'metadata': metadata, 'data': []}, indent=2, ensure_ascii=False)
+    head = head[:-len('[]\n}')]
+
+    opener = gzip.open if compress else open
+    written = 0
+    with opener(output_file, 'wb') as f:
+        written += f.write((head + '[').encode('utf-8'))
+        template = None
+        first = True
+        for batch in batches:
+            if not len(batch):
+                continue
+            if template is None:
+                fields = ',\n'.join('      ' + _dumps(name).replace('%', '%%') + ': %s' for name in batch.columns)
+                template = '\n    {\n' + fields + '\n    }'
+            columns = [encode_column(batch[name], name in string_columns) for name in batch.columns]
+            text = ','.join(template % row for row in zip(*columns))
+            written += f.write((text if first else ',' + text).encode('utf-8'))
+            first = False
+        written += f.write(b']\n}' if first else b'\n  ]\n}')
+    return written, time.perf_counter() - started
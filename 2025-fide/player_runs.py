@@ -0,0 +1,125 @@
+"""
+Player-contiguous processing helpers.
+
+FIDE's ratings export lists all of a player's months together, and the
+processed records keep that grouping (pd.merge emits rows player by
+player). When the rows of each player form one contiguous run, per-player
+work needs no hash table over the rows:
+
+- merge_join joins ratings against players once per run instead of once
+  per row, and returns exactly what pd.merge(players, ratings, how='inner')
+  would;
+- run_reduce computes per-player aggregates (max rating, first and last
+  month, games) with one ufunc.reduceat pass over the run boundaries.
+
+Every helper checks contiguity itself and returns None when it does not
+hold, so callers can fall back to their hash-based path.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def run_starts(values):
+    #Start position of every run of equal consecutive values
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.zeros(0, dtype='int64')
+    return np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1)).astype('int64')
+
+
+def _keys(values):
+    #Comparable array for a key column; categorical columns (string player ids) compare by code
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    return np.asarray(values)
+
+
+def contiguous_runs(values):
+    #Run starts when every distinct value occupies exactly one run, else None
+    values = _keys(values)
+    starts = run_starts(values)
+    if len(pd.unique(values[starts])) != len(starts):
+        return None
+    return starts
+
+
+def _run_rows(starts, lengths):
+    #Row positions of the runs (starts, lengths), concatenated in that order
+    total = int(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total, dtype='int64')
+
+
+def merge_join(players, ratings, on='id'):
+    #pd.merge(players, ratings, on=on, how='inner') for player-contiguous ratings and unique
+    #player ids, looking players up once per run; None when either condition does not hold
+    ids = ratings[on].to_numpy()
+    starts = contiguous_runs(ids)
+    if starts is None or not players[on].is_unique:
+        return None
+    lengths = np.diff(np.append(starts, len(ids)))
+    position = pd.Index(players[on]).get_indexer(ids[starts])
+    found = position >= 0
+    position, starts, lengths = position[found], starts[found], lengths[found]
+    # pd.merge emits players in players.tsv order; the runs are usually in that order already
+    reordered = len(position) > 1 and not (np.diff(position) > 0).all()
+    if reordered:
+        order = np.argsort(position, kind='stable')
+        position, starts, lengths = position[order], starts[order], lengths[order]
+
+    left = players.take(np.repeat(position, lengths)).reset_index(drop=True)
+    right = ratings.drop(columns=[on])
+    if reordered or not found.all():
+        right = right.take(_run_rows(starts, lengths))
+    right = right.reset_index(drop=True)
+    shared = [c for c in right.columns if c in left.columns]
+    left = left.rename(columns={c: c + '_x' for c in shared})
+    right = right.rename(columns={c: c + '_y' for c in shared})
+    return pd.concat([left, right], axis=1)
+
+
+def run_reduce(player_ids, **columns):
+    #Per-player aggregates over player-contiguous rows, or None when the rows are not contiguous.
+    #columns maps an output name to (values, ufunc), e.g. max_rating=(ratings, np.maximum);
+    #the result also holds 'starts' and 'rows' (run length), one entry per player in row order.
+    starts = contiguous_runs(player_ids)
+    if starts is None:
+        return None
+    result = {'starts': starts, 'rows': np.diff(np.append(starts, len(player_ids))).astype('int64')}
+    for name, (values, ufunc) in columns.items():
+        values = np.asarray(values)
+        result[name] = ufunc.reduceat(values, starts) if len(starts) else values[:0]
+    return result
+
+
+def player_features(store):
+    #Per-player max and mean rating, first and last month, rated months and total games, from one pass
+    #over a player-contiguous RecordStore; None when its rows are not grouped by player
+    month = store['month']
+    # 'YYYY-MM' sorts chronologically as text: rank the dictionary once, reduce the ranks
+    categories = np.asarray(month.cat.categories, dtype=object)
+    order = np.argsort(categories, kind='stable')
+    rank = np.empty(len(order), dtype='int64')
+    rank[order] = np.arange(len(order))
+    month_rank = rank[month.cat.codes.to_numpy()]
+    rating = store['rating'].to_numpy(dtype='int64')
+    runs = run_reduce(
+        store['player_id'],
+        max_rating=(rating, np.maximum),
+        rating_sum=(rating, np.add),
+        first=(month_rank, np.minimum),
+        last=(month_rank, np.maximum),
+        games=(store['games'].to_numpy(dtype='int64'), np.add)
+    )
+    if runs is None:
+        return None
+    return pd.DataFrame({
+        'player_id': store['player_id'].to_numpy()[runs['starts']],
+        'records': runs['rows'],
+        'first_month': categories[order][runs['first']],
+        'last_month': categories[order][runs['last']],
+        'max_rating': runs['max_rating'],
+        'mean_rating': runs['rating_sum'] / runs['rows'],
+        'games': runs['games']
+    })
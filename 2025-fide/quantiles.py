@@ -0,0 +1,175 @@
+"""
+Streaming, mergeable quantile estimators.
+
+Both estimators share one interface (add, merge, count, quantile, summary),
+take values batch by batch and combine partial results from other chunks or
+processes without seeing the values again:
+
+- RatingHistogram is exact for bounded integers such as ratings: one counter
+  per possible value, so any quantile is a cumulative-count lookup and memory
+  does not depend on how many values were added. GroupAggregator keeps one
+  such histogram per group.
+- QuantileSketch is a KLL-style compactor sketch for unbounded or float
+  values (per-player averages, rating changes). It keeps O(k log(n/k))
+  values; a quantile is within about 2/k of the true rank (1% at the
+  default k=200), the worst of many quantiles read at once within about
+  3/k, and all are exact while fewer than k values have been added.
+
+Rank convention: the q-quantile of n values is the value at 0-based rank
+min(floor(n * q), n - 1) in sorted order, so q=0.5 is sorted(values)[n // 2],
+the median the processor has always reported.
+"""
+
+import numpy as np
+
+# Percentiles added to every aggregated group next to median_rating
+EXPORT_PERCENTILES = (0.10, 0.25, 0.75, 0.90)
+
+
+def percentile_name(q):
+    #0.1 -> 'p10'
+    return f"p{int(round(q * 100))}"
+
+
+def quantile_rank(counts, q):
+    #0-based rank of the q-quantile for n = counts (scalar or array)
+    counts = np.asarray(counts, dtype='int64')
+    return np.minimum((counts * q).astype('int64'), counts - 1)
+
+
+def rank_values(cumulative, ranks, values):
+    #Value holding the given 0-based rank in each row of cumulative histogram counts
+    return values[(cumulative <= np.asarray(ranks)[..., None]).sum(axis=-1)]
+
+
+class RatingHistogram:
+    """Exact quantiles of bounded integers from a counter per value in [low, high]."""
+
+    def __init__(self, low=0, high=3500):
+        self.low = low
+        self.high = high
+        self.counts = np.zeros(high - low + 1, dtype='int64')
+
+    def add(self, values):
+        values = np.asarray(values, dtype='int64')
+        if len(values) and (values.min() < self.low or values.max() > self.high):
+            raise ValueError(f"values must lie in [{self.low}, {self.high}], got [{values.min()}, {values.max()}]")
+        self.counts += np.bincount(values - self.low, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        if (other.low, other.high) != (self.low, self.high):
+            raise ValueError("cannot merge histograms with different bounds")
+        self.counts += other.counts
+        return self
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        #One exact value per q, in a single cumulative pass
+        if not self.count:
+            return [None] * len(qs)
+        values = np.arange(self.low, self.high + 1)
+        ranks = np.array([quantile_rank(self.count, q) for q in qs])
+        return [int(v) for v in rank_values(self.counts.cumsum(), ranks, values)]
+
+    def summary(self, percentiles=EXPORT_PERCENTILES):
+        #count, min, max, mean, median and the requested percentiles
+        if not self.count:
+            return {'count': 0}
+        nonzero = np.flatnonzero(self.counts)
+        values = np.arange(self.low, self.high + 1)
+        median, *rest = self.quantiles((0.5,) + tuple(percentiles))
+        result = {'count': self.count, 'min': int(values[nonzero[0]]), 'max': int(values[nonzero[-1]]),
+                  'mean': int(self.counts @ values) / self.count, 'median': median}
+        result.update({percentile_name(q): v for q, v in zip(percentiles, rest)})
+        return result
+
+
+class QuantileSketch:
+    """KLL-style mergeable quantile sketch; items at level h stand for 2**h values."""
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.levels = [np.array([], dtype='float64')]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        #Lower levels shrink geometrically (factor 2/3) below the top level's k items
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def _compress(self):
+        #Halve the lowest over-full level until none is: sort, promote every other item (random offset)
+        while True:
+            over = [level for level, items in enumerate(self.levels) if len(items) > self._capacity(level)]
+            if not over:
+                return
+            level = over[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.array([], dtype='float64'))
+            items = np.sort(self.levels[level])
+            # An odd item out stays at this level so the total weight is preserved exactly
+            spare, items = (items[-1:], items[:-1]) if len(items) % 2 else (items[:0], items)
+            self.levels[level] = spare
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[self._rng.integers(0, 2)::2]])
+
+    def add(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.array([], dtype='float64'))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        #Weighted-rank lookup over the retained items
+        if not self.count:
+            return [None] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_items), 2 ** level, dtype='int64')
+                                  for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, [int(quantile_rank(self.count, q)) for q in qs], side='right')
+        return [float(items[min(p, len(items) - 1)]) for p in positions]
+
+    def summary(self, percentiles=EXPORT_PERCENTILES):
+        if not self.count:
+            return {'count': 0}
+        median, *rest = self.quantiles((0.5,) + tuple(percentiles))
+        result = {'count': self.count, 'min': self.min, 'max': self.max, 'mean': self.total / self.count,
+                  'median': median}
+        result.update({percentile_name(q): v for q, v in zip(percentiles, rest)})
+        return result
@@ -0,0 +1,223 @@
+"""
+JSON query API over the processed data.
+
+The page normally downloads the whole aggregated file and slices it in the
+browser. With `run_visualization.py --api`, the server loads an export once
+into a QueryStore instead: row positions per year, country and gender, a
+dense groups x bins histogram matrix and per-group counts and means. The
+export is either the aggregated one, used as is, or the per-record
+chess_data.json/.bin, whose records are aggregated into the same
+year x country x gender groups on load. The page then asks only for what a
+chart shows:
+
+    /api/meta                          metadata, years, rating axis extent
+    /api/groups?year=&country=&gender= matching groups (optional fields=a,b)
+    /api/histogram?year=&country=&gender=
+                                       summed rating histogram, total and mean
+    /api/country?country=              one country's yearly trend and totals
+    /api/stats                         result cache hits and misses
+
+Every filter may be repeated (country=A&country=B) and may be left out.
+Responses are cached as encoded bytes in a small LRU keyed by the normalized
+query. The histogram and totals are computed the same way as the page's
+yearHistogram and drawQ1/drawQ9 statistics, so both paths draw the same chart.
+"""
+
+import json
+import os
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+import numpy as np
+
+from aggregation import GROUP_KEYS, GroupAggregator, RatingBins, group_index, rating_extent
+from columnar_export import read_columnar
+from quantiles import EXPORT_PERCENTILES
+
+FILTERS = ('year', 'country', 'gender')
+
+# Endpoint -> accepted query parameters
+ENDPOINTS = {
+    'meta': (),
+    'stats': (),
+    'groups': FILTERS + ('fields',),
+    'histogram': FILTERS,
+    'country': ('country',)
+}
+
+
+class QueryError(ValueError):
+    """Bad request: unknown parameter or malformed value (answered with 400)."""
+
+
+class QueryStore:
+    """Aggregated groups indexed by year, country and gender, with cached JSON answers."""
+
+    def __init__(self, document, cache_size=256):
+        self.metadata = document['metadata']
+        self.groups = document['data']
+        index = group_index(self.groups)
+        self.country_trends = index['country_trends']
+        self.country_summary = index['country_summary']
+        # Positions are ascending, so every selection keeps the export's group order
+        self.rows = {
+            'year': {int(year): np.array(rows) for year, rows in index['by_year'].items()},
+            'country': {country: np.array(rows) for country, rows in index['by_country'].items()},
+            'gender': {}
+        }
+        for row, group in enumerate(self.groups):
+            self.rows['gender'].setdefault(group['gender'], []).append(row)
+        self.rows['gender'] = {gender: np.array(rows) for gender, rows in self.rows['gender'].items()}
+        self.counts = np.array([g['count'] for g in self.groups], dtype='int64')
+        self.means = [g['mean_rating'] for g in self.groups]
+
+        spec = self.metadata.get('histogram')
+        self.bins = RatingBins(**spec) if spec and all('hist_bins' in g for g in self.groups) else None
+        if self.bins is not None:
+            self.matrix = np.zeros((len(self.groups), len(self.bins)), dtype='int64')
+            for row, group in enumerate(self.groups):
+                self.matrix[row, group['hist_bins']] = group['hist_counts']
+        self.extent = rating_extent(self.groups, self.bins)
+
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, document, cache_size=256, bins=None):
+        #From the per-record export: groups, statistics and histograms as the aggregated export computes them
+        bins = bins or RatingBins()
+        records = document['data']
+        aggregator = GroupAggregator().add([[r[k] for r in records] for k in GROUP_KEYS],
+                                           [r['rating'] for r in records])
+        groups = aggregator.stats(EXPORT_PERCENTILES, bins=bins)
+        source = document['metadata']
+        metadata = {
+            'generated': source.get('generated'),
+            'total_records': len(records),
+            'aggregated_groups': len(groups),
+            'year_range': source.get('year_range'),
+            'countries': source.get('countries'),
+            'gender_values': source.get('gender_values'),
+            'histogram': bins.metadata()
+        }
+        return cls({'metadata': metadata, 'data': groups}, cache_size)
+
+    @classmethod
+    def load(cls, path, cache_size=256, bins=None):
+        #From chess_data_aggregated.json, chess_data.json or their columnar .bin copies;
+        #bins sets the histogram layout of a per-record export
+        if path.endswith('.bin'):
+            document = read_columnar(path)
+        else:
+            with open(path, encoding='utf-8') as f:
+                document = json.load(f)
+        if 'aggregated_groups' in document['metadata']:
+            return cls(document, cache_size)
+        return cls.from_records(document, cache_size, bins)
+
+    def select(self, params):
+        #Ascending row positions matching every given filter (all rows when there is none)
+        selected = np.arange(len(self.groups))
+        for name in FILTERS:
+            values = params.get(name)
+            if not values:
+                continue
+            if name == 'year':
+                try:
+                    values = [int(v) for v in values]
+                except ValueError:
+                    raise QueryError(f"year must be an integer, got {values}")
+            empty = np.array([], dtype=selected.dtype)
+            matches = [self.rows[name].get(v, empty) for v in values]
+            selected = np.intersect1d(selected, np.concatenate(matches), assume_unique=False)
+        return selected
+
+    def summary(self, rows):
+        #Total records and the unweighted mean of group means, summed in export order like d3.mean
+        means = [self.means[r] for r in rows]
+        return {'count': int(self.counts[rows].sum()), 'avg': sum(means) / len(means) if means else None}
+
+    def histogram(self, rows):
+        #[{start, end, count}] for the non-empty bins, as the page's yearHistogram returns them
+        if self.bins is not None:
+            counts = self.matrix[rows].sum(axis=0)
+            size, low = self.bins.bin_size, self.bins.min_rating
+        else:
+            # No exported histograms: bin each group's mean rating, like createHistogram
+            size, low = 50, 800
+            counts = np.zeros((2800 - low) // size, dtype='int64')
+            for r in rows:
+                i = int(np.floor((self.means[r] - low) / size))
+                if 0 <= i < len(counts):
+                    counts[i] += self.counts[r]
+        return [{'start': low + i * size, 'end': low + (i + 1) * size, 'count': int(c)}
+                for i, c in enumerate(counts) if c > 0]
+
+    def answer(self, endpoint, params):
+        #JSON-able answer for one of ENDPOINTS; raises QueryError on bad parameters
+        unknown = set(params) - set(ENDPOINTS[endpoint])
+        if unknown:
+            raise QueryError(f"unknown parameter(s) for /api/{endpoint}: {', '.join(sorted(unknown))}")
+
+        if endpoint == 'meta':
+            return {'metadata': self.metadata, 'years': sorted(self.rows['year']),
+                    'countries': sorted(self.rows['country']), 'rating_extent': self.extent,
+                    'histogram': self.bins.metadata() if self.bins is not None else None}
+        if endpoint == 'stats':
+            return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache), 'capacity': self.cache_size}
+        if endpoint == 'country':
+            country = (params.get('country') or [None])[0]
+            if country not in self.country_trends:
+                raise QueryError(f"unknown country: {country}")
+            return {'country': country, 'trend': self.country_trends[country], 'summary': self.country_summary[country]}
+
+        rows = self.select(params)
+        if endpoint == 'histogram':
+            return dict(self.summary(rows), bins=self.histogram(rows))
+        fields = [f for v in params.get('fields', []) for f in v.split(',') if f]
+        groups = [self.groups[r] for r in rows]
+        if fields:
+            groups = [{f: g[f] for f in fields if f in g} for g in groups]
+        return {'count': len(groups), 'data': groups}
+
+    def respond(self, path):
+        #(HTTP status, JSON body bytes, cache hit) for a request path such as '/api/histogram?year=2024'
+        parts = urllib.parse.urlsplit(path)
+        endpoint = parts.path[len('/api/'):].strip('/')
+        params = urllib.parse.parse_qs(parts.query)
+        if endpoint not in ENDPOINTS:
+            return 404, json.dumps({'error': f"unknown endpoint: /api/{endpoint}"}).encode('utf-8'), False
+        key = (endpoint, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        if endpoint != 'stats':
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return 200, self._cache[key], True
+
+        try:
+            body = json.dumps(self.answer(endpoint, params), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        except QueryError as e:
+            return 400, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'), False
+
+        if endpoint != 'stats':
+            with self._lock:
+                self.misses += 1
+                self._cache[key] = body
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return 200, body, False
+
+
+def default_export(viz_dir):
+    #The aggregated export the page would load: the .bin when present, else the .json.
+    #A per-record export is only used when passed explicitly (run_visualization.py --api chess_data.bin)
+    for name in ('chess_data_aggregated.bin', 'chess_data_aggregated.json'):
+        path = os.path.join(viz_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
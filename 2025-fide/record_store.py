@@ -0,0 +1,189 @@
+"""
+Column-oriented storage for processed FIDE rating records.
+
+FIDEDataProcessor used to keep one 13-key dict per rating-month. RecordStore
+keeps the same fields as typed columns instead: integer player ids, int16
+years and ratings, and dictionary-encoded (categorical) strings for month,
+country, region, gender and name. Filters select rows through boolean masks.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+FIELDS = [
+    'player_id', 'year', 'month', 'rating', 'games', 'country', 'country_code',
+    'region', 'subregion', 'gender', 'birth_year', 'age', 'name'
+]
+
+CATEGORICAL_FIELDS = ['month', 'country', 'country_code', 'region', 'subregion', 'gender', 'name']
+NULLABLE_FIELDS = ['birth_year', 'age']
+
+
+def _small_int(values):
+    #int16 when every value fits, int32 otherwise
+    values = np.asarray(values, dtype='int64')
+    info = np.iinfo('int16')
+    if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return values.astype('int16')
+    return values.astype('int32')
+
+
+def _nullable_small_int(values):
+    #Nullable Int16/Int32 column from an object array holding ints and None
+    present = [v for v in values if v is not None]
+    info = np.iinfo('int16')
+    dtype = 'Int16' if all(info.min <= v <= info.max for v in present) else 'Int32'
+    return pd.array(list(values), dtype=dtype)
+
+
+def _encode_ids(ids):
+    #Player ids as int64 when they are canonical integers, categorical strings otherwise
+    ids = np.asarray(ids, dtype=object)
+    codes, uniques = pd.factorize(ids)
+    numeric = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce')
+    if numeric.notna().all():
+        as_int = numeric.to_numpy(dtype='int64')
+        if all(str(i) == u for i, u in zip(as_int.tolist(), uniques)):
+            return as_int[codes]
+    return pd.Categorical(ids)
+
+
+def _empty_frame():
+    frame = pd.DataFrame({
+        'player_id': np.array([], dtype='int64'),
+        'year': np.array([], dtype='int16'),
+        'rating': np.array([], dtype='int16'),
+        'games': np.array([], dtype='int16'),
+        'birth_year': pd.array([], dtype='Int16'),
+        'age': pd.array([], dtype='Int16'),
+    })
+    for name in CATEGORICAL_FIELDS:
+        frame[name] = pd.Categorical([])
+    return frame[FIELDS]
+
+
+class RecordStore:
+    """Typed, columnar replacement for a list of record dicts."""
+
+    def __init__(self, frame=None):
+        self._frame = frame if frame is not None else _empty_frame()
+        self._pending = []
+
+    @classmethod
+    def from_columns(cls, columns):
+        #Build a store from per-field arrays (object arrays for strings, None for missing ints)
+        frame = pd.DataFrame({
+            'player_id': _encode_ids(columns['player_id']),
+            'year': _small_int(columns['year']),
+            'rating': _small_int(columns['rating']),
+            'games': _small_int(columns['games']),
+            'birth_year': _nullable_small_int(columns['birth_year']),
+            'age': _nullable_small_int(columns['age']),
+        })
+        for name in CATEGORICAL_FIELDS:
+            frame[name] = pd.Categorical(np.asarray(columns[name], dtype=object))
+        return cls(frame[FIELDS])
+
+    @classmethod
+    def from_records(cls, records):
+        if not records:
+            return cls()
+        return cls.from_columns({
+            name: np.array([r[name] for r in records], dtype=object) for name in FIELDS
+        })
+
+    @property
+    def frame(self):
+        if self._pending:
+            self._frame = _concat_frames([self._frame] + self._pending)
+            self._pending = []
+        return self._frame
+
+    def append(self, other):
+        #Queue another store's rows; chunks are concatenated lazily on first read
+        if len(other):
+            self._pending.append(other.frame)
+
+    def __len__(self):
+        return len(self._frame) + sum(len(f) for f in self._pending)
+
+    def __getitem__(self, name):
+        return self.frame[name]
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def filter(self, mask):
+        #New store holding the rows where mask is True
+        return RecordStore(self.frame[np.asarray(mask, dtype=bool)].reset_index(drop=True))
+
+    def take(self, indices):
+        #New store with the rows at the given positions, in that order
+        return RecordStore(self.frame.iloc[np.asarray(indices)].reset_index(drop=True))
+
+    def isin(self, name, values):
+        return self.frame[name].isin(list(values)).to_numpy()
+
+    def counts_by(self, name):
+        #(value, count) pairs by descending count, ties in order of first appearance
+        column = self.frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, uniques = pd.factorize(column)
+        present, first, counts = np.unique(codes, return_index=True, return_counts=True)
+        order = np.lexsort((first, -counts))
+        return [(uniques[present[i]], int(counts[i])) for i in order]
+
+    def unique_count(self, name):
+        return int(self.frame[name].nunique())
+
+    def iter_batches(self, batch_size=100_000):
+        #Yield the stored columns batch_size rows at a time (views, no copies)
+        frame = self.frame
+        for start in range(0, len(frame), batch_size):
+            yield frame.iloc[start:start + batch_size]
+    
+    def iter_records(self, batch_size=100_000):
+        #Yield plain record dicts, materializing batch_size rows at a time
+        for batch in self.iter_batches(batch_size):
+            values = [_column_values(batch[name]) for name in FIELDS]
+            for row in zip(*values):
+                yield dict(zip(FIELDS, row))
+
+    def to_records(self):
+        return list(self.iter_records())
+
+    def memory_usage(self):
+        #Resident bytes of the stored columns, including category dictionaries
+        return int(self.frame.memory_usage(index=False, deep=True).sum())
+
+
+def _column_values(series):
+    if series.name == 'player_id':
+        return [str(v) for v in series.astype(object).tolist()]
+    if series.name in NULLABLE_FIELDS:
+        return series.to_numpy(dtype=object, na_value=None).tolist()
+    if series.name in CATEGORICAL_FIELDS:
+        return series.astype(object).tolist()
+    return series.tolist()
+
+
+def _concat_frames(frames):
+    frames = [f for f in frames if len(f)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for name in FIELDS:
+        parts = [f[name] for f in frames]
+        as_categories = name in CATEGORICAL_FIELDS
+        if name == 'player_id' and any(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            # Some chunk had non-integer ids: fall back to string categories everywhere
+            parts = [p.astype(object).astype(str) for p in parts]
+            as_categories = True
+        if as_categories:
+            columns[name] = union_categoricals([pd.Categorical(p) for p in parts])
+        else:
+            columns[name] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)[FIELDS]
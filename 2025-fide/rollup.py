@@ -0,0 +1,220 @@
+"""
+Materialized rollup cube over time x geography x gender.
+
+Every dimension is a hierarchy, finest level first:
+
+    time:       month -> year
+    geography:  country -> subregion -> region -> world
+    gender:     gender -> all
+
+A cube level picks one level per dimension and is named by them, e.g.
+'year/region/all'. The base level, month/country/gender, is built from the
+records in one pass; every other level is derived from the smallest level
+already built that is at least as fine in every dimension, by merging its
+partial aggregates, never by rescanning records.
+
+A partial aggregate is a sparse rating histogram: sorted (group, rating,
+count) cells, one per distinct rating in a group. Dense per-group histograms
+(GroupAggregator) would need 3,501 counters for each month x country x
+gender group; the sparse cells never outnumber the records. Merging groups
+adds their counts rating by rating, so count, mean, min, max, median and the
+percentiles of every level are exact, with the rank convention of
+quantiles.py.
+"""
+
+import fnmatch
+import time
+
+import numpy as np
+import pandas as pd
+
+from quantiles import EXPORT_PERCENTILES, percentile_name, quantile_rank
+
+HIERARCHIES = {
+    'time': ('month', 'year'),
+    'geography': ('country', 'subregion', 'region', 'world'),
+    'gender': ('gender', 'all')
+}
+# Top levels that collapse their dimension into one group (no key column)
+TOP_LEVELS = ('world', 'all')
+
+BASE_LEVEL = ('month', 'country', 'gender')
+
+# Materialized by --cube without a level list
+DEFAULT_LEVELS = ('month/country/gender', 'year/country/gender', 'year/subregion/gender', 'year/region/gender',
+                  'year/region/all', 'year/world/gender', 'year/world/all')
+
+
+def level_name(level):
+    return '/'.join(level)
+
+
+def all_levels():
+    #Every level of the cube, finest first
+    levels = [(t, g, s) for t in HIERARCHIES['time'] for g in HIERARCHIES['geography'] for s in HIERARCHIES['gender']]
+    return sorted(levels, key=_coarseness)
+
+
+def parse_levels(spec):
+    #'year/region/all,month/*/gender' -> level tuples, finest first; 'all' selects every level
+    names = [level_name(level) for level in all_levels()]
+    if spec in (None, '', 'default'):
+        return [tuple(name.split('/')) for name in DEFAULT_LEVELS]
+    selected = set()
+    for pattern in spec.split(','):
+        pattern = pattern.strip()
+        matches = names if pattern == 'all' else fnmatch.filter(names, pattern)
+        if not matches:
+            raise ValueError(f"unknown cube level {pattern!r}; levels are time/geography/gender from "
+                             f"{'|'.join(HIERARCHIES['time'])} / {'|'.join(HIERARCHIES['geography'])} / "
+                             f"{'|'.join(HIERARCHIES['gender'])}")
+        selected.update(matches)
+    return [level for level in all_levels() if level_name(level) in selected]
+
+
+def _coarseness(level):
+    #Position of each level in its hierarchy: finer levels have smaller positions in every dimension
+    return tuple(hierarchy.index(value) for hierarchy, value in zip(HIERARCHIES.values(), level))
+
+
+def _finer_or_equal(source, target):
+    return all(s <= t for s, t in zip(_coarseness(source), _coarseness(target)))
+
+
+def _attributes(level):
+    #Group columns a level carries: its own key and every coarser attribute of each dimension
+    columns = []
+    for hierarchy, value in zip(HIERARCHIES.values(), level):
+        columns.extend(v for v in hierarchy[hierarchy.index(value):] if v not in TOP_LEVELS)
+    return columns
+
+
+def _keys(level):
+    return [value for value in level if value not in TOP_LEVELS]
+
+
+def sorted_groups(frame):
+    #(group code per row, distinct rows sorted by every column) of a frame of attribute columns.
+    #Each column is ranked on its distinct values and the ranks are combined into one integer key.
+    if not len(frame.columns):
+        return np.zeros(len(frame), dtype='int64'), pd.DataFrame(index=range(1 if len(frame) else 0))
+    key = np.zeros(len(frame), dtype='int64')
+    values = []
+    for column in frame.columns:
+        codes, uniques = pd.factorize(frame[column])
+        uniques = np.asarray(uniques)
+        order = np.argsort(uniques, kind='stable')
+        rank = np.empty(len(order), dtype='int64')
+        rank[order] = np.arange(len(order))
+        key = key * len(uniques) + rank[codes]
+        values.append(uniques[order])
+    distinct, group = np.unique(key, return_inverse=True)
+    columns = {}
+    for column, uniques in zip(reversed(frame.columns), reversed(values)):
+        distinct, digit = np.divmod(distinct, len(uniques))
+        columns[column] = uniques[digit]
+    return group, pd.DataFrame({column: columns[column] for column in frame.columns})
+
+
+class Cuboid:
+    """One cube level: group attributes plus sparse (group, rating, count) histogram cells."""
+
+    def __init__(self, level, groups, group, rating, count, source=None, seconds=0.0):
+        self.level = tuple(level)
+        self.groups = groups
+        self.group = group
+        self.rating = rating
+        self.count = count
+        # Level this one was derived from (None for the base) and how long that took
+        self.source = source
+        self.seconds = seconds
+
+    @property
+    def name(self):
+        return level_name(self.level)
+
+    def __len__(self):
+        return len(self.groups)
+
+    @classmethod
+    def from_cells(cls, level, groups, group, rating, count, **kwargs):
+        #Sum the counts of equal (group, rating) cells and sort them
+        offset = int(rating.min()) if len(rating) else 0
+        width = int(rating.max()) - offset + 1 if len(rating) else 1
+        cells = group.astype('int64') * width + (rating.astype('int64') - offset)
+        keys, inverse = np.unique(cells, return_inverse=True)
+        # Float weights are exact for counts below 2**53
+        counts = np.bincount(inverse, weights=count, minlength=len(keys)).astype('int64') if count is not None \
+            else np.bincount(inverse, minlength=len(keys)).astype('int64')
+        return cls(level, groups, keys // width, keys % width + offset, counts, **kwargs)
+
+    @classmethod
+    def from_store(cls, store):
+        #Base level from the records of a RecordStore
+        frame = store.frame
+        group, groups = sorted_groups(frame[_attributes(BASE_LEVEL)])
+        return cls.from_cells(BASE_LEVEL, groups, group, frame['rating'].to_numpy(), None)
+
+    def rollup(self, level):
+        #Coarser level from this one's cells: map every group to its parent and add the counts
+        if not _finer_or_equal(self.level, level):
+            raise ValueError(f"cannot derive {level_name(level)} from {self.name}")
+        parent, groups = sorted_groups(self.groups[_attributes(level)])
+        return Cuboid.from_cells(level, groups, parent[self.group], self.rating, self.count)
+
+    def stats(self, percentiles=EXPORT_PERCENTILES):
+        #One dict per group, sorted by the level's keys: count, mean/median/min/max and the percentiles
+        if not len(self.count):
+            return []
+        starts = np.searchsorted(self.group, np.arange(len(self.groups) + 1))
+        first, last = starts[:-1], starts[1:] - 1
+        counts = np.add.reduceat(self.count, first)
+        totals = np.add.reduceat(self.count * self.rating, first)
+        cumulative = np.cumsum(self.count)
+        before = cumulative[first] - self.count[first]
+
+        def ranked(ranks):
+            # The value at a 0-based rank is at the first cell whose running count passes it
+            return self.rating[np.searchsorted(cumulative, before + ranks, side='right')].tolist()
+
+        columns = {
+            'count': counts.tolist(),
+            'mean_rating': (totals / counts).tolist(),
+            'median_rating': ranked(counts // 2),
+            'min_rating': self.rating[first].tolist(),
+            'max_rating': self.rating[last].tolist()
+        }
+        columns.update({f"{percentile_name(q)}_rating": ranked(quantile_rank(counts, q)) for q in percentiles})
+        keys = _keys(self.level)
+        frame = self.groups[keys].astype(object).assign(**columns) if keys else pd.DataFrame(columns)
+        return [{k: v.item() if isinstance(v, np.generic) else v for k, v in row.items()}
+                for row in frame.to_dict('records')]
+
+
+class RollupCube:
+    """Selected cube levels, each derived from the smallest finer level already built."""
+
+    def __init__(self, levels=None):
+        self.levels = list(levels) if levels is not None else parse_levels(None)
+        self.cuboids = {}
+
+    def build(self, store):
+        #Base level from the records, then every selected level in finest-first order
+        started = time.perf_counter()
+        base = Cuboid.from_store(store)
+        base.seconds = time.perf_counter() - started
+        built = {BASE_LEVEL: base}
+        for level in sorted(self.levels, key=_coarseness):
+            if level in built:
+                continue
+            source = min((c for c in built.values() if _finer_or_equal(c.level, level)), key=lambda c: len(c.count))
+            started = time.perf_counter()
+            cuboid = source.rollup(level)
+            cuboid.source = source.name
+            cuboid.seconds = time.perf_counter() - started
+            built[level] = cuboid
+        self.cuboids = {level: built[level] for level in self.levels}
+        return self
+
+    def __iter__(self):
+        return iter(self.cuboids.values())
@@ -4,33 +4,56 @@ Chess Player Rating Analysis Visualization - One-Click Launcher
 This script starts a local server and opens the visualization in your default browser.
 """
 
+import argparse
 import os
 import sys
 import webbrowser
 import time
-from http.server import HTTPServer, SimpleHTTPRequestHandler
 from pathlib import Path
 
-class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
-    """Suppress default logging"""
-    def log_message(self, format, *args):
-        pass
+from static_server import make_server, precompress
 
-def find_free_port(start_port=8000):
-    """Find an available port"""
+# Bind addresses meaning "every interface"; browsers are pointed at localhost instead
+WILDCARD_HOSTS = ('0.0.0.0', '::', '')
+
+def find_free_port(host='localhost', start_port=8000):
+    """Find a port that is free on host"""
     port = start_port
     while port < 8100:
         try:
-            server = HTTPServer(('localhost', port), QuietHTTPRequestHandler)
+            server = make_server('.', host, port, threaded=False)
             server.server_close()
             return port
         except OSError:
             port += 1
     return None
 
-def main():
+def browser_url(host, port, path):
+    """URL a browser can open for a server bound to host"""
+    host = 'localhost' if host in WILDCARD_HOSTS else host
+    if ':' in host:
+        host = f'[{host}]'
+    return f'http://{host}:{port}{path}'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the visualization and open it in the browser')
+    parser.add_argument('--port', type=int, default=None, help='port to listen on (default: first free one from 8000)')
+    parser.add_argument('--host', default='localhost', help='interface to bind, e.g. 0.0.0.0 to share on the network')
+    parser.add_argument('--no-browser', action='store_true', help='do not open a browser window')
+    parser.add_argument('--simple', action='store_true',
+                        help='use the plain single-threaded server (no compression or cache headers)')
+    parser.add_argument('--log', nargs='?', const='-', default=None, metavar='FILE',
+                        help='write an access log with per-request latency to FILE (default: stdout)')
+    parser.add_argument('--api', nargs='?', const='', default=None, metavar='EXPORT',
+                        help='answer /api/ queries from an aggregated or per-record (chess_data.json/.bin) export '
+                             '(default: viz/chess_data_aggregated.bin or .json)')
+    parser.add_argument('--api-cache-size', type=int, default=256, help='query results kept in the API LRU cache')
+    parser.add_argument('--precompress', action='store_true',
+                        help='write .gz copies of the page, data and D3 files before serving')
+    args = parser.parse_args(argv)
+    
     # Change to script directory
-    script_dir = Path(__file__).parent
+    script_dir = Path(__file__).resolve().parent
     os.chdir(script_dir)
     
     # Verify data file exists
@@ -41,30 +64,57 @@ def main():
         input("Press Enter to exit...")
         sys.exit(1)
     
+    if args.precompress:
+        written = precompress(['viz', 'vendor'])
+        print(f"Precompressed {len(written)} file(s)")
+    
+    api = None
+    if args.api is not None:
+        if args.simple:
+            print("Error: --api needs the threaded server; drop --simple")
+            sys.exit(1)
+        from query_api import QueryStore, default_export
+        export = args.api or default_export('viz')
+        if export is None or not os.path.exists(export):
+            print(f"Error: aggregated export {export or 'viz/chess_data_aggregated.json'} not found")
+            sys.exit(1)
+        started = time.time()
+        api = QueryStore.load(export, cache_size=args.api_cache_size)
+        print(f"Query API: {len(api.groups):,} groups from {export} indexed in {time.time() - started:.2f}s")
+    
     # Find available port
-    port = find_free_port()
+    port = args.port or find_free_port(args.host)
     if port is None:
         print("Error: Could not find an available port")
         input("Press Enter to exit...")
         sys.exit(1)
     
     # Start server
-    handler = QuietHTTPRequestHandler
-    server = HTTPServer(('localhost', port), handler)
+    access_log = None
+    if args.log:
+        access_log = sys.stdout if args.log == '-' else open(args.log, 'a', encoding='utf-8')
+    server = make_server(str(script_dir), args.host, port, threaded=not args.simple, access_log=access_log,
+                         api=api)
     
-    url = f'http://localhost:{port}/viz/chess_visualization.html'
+    url = browser_url(args.host, port, '/viz/chess_visualization.html')
     
     print("=" * 60)
     print(" Chess Player Rating Analysis Visualization")
     print("=" * 60)
     print(f" Server running on: {url}")
-    print(f" Opening in browser...")
+    if args.host in WILDCARD_HOSTS:
+        print(f" Listening on all interfaces ({args.host or 'any'}), port {port}")
+    print(f" Mode: {'single-threaded' if args.simple else 'threaded, gzip, ETag/304 caching'}"
+          f"{', query API on /api/' if api else ''}")
+    if not args.no_browser:
+        print(f" Opening in browser...")
     print("")
     print("Press Ctrl+C to stop the server")
     print("=" * 60)
     
     # Open browser
-    webbrowser.open(url)
+    if not args.no_browser:
+        webbrowser.open(url)
     
     # Start server
     try:
@@ -0,0 +1,265 @@
+"""
+Static file server for the visualization.
+
+SimpleHTTPRequestHandler answers one request at a time, re-sends every file
+in full and uncompressed on each reload, and only knows Last-Modified. This
+module keeps its file handling and adds what a shared deployment needs:
+
+- a threaded server with HTTP/1.1 keep-alive;
+- gzip for text and data files: a precompressed '<file>.gz' next to the file
+  is used when it is at least as new, otherwise the file is compressed once
+  and kept in a small in-memory cache;
+- ETag and Last-Modified validators with 304 Not Modified answers;
+- a year-long immutable Cache-Control for vendor/ (D3 sits in a versioned
+  directory), 'no-cache' (always revalidate) for everything else;
+- an optional access log with the status, bytes sent and latency per request;
+- optionally, the /api/ query endpoints of a query_api.QueryStore.
+
+run_visualization.py starts it; benchmarks/serve_load.py measures it.
+"""
+
+import email.utils
+import gzip
+import io
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from http.server import HTTPServer, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# Extensions worth compressing (the columnar .bin files shrink too)
+COMPRESSIBLE = {'.html', '.htm', '.js', '.json', '.css', '.svg', '.txt', '.tsv', '.bin'}
+# Smaller files are sent as they are; gzip would barely pay for its header
+MIN_GZIP_SIZE = 1024
+# Larger files are only sent compressed when a precompressed .gz exists
+MAX_ON_THE_FLY = 32 * 1024 * 1024
+
+LONG_CACHE_PREFIXES = ('/vendor/',)
+LONG_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+class GzipCache:
+    """Compressed file bodies keyed by (path, size, mtime), least recently used dropped first."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, stat):
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        with open(path, 'rb') as f:
+            # mtime=0 keeps the bytes (and so the ETag's meaning) stable across restarts
+            body = gzip.compress(f.read(), compresslevel=6, mtime=0)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = body
+                self.size += len(body)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, dropped = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+        return body
+
+
+def precompress(paths, level=9):
+    #Write '<file>.gz' next to every compressible file under paths (files or directories); returns the files written
+    written = []
+    for root in paths:
+        files = [root] if os.path.isfile(root) else [os.path.join(d, f) for d, _, names in os.walk(root) for f in names]
+        for path in sorted(files):
+            if os.path.splitext(path)[1] not in COMPRESSIBLE or os.path.getsize(path) < MIN_GZIP_SIZE:
+                continue
+            target = path + '.gz'
+            if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                continue
+            with open(path, 'rb') as src, gzip.GzipFile(target, 'wb', compresslevel=level, mtime=0) as dst:
+                dst.write(src.read())
+            written.append(target)
+    return written
+
+
+def _accepts_gzip(header):
+    #True when Accept-Encoding gives gzip a non-zero q, or leaves it out and gives * one.
+    #A missing or malformed q-value counts as q=1.
+    qualities = {}
+    for item in (header or '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 1.0
+        qualities[coding.lower()] = q
+    q = qualities.get('gzip', qualities.get('*', 0))
+    return q > 0
+
+
+class CachingRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with gzip, ETag/304 handling, Cache-Control and timing."""
+
+    protocol_version = 'HTTP/1.1'
+    # With keep-alive, headers and body go out in separate writes; Nagle would hold the body back ~40 ms
+    disable_nagle_algorithm = True
+
+    def handle_one_request(self):
+        self._started = time.perf_counter()
+        self._status = None
+        self._sent = 0
+        self._encoding = ''
+        super().handle_one_request()
+        log = getattr(self.server, 'access_log', None)
+        if log is not None and self._status is not None:
+            elapsed = (time.perf_counter() - self._started) * 1000
+            log.write(f'{self.address_string()} [{self.log_date_time_string()}] "{self.requestline}" '
+                      f'{self._status} {self._sent} {self._encoding or "-"} {elapsed:.1f}ms\n')
+            log.flush()
+
+    def send_response(self, code, message=None):
+        self._status = int(code)
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        #The access log above replaces the default stderr lines
+        pass
+
+    def copyfile(self, source, outputfile):
+        start = source.tell()
+        super().copyfile(source, outputfile)
+        self._sent = source.tell() - start
+
+    def do_GET(self):
+        if getattr(self.server, 'api', None) is not None and self.path.startswith('/api/'):
+            self._send_api()
+        else:
+            super().do_GET()
+
+    def do_HEAD(self):
+        if getattr(self.server, 'api', None) is not None and self.path.startswith('/api/'):
+            self._send_api(head=True)
+        else:
+            super().do_HEAD()
+
+    def _send_api(self, head=False):
+        status, body, hit = self.server.api.respond(self.path)
+        if len(body) >= MIN_GZIP_SIZE and _accepts_gzip(self.headers.get('Accept-Encoding')):
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            self._encoding = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # Answers change when the server reloads the export, so browsers must not keep them
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        if self._encoding:
+            self.send_header('Content-Encoding', self._encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+            self._sent = len(body)
+
+    def _cache_control(self):
+        return LONG_CACHE if self.path.startswith(LONG_CACHE_PREFIXES) else REVALIDATE
+
+    def _not_modified(self, etag, mtime):
+        #RFC 9110: If-None-Match wins over If-Modified-Since
+        if 'If-None-Match' in self.headers:
+            tags = [t.strip() for t in self.headers['If-None-Match'].split(',')]
+            return '*' in tags or etag in [t[2:] if t.startswith('W/') else t for t in tags]
+        if 'If-Modified-Since' in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+            except (TypeError, IndexError, OverflowError, ValueError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+        return False
+
+    def _body(self, path, stat):
+        #(file object, length, content encoding) of the variant to send
+        compressible = os.path.splitext(path)[1] in COMPRESSIBLE and stat.st_size >= MIN_GZIP_SIZE
+        if compressible and _accepts_gzip(self.headers.get('Accept-Encoding')):
+            precompressed = path + '.gz'
+            if os.path.isfile(precompressed) and os.path.getmtime(precompressed) >= stat.st_mtime:
+                f = open(precompressed, 'rb')
+                return f, os.fstat(f.fileno()).st_size, 'gzip'
+            if stat.st_size <= MAX_ON_THE_FLY:
+                body = self.server.gzip_cache.get(path, stat)
+                return io.BytesIO(body), len(body), 'gzip'
+        return open(path, 'rb'), stat.st_size, ''
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if path.endswith('/') or not os.path.isfile(path):
+            # Directories, redirects and 404s as SimpleHTTPRequestHandler does them
+            return super().send_head()
+        try:
+            stat = os.stat(path)
+            f, length, encoding = self._body(path, stat)
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        compressible = os.path.splitext(path)[1] in COMPRESSIBLE
+        # Each encoding of a file is a different representation, so it gets its own tag
+        etag = '"%x-%x%s"' % (stat.st_mtime_ns, stat.st_size, '-gz' if encoding else '')
+        if self._not_modified(etag, stat.st_mtime):
+            f.close()
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', self._cache_control())
+            if compressible:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return None
+
+        self._encoding = encoding
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(length))
+        self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', self._cache_control())
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return f
+
+
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Suppress default logging"""
+    def log_message(self, format, *args):
+        pass
+
+
+def _for_host(server_class, host):
+    #IPv6 addresses such as '::' need an AF_INET6 socket
+    if ':' not in host:
+        return server_class
+    return type(server_class.__name__, (server_class,), {'address_family': socket.AF_INET6})
+
+
+def make_server(directory, host='localhost', port=8000, threaded=True, access_log=None, gzip_cache_bytes=64 * 1024 * 1024,
+                api=None):
+    #Server for directory: threaded with CachingRequestHandler, or the plain single-threaded HTTPServer.
+    #api is a query_api.QueryStore answering /api/ requests (threaded server only)
+    if not threaded:
+        return _for_host(HTTPServer, host)((host, port), lambda *a: QuietHTTPRequestHandler(*a, directory=directory))
+    server = _for_host(ThreadingHTTPServer, host)((host, port), lambda *a: CachingRequestHandler(*a, directory=directory))
+    server.daemon_threads = True
+    server.access_log = access_log
+    server.gzip_cache = GzipCache(gzip_cache_bytes)
+    server.api = api
+    return server
+
@@ -0,0 +1,113 @@
+"""
+Columnar round trip: write_columnar -> read_columnar against the JSON
+exports of the same run, and against hand-made frames with missing values,
+categorical, nullable, boolean and list columns.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_processor
+from benchmarks.synthetic_data import generate
+from columnar_export import MAGIC, read_columnar, write_columnar
+
+
+@pytest.fixture(scope='module')
+def exports(tmp_path_factory):
+    root = tmp_path_factory.mktemp('exports')
+    generate(str(root / 'data'), 30_000, seed=5, progress=False)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        data_processor.main(['--data-dir', str(root / 'data'), '--no-cache', '--format', 'both'])
+    finally:
+        os.chdir(cwd)
+    return root
+
+
+def _documents(exports, stem):
+    with open(exports / f"{stem}.json", encoding='utf-8') as f:
+        expected = json.load(f)
+    document = read_columnar(str(exports / f"{stem}.bin"))
+    for doc in (expected, document):
+        doc['metadata'].pop('generated')
+    return expected, document
+
+
+@pytest.mark.parametrize('stem', ['chess_data', 'chess_data_aggregated'])
+def test_round_trip_matches_json(exports, stem):
+    expected, document = _documents(exports, stem)
+    assert document.keys() == expected.keys()
+    assert document['metadata'] == expected['metadata']
+    assert len(document['data']) == len(expected['data'])
+    for row, want in zip(document['data'], expected['data']):
+        assert list(row) == list(want)
+        for field, value in want.items():
+            assert row[field] == value and type(row[field]) is type(value), field
+    if 'index' in expected:
+        assert document['index'] == expected['index']
+
+
+def test_records_cover_missing_and_categorical_values(exports):
+    expected, document = _documents(exports, 'chess_data')
+    # Players without a usable birth year have no age: None on both sides
+    missing = [i for i, row in enumerate(expected['data']) if row['age'] is None]
+    assert missing and all(document['data'][i]['age'] is None for i in missing)
+    assert all(isinstance(row['player_id'], str) for row in document['data'])
+
+    with open(exports / 'chess_data.bin', 'rb') as f:
+        assert f.read(4) == MAGIC
+        header = json.loads(f.read(int.from_bytes(f.read(4), 'little')).decode('utf-8'))
+    columns = {spec['name']: spec for spec in header['columns']}
+    for name in ('month', 'country', 'region', 'gender', 'name'):
+        assert 'dictionary' in columns[name], name
+    assert 'null' in columns['age'] and columns['player_id'].get('string')
+
+
+def test_frame_round_trip(tmp_path):
+    frame = pd.DataFrame({
+        'country': pd.Categorical(['India', None, 'China', 'India']),
+        'label': pd.Series(['a', None, 'b', 'a'], dtype=object),
+        'age': pd.array([31, None, 7, -2], dtype='Int16'),
+        'big': pd.array([2 ** 40, None, 1, 0], dtype='Int64'),
+        'id': np.array([101, 102, 103, 104], dtype='int64'),
+        'rating': np.array([1500, 2850, 999, 3500], dtype='int16'),
+        'mean': [1500.5, np.nan, 1.25, 0.0],
+        'active': [True, False, True, False],
+        'hist': [[1, 2], [], [300000], [0, 0, 7]]
+    })
+    path = tmp_path / 'frame.bin'
+    write_columnar(str(path), {'source': 'test'}, frame, string_columns=('id',), sections={'index': {'a': [0, 3]}})
+    document = read_columnar(str(path))
+    assert document['metadata'] == {'source': 'test'}
+    assert document['index'] == {'a': [0, 3]}
+    expected = {
+        'country': ['India', None, 'China', 'India'],
+        'label': ['a', None, 'b', 'a'],
+        'age': [31, None, 7, -2],
+        'big': [2 ** 40, None, 1, 0],
+        'id': ['101', '102', '103', '104'],
+        'rating': [1500, 2850, 999, 3500],
+        'active': [True, False, True, False],
+        'hist': [[1, 2], [], [300000], [0, 0, 7]]
+    }
+    for name, values in expected.items():
+        assert [row[name] for row in document['data']] == values, name
+    means = [row['mean'] for row in document['data']]
+    assert means[0] == 1500.5 and np.isnan(means[1]) and means[2:] == [1.25, 0.0]
+
+
+def test_empty_frame(tmp_path):
+    path = tmp_path / 'empty.bin'
+    write_columnar(str(path), {}, pd.DataFrame({'country': pd.Categorical([]), 'rating': np.array([], dtype='int16')}))
+    assert read_columnar(str(path)) == {'metadata': {}, 'data': []}
@@ -0,0 +1,97 @@
+"""
+incremental.py against a full rebuild, on synthetic data.
+
+The history is written by benchmarks/synthetic_data.py; its last month is
+held back from ratings.tsv, saved as the aggregate state's history and then
+folded in as a month file.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_processor
+import incremental
+from aggregation import AggregateState
+from benchmarks.synthetic_data import generate
+
+
+def _in_dir(path, func, *args):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        return func(*args)
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope='module')
+def history(tmp_path_factory):
+    #full/: the whole history; base/: the same without its last month; month.tsv: that month;
+    #state.npz: aggregate state saved from base/
+    root = tmp_path_factory.mktemp('history')
+    full, base = root / 'full', root / 'base'
+    generate(str(full), 40_000, seed=7, progress=False)
+    base.mkdir()
+    for name in ('players.tsv', 'countries.tsv', 'iso3.tsv'):
+        shutil.copyfile(full / name, base / name)
+
+    ratings = pd.read_csv(full / 'ratings.tsv', sep='\t', dtype=str)
+    last = ratings['month'].max()
+    ratings[ratings['month'] != last].to_csv(base / 'ratings.tsv', sep='\t', index=False)
+    ratings[ratings['month'] == last].to_csv(root / 'month.tsv', sep='\t', index=False)
+
+    _in_dir(root, data_processor.main, ['--data-dir', str(base), '--no-cache', '--format', 'json',
+                                        '--save-state', str(root / 'state.npz')])
+    return {'root': root, 'full': full, 'base': base, 'month': root / 'month.tsv', 'last': last}
+
+
+@pytest.fixture
+def state_path(history, tmp_path):
+    path = tmp_path / 'state.npz'
+    shutil.copyfile(history['root'] / 'state.npz', path)
+    return path
+
+
+def _fold(history, state_path, output, data_dir, verify=True):
+    argv = [str(history['month']), '--state', str(state_path), '--data-dir', str(data_dir), '--output', str(output)]
+    return incremental.main(argv + (['--verify'] if verify else []))
+
+
+def test_fold_matches_rebuild(history, state_path, tmp_path):
+    assert history['last'] not in AggregateState.load(state_path).months
+    assert _fold(history, state_path, tmp_path / 'aggregated.json', history['full']) == 0
+    assert AggregateState.load(state_path).last_month == history['last']
+
+
+def test_same_month_twice_is_rejected(history, state_path, tmp_path):
+    output = tmp_path / 'aggregated.json'
+    assert _fold(history, state_path, output, history['full']) == 0
+    saved, exported = state_path.read_bytes(), output.read_bytes()
+
+    assert _fold(history, state_path, output, history['full'], verify=False) == 1
+    assert state_path.read_bytes() == saved
+    assert output.read_bytes() == exported
+    # The state still matches a full rebuild
+    assert incremental.verify(str(output), str(history['full']))
+
+
+def test_failed_verify_keeps_state(history, state_path, tmp_path):
+    #base/ lacks the month, so the rebuild cannot match and the state and exports must stay as saved
+    saved = state_path.read_bytes()
+    output = tmp_path / 'aggregated.json'
+    shutil.copyfile(history['root'] / 'chess_data_aggregated.json', output)
+    exported = output.read_bytes()
+
+    assert _fold(history, state_path, output, history['base']) == 1
+    assert state_path.read_bytes() == saved
+    assert output.read_bytes() == exported
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
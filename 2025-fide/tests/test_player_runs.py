@@ -0,0 +1,111 @@
+"""
+player_runs.merge_join and run_reduce against the pandas operations they
+replace: pd.merge(..., how='inner') and groupby(sort=False).agg(), on
+unsorted, duplicated, partly unmatched and empty input.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from player_runs import contiguous_runs, merge_join, run_reduce
+
+
+def _players(ids):
+    rng = np.random.default_rng(len(ids))
+    return pd.DataFrame({
+        'id': ids,
+        'name': [f"player {i}" for i in ids],
+        'month': rng.integers(1, 13, len(ids)),
+        'birthyear': rng.integers(1940, 2015, len(ids))
+    })
+
+
+def _ratings(run_ids, seed=0):
+    #Player-contiguous ratings: one run of 1-5 months per entry of run_ids, in that order
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 6, len(run_ids))
+    n = int(lengths.sum())
+    return pd.DataFrame({
+        'id': np.repeat(np.asarray(run_ids, dtype=object), lengths),
+        'month': [f"2024-{m:02d}" for m in rng.integers(1, 13, n)],
+        'rating': rng.integers(1000, 2800, n),
+        'games': rng.integers(0, 30, n)
+    })
+
+
+IDS = [f"{i:05d}" for i in range(1, 41)]
+
+CASES = {
+    'players order': (IDS, IDS),
+    'unsorted runs': (IDS, list(np.random.default_rng(1).permutation(IDS))),
+    'unmatched ids': (IDS[::2], IDS),
+    'players missing from ratings': (IDS, IDS[5:30]),
+    'unsorted players': (list(np.random.default_rng(2).permutation(IDS)), IDS),
+    'single run': (IDS, IDS[:1]),
+    'empty ratings': (IDS, [])
+}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_merge_join_matches_pd_merge(case):
+    player_ids, run_ids = CASES[case]
+    players, ratings = _players(player_ids), _ratings(run_ids)
+    expected = pd.merge(players, ratings, on='id', how='inner')
+    result = merge_join(players, ratings)
+    assert result is not None
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_merge_join_integer_ids():
+    #read_csv gives integer ids when every id is numeric
+    players = _players(IDS).assign(id=lambda f: f['id'].astype('int64'))
+    ratings = _ratings(list(np.random.default_rng(3).permutation(IDS)))
+    ratings['id'] = ratings['id'].astype('int64')
+    pd.testing.assert_frame_equal(merge_join(players, ratings), pd.merge(players, ratings, on='id', how='inner'))
+
+
+def test_merge_join_falls_back():
+    players, ratings = _players(IDS), _ratings(IDS)
+    # A player whose months are split in two runs
+    split = pd.concat([ratings, ratings[ratings['id'] == IDS[0]]], ignore_index=True)
+    assert merge_join(players, split) is None
+    # Duplicate player ids
+    assert merge_join(pd.concat([players, players.head(1)], ignore_index=True), ratings) is None
+
+
+def _agg(ratings):
+    return ratings.groupby('id', sort=False).agg(rows=('rating', 'size'), max_rating=('rating', 'max'),
+                                                   min_rating=('rating', 'min'), games=('games', 'sum'))
+
+
+@pytest.mark.parametrize('case', ['players order', 'unsorted runs', 'single run', 'empty ratings'])
+def test_run_reduce_matches_groupby(case):
+    ratings = _ratings(CASES[case][1])
+    result = run_reduce(ratings['id'], max_rating=(ratings['rating'].to_numpy(), np.maximum),
+                        min_rating=(ratings['rating'].to_numpy(), np.minimum),
+                        games=(ratings['games'].to_numpy(), np.add))
+    expected = _agg(ratings)
+    assert list(ratings['id'].to_numpy()[result['starts']]) == list(expected.index)
+    for column in expected.columns:
+        assert result[column].tolist() == expected[column].tolist()
+
+
+def test_run_reduce_categorical_ids():
+    ratings = _ratings(list(np.random.default_rng(4).permutation(IDS)))
+    result = run_reduce(ratings['id'].astype('category'), games=(ratings['games'].to_numpy(), np.add))
+    assert result['games'].tolist() == _agg(ratings)['games'].tolist()
+
+
+def test_run_reduce_needs_contiguous_runs():
+    ratings = _ratings(IDS[:3] + IDS[:1])
+    assert contiguous_runs(ratings['id']) is None
+    assert run_reduce(ratings['id'], games=(ratings['games'].to_numpy(), np.add)) is None
@@ -0,0 +1,95 @@
+"""
+QuantileSketch against the exact RatingHistogram quantiles of the same
+random ratings: rank error bounds, and merged sketches against one sketch
+over all the data.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from quantiles import QuantileSketch, RatingHistogram, quantile_rank
+
+QS = np.linspace(0.01, 0.99, 99)
+
+
+def _ratings(seed, n=200_000):
+    rng = np.random.default_rng(seed)
+    if seed % 2:
+        return rng.integers(0, 3501, n)
+    return np.clip(rng.normal(1600, 350, n).round(), 0, 3500).astype('int64')
+
+
+def _sketch(values, k, seed, batches=20):
+    sketch = QuantileSketch(k, seed)
+    for batch in np.array_split(values, batches):
+        sketch.add(batch)
+    return sketch
+
+
+def _rank_errors(sketch, exact):
+    #Distance of each q's target rank from the ranks the sketch's answer holds in the data, as a share of n
+    cumulative = exact.counts.cumsum()
+    errors = []
+    for q, value in zip(QS, sketch.quantiles(QS)):
+        i = int(value) - exact.low
+        low, high = (cumulative[i - 1] if i else 0), cumulative[i] - 1
+        rank = int(quantile_rank(exact.count, q))
+        errors.append(max(low - rank, rank - high, 0) / exact.count)
+    return np.array(errors)
+
+
+@pytest.mark.parametrize('k', [50, 200])
+@pytest.mark.parametrize('seed', range(4))
+def test_rank_error_bound(k, seed):
+    values = _ratings(seed)
+    errors = _rank_errors(_sketch(values, k, seed), RatingHistogram().add(values))
+    assert np.quantile(errors, 0.95) <= 2 / k
+    assert errors.max() <= 3 / k
+
+
+def test_default_sketch_within_one_percent():
+    values = _ratings(0)
+    errors = _rank_errors(_sketch(values, 200, 0), RatingHistogram().add(values))
+    assert np.median(errors) <= 0.01 / 2
+    assert np.quantile(errors, 0.95) <= 0.01
+
+
+def test_exact_below_k():
+    values = _ratings(1, n=150)
+    exact = RatingHistogram().add(values)
+    assert _sketch(values, 200, 0, batches=3).quantiles(QS) == exact.quantiles(QS)
+
+
+@pytest.mark.parametrize('split', [100, 70_000, 199_900])
+def test_merge_matches_single_sketch(split):
+    values = _ratings(2)
+    exact = RatingHistogram().add(values)
+    single = _sketch(values, 200, 0)
+    merged = _sketch(values[:split], 200, 1, batches=7).merge(_sketch(values[split:], 200, 2, batches=9))
+
+    for key in ('count', 'min', 'max'):
+        assert merged.summary()[key] == single.summary()[key]
+    assert merged.summary()['mean'] == pytest.approx(values.mean())
+    assert np.quantile(_rank_errors(merged, exact), 0.95) <= 0.01
+    assert _rank_errors(merged, exact).max() <= 3 / 200
+
+    # Both answers lie within the bound of each other's ranks too
+    merged_ranks = np.searchsorted(np.sort(values), merged.quantiles(QS))
+    single_ranks = np.searchsorted(np.sort(values), single.quantiles(QS))
+    assert np.abs(merged_ranks - single_ranks).max() / len(values) <= 2 * 3 / 200
+
+
+def test_merge_below_k_is_exact():
+    values = _ratings(3, n=180)
+    exact = RatingHistogram().add(values)
+    merged = _sketch(values[:60], 200, 0, batches=2).merge(_sketch(values[60:], 200, 1, batches=2))
+    assert merged.quantiles(QS) == exact.quantiles(QS)
+    assert merged.summary()['count'] == 180
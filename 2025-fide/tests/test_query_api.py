@@ -0,0 +1,116 @@
+"""
+query_api.QueryStore on exports of synthetic data: endpoint answers, 400s,
+the LRU result cache and stores built from the per-record exports.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_processor
+from benchmarks.synthetic_data import generate
+from query_api import QueryStore
+
+QUERIES = ['/api/meta', '/api/histogram', '/api/histogram?year=2020&gender=F', '/api/groups?year=2019&country=India',
+           '/api/groups?country=India&country=China&fields=year,count', '/api/country?country=India']
+
+
+@pytest.fixture(scope='module')
+def exports(tmp_path_factory):
+    #Per-record and aggregated exports, JSON and columnar, of one synthetic run
+    root = tmp_path_factory.mktemp('exports')
+    generate(str(root / 'data'), 40_000, seed=11, progress=False)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        data_processor.main(['--data-dir', str(root / 'data'), '--no-cache', '--format', 'both'])
+    finally:
+        os.chdir(cwd)
+    return root
+
+
+@pytest.fixture
+def store(exports):
+    return QueryStore.load(str(exports / 'chess_data_aggregated.json'))
+
+
+def _get(store, path):
+    status, body, _ = store.respond(path)
+    return status, json.loads(body)
+
+
+def test_groups_match_the_export(store, exports):
+    with open(exports / 'chess_data_aggregated.json', encoding='utf-8') as f:
+        groups = json.load(f)['data']
+    status, answer = _get(store, '/api/groups?year=2019&country=India&country=China&gender=M')
+    expected = [g for g in groups if g['year'] == 2019 and g['country'] in ('India', 'China') and g['gender'] == 'M']
+    assert status == 200 and expected
+    assert answer == {'count': len(expected), 'data': expected}
+
+    status, answer = _get(store, '/api/groups?year=2019&fields=country,count')
+    assert [set(g) for g in answer['data']] == [{'country', 'count'}] * answer['count']
+
+
+def test_histogram_and_country(store):
+    status, answer = _get(store, '/api/histogram?year=2020')
+    assert status == 200
+    assert sum(b['count'] for b in answer['bins']) <= answer['count']
+    assert answer['count'] == sum(g['count'] for g in _get(store, '/api/groups?year=2020')[1]['data'])
+
+    status, answer = _get(store, '/api/country?country=India')
+    assert status == 200
+    assert answer['summary'] == store.country_summary['India']
+    status, meta = _get(store, '/api/meta')
+    assert 'India' in meta['countries'] and meta['years'] == sorted(store.rows['year'])
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/api/groups?colour=red', 400),
+    ('/api/histogram?year=last', 400),
+    ('/api/country?country=Atlantis', 400),
+    ('/api/country', 400),
+    ('/api/meta?year=2020', 400),
+    ('/api/players', 404)
+])
+def test_bad_requests(store, path, status):
+    answer_status, answer = _get(store, path)
+    assert answer_status == status
+    assert 'error' in answer
+    assert not store._cache
+
+
+def test_lru_cache(exports):
+    store = QueryStore.load(str(exports / 'chess_data_aggregated.json'), cache_size=2)
+    first = store.respond('/api/histogram?year=2020')
+    assert first[2] is False
+    assert store.respond('/api/histogram?year=2020') == (200, first[1], True)
+    # The parameter order does not change the cache key
+    assert store.respond('/api/groups?year=2020&gender=F')[2] is False
+    assert store.respond('/api/groups?gender=F&year=2020')[2] is True
+
+    # A third query evicts the least recently used one
+    store.respond('/api/country?country=India')
+    assert store.respond('/api/histogram?year=2020')[2] is False
+    assert store.respond('/api/groups?year=2020&gender=F')[2] is False
+    assert _get(store, '/api/stats')[1] == {'hits': 2, 'misses': 5, 'cached': 2, 'capacity': 2}
+    # /api/stats itself is never cached
+    assert _get(store, '/api/stats')[1]['hits'] == 2
+
+
+@pytest.mark.parametrize('name', ['chess_data.json', 'chess_data.bin', 'chess_data_aggregated.bin'])
+def test_stores_answer_alike(exports, store, name):
+    other = QueryStore.load(str(exports / name))
+    assert other.groups == store.groups
+    for path in QUERIES:
+        ours, theirs = _get(store, path), _get(other, path)
+        if path == '/api/meta':
+            for answer in (ours[1], theirs[1]):
+                answer['metadata'].pop('generated')
+        assert theirs == ours
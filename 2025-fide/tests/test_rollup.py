@@ -0,0 +1,124 @@
+"""
+RollupCube levels derived from finer cuboids against a direct aggregation of
+the records, along the time, geography and gender hierarchies.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from quantiles import EXPORT_PERCENTILES, percentile_name, quantile_rank
+from record_store import RecordStore
+from rollup import BASE_LEVEL, TOP_LEVELS, RollupCube, all_levels, level_name, parse_levels
+
+COUNTRIES = {
+    'France': ('Western Europe', 'Europe'),
+    'Germany': ('Western Europe', 'Europe'),
+    'Spain': ('Southern Europe', 'Europe'),
+    'Italy': ('Southern Europe', 'Europe'),
+    'India': ('Southern Asia', 'Asia'),
+    'China': ('Eastern Asia', 'Asia'),
+    'Japan': ('Eastern Asia', 'Asia'),
+    'Brazil': ('South America', 'Americas')
+}
+
+
+@pytest.fixture(scope='module')
+def store():
+    rng = np.random.default_rng(22)
+    n = 20_000
+    months = np.array([f"{y}-{m:02d}" for y in (2023, 2024) for m in range(1, 13)], dtype=object)
+    month = months[rng.integers(0, len(months), n)]
+    country = np.array(list(COUNTRIES), dtype=object)[rng.integers(0, len(COUNTRIES), n)]
+    birth_year = rng.integers(1950, 2012, n)
+    year = np.array([int(m[:4]) for m in month])
+    return RecordStore.from_columns({
+        'player_id': rng.integers(1, 3000, n),
+        'year': year,
+        'month': month,
+        'rating': rng.integers(1000, 2800, n),
+        'games': rng.integers(0, 20, n),
+        'country': country,
+        'country_code': country,
+        'region': np.array([COUNTRIES[c][1] for c in country], dtype=object),
+        'subregion': np.array([COUNTRIES[c][0] for c in country], dtype=object),
+        'gender': np.array(['M', 'F', 'U'], dtype=object)[rng.choice(3, n, p=[0.8, 0.15, 0.05])],
+        'birth_year': birth_year.tolist(),
+        'age': (year - birth_year).tolist(),
+        'name': np.full(n, 'player', dtype=object)
+    })
+
+
+def _direct(store, level):
+    #Exact statistics of one level, grouped straight from the records and sorted by its keys
+    frame = store.frame.astype({'month': object, 'country': object, 'subregion': object, 'region': object,
+                                'gender': object})
+    keys = [value for value in level if value not in TOP_LEVELS]
+    rows = []
+    for key, group in frame.groupby(keys, sort=True):
+        ratings = np.sort(group['rating'].to_numpy(dtype='int64'))
+        n = len(ratings)
+        row = dict(zip(keys, key))
+        row.update({'count': n, 'mean_rating': ratings.mean(), 'median_rating': int(ratings[n // 2]),
+                    'min_rating': int(ratings[0]), 'max_rating': int(ratings[-1])})
+        row.update({f"{percentile_name(q)}_rating": int(ratings[quantile_rank(n, q)]) for q in EXPORT_PERCENTILES})
+        rows.append(row)
+    return rows
+
+
+def _assert_equal(stats, expected):
+    assert len(stats) == len(expected)
+    for row, want in zip(stats, expected):
+        assert row['mean_rating'] == pytest.approx(want['mean_rating'])
+        assert {k: v for k, v in row.items() if k != 'mean_rating'} == \
+            {k: v for k, v in want.items() if k != 'mean_rating'}
+
+
+@pytest.mark.parametrize('source, target', [
+    # time
+    (('month', 'country', 'gender'), ('year', 'country', 'gender')),
+    # geography, one step at a time and straight to the top
+    (('year', 'country', 'gender'), ('year', 'subregion', 'gender')),
+    (('year', 'subregion', 'gender'), ('year', 'region', 'gender')),
+    (('month', 'region', 'gender'), ('month', 'world', 'gender')),
+    (('month', 'country', 'all'), ('month', 'world', 'all')),
+    # gender
+    (('month', 'country', 'gender'), ('month', 'country', 'all')),
+    (('year', 'region', 'gender'), ('year', 'region', 'all')),
+    # all three at once
+    (('month', 'subregion', 'gender'), ('year', 'world', 'all'))
+], ids=lambda level: level_name(level))
+def test_derived_level_matches_direct(store, source, target):
+    cube = RollupCube([source, target]).build(store)
+    derived = cube.cuboids[target]
+    assert derived.source == level_name(source)
+    _assert_equal(derived.stats(), _direct(store, target))
+
+
+def test_base_level_matches_direct(store):
+    cube = RollupCube([BASE_LEVEL]).build(store)
+    assert cube.cuboids[BASE_LEVEL].source is None
+    _assert_equal(cube.cuboids[BASE_LEVEL].stats(), _direct(store, BASE_LEVEL))
+
+
+@pytest.mark.parametrize('pattern, count', [('year/*/all', 4), ('*/region/*', 4), ('month/country/gender,year/world/all', 2)])
+def test_parse_levels_pattern(store, pattern, count):
+    levels = parse_levels(pattern)
+    assert len(levels) == count
+    assert levels == [level for level in all_levels() if level in levels]
+    for cuboid in RollupCube(levels).build(store):
+        _assert_equal(cuboid.stats(), _direct(store, cuboid.level))
+
+
+def test_parse_levels_errors():
+    assert len(parse_levels('all')) == len(all_levels()) == 16
+    with pytest.raises(ValueError):
+        parse_levels('decade/world/all')
@@ -0,0 +1,188 @@
+"""
+CachingRequestHandler over HTTP: make_server on port 0 in a background
+thread, with ETag/304 revalidation, Vary, gzip negotiation and the
+Cache-Control of vendor/ and everything else.
+
+    python -m pytest tests
+"""
+
+import gzip
+import http.client
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from static_server import LONG_CACHE, MIN_GZIP_SIZE, REVALIDATE, make_server
+
+PAGE = ('<html><body>' + 'rating chart ' * 400 + '</body></html>').encode('utf-8')
+SCRIPT = ('// d3\n' + 'function f(){return 1;}\n' * 200).encode('utf-8')
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    root = tmp_path_factory.mktemp('site')
+    (root / 'viz').mkdir()
+    (root / 'vendor' / 'd3-7.8.5').mkdir(parents=True)
+    (root / 'viz' / 'page.html').write_bytes(PAGE)
+    (root / 'viz' / 'small.json').write_bytes(b'{"a": 1}')
+    (root / 'viz' / 'image.png').write_bytes(b'\x89PNG' + bytes(4000))
+    (root / 'vendor' / 'd3-7.8.5' / 'd3.js').write_bytes(SCRIPT)
+    return root
+
+
+@pytest.fixture(scope='module')
+def server(site):
+    server = make_server(str(site), '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path, method='GET', **headers):
+    #(status, headers, body) of one request on a fresh connection
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    try:
+        connection.request(method, path, headers={k.replace('_', '-'): v for k, v in headers.items()})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+
+def test_plain_response(server):
+    status, headers, body = _get(server, '/viz/page.html')
+    assert status == 200 and body == PAGE
+    assert headers['Content-Length'] == str(len(PAGE))
+    assert 'Content-Encoding' not in headers
+    assert headers['ETag'] and headers['Last-Modified']
+    assert headers['Cache-Control'] == REVALIDATE
+
+
+def test_etag_revalidation(server):
+    _, headers, _ = _get(server, '/viz/page.html')
+    etag = headers['ETag']
+    status, headers, body = _get(server, '/viz/page.html', If_None_Match=etag)
+    assert status == 304 and body == b''
+    assert headers['ETag'] == etag
+    assert headers['Cache-Control'] == REVALIDATE
+    assert _get(server, '/viz/page.html', If_None_Match='W/' + etag)[0] == 304
+    assert _get(server, '/viz/page.html', If_None_Match='"other", ' + etag)[0] == 304
+    assert _get(server, '/viz/page.html', If_None_Match='*')[0] == 304
+    assert _get(server, '/viz/page.html', If_None_Match='"other"')[0] == 200
+
+
+def test_last_modified_revalidation(server):
+    _, headers, _ = _get(server, '/viz/page.html')
+    assert _get(server, '/viz/page.html', If_Modified_Since=headers['Last-Modified'])[0] == 304
+    assert _get(server, '/viz/page.html', If_Modified_Since='Thu, 01 Jan 1998 00:00:00 GMT')[0] == 200
+    assert _get(server, '/viz/page.html', If_Modified_Since='not a date')[0] == 200
+    # If-None-Match wins over If-Modified-Since
+    assert _get(server, '/viz/page.html', If_None_Match='"other"',
+                If_Modified_Since=headers['Last-Modified'])[0] == 200
+
+
+def test_changed_file_gets_new_etag(server, site):
+    path = site / 'viz' / 'changing.html'
+    path.write_bytes(PAGE)
+    _, headers, _ = _get(server, '/viz/changing.html')
+    stat = os.stat(path)
+    path.write_bytes(PAGE + b'<!-- v2 -->')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    status, new_headers, body = _get(server, '/viz/changing.html', If_None_Match=headers['ETag'])
+    assert status == 200 and body.endswith(b'<!-- v2 -->')
+    assert new_headers['ETag'] != headers['ETag']
+
+
+@pytest.mark.parametrize('accept, compressed', [
+    ('gzip', True),
+    ('gzip, deflate, br', True),
+    ('br;q=1.0, gzip;q=0.5', True),
+    ('*', True),
+    ('GZIP', True),
+    ('gzip;q=x', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0, *;q=1', False),
+    ('*;q=0', False),
+    ('deflate, *;q=0', False),
+    ('identity', False),
+    ('', False)
+])
+def test_gzip_negotiation(server, accept, compressed):
+    status, headers, body = _get(server, '/viz/page.html', Accept_Encoding=accept)
+    assert status == 200
+    assert headers['Vary'] == 'Accept-Encoding'
+    if compressed:
+        assert headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(body) == PAGE
+        assert headers['Content-Length'] == str(len(body))
+    else:
+        assert 'Content-Encoding' not in headers
+        assert body == PAGE
+
+
+def test_each_encoding_has_its_own_etag(server):
+    _, plain, _ = _get(server, '/viz/page.html')
+    _, compressed, _ = _get(server, '/viz/page.html', Accept_Encoding='gzip')
+    assert plain['ETag'] != compressed['ETag']
+    # A tag revalidates only its own representation
+    status, headers, _ = _get(server, '/viz/page.html', Accept_Encoding='gzip', If_None_Match=compressed['ETag'])
+    assert status == 304 and headers['Vary'] == 'Accept-Encoding'
+    assert _get(server, '/viz/page.html', Accept_Encoding='gzip', If_None_Match=plain['ETag'])[0] == 200
+
+
+def test_precompressed_file(server, site):
+    path = site / 'viz' / 'data.json'
+    path.write_bytes(b'[' + b'1500,' * 400 + b'0]')
+    with gzip.open(str(path) + '.gz', 'wb') as f:
+        f.write(b'"precompressed"')
+    stat = os.stat(path)
+    os.utime(str(path) + '.gz', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    _, headers, body = _get(server, '/viz/data.json', Accept_Encoding='gzip')
+    assert gzip.decompress(body) == b'"precompressed"'
+    # An older .gz is ignored
+    os.utime(str(path) + '.gz', ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    _, headers, body = _get(server, '/viz/data.json', Accept_Encoding='gzip')
+    assert gzip.decompress(body) == path.read_bytes()
+
+
+def test_small_and_binary_files(server):
+    assert MIN_GZIP_SIZE > len(b'{"a": 1}')
+    status, headers, body = _get(server, '/viz/small.json', Accept_Encoding='gzip')
+    assert status == 200 and body == b'{"a": 1}'
+    assert 'Content-Encoding' not in headers and headers['Vary'] == 'Accept-Encoding'
+    status, headers, body = _get(server, '/viz/image.png', Accept_Encoding='gzip')
+    assert status == 200 and len(body) == 4004
+    assert 'Content-Encoding' not in headers and 'Vary' not in headers
+
+
+def test_vendor_long_cache(server):
+    status, headers, body = _get(server, '/vendor/d3-7.8.5/d3.js', Accept_Encoding='gzip')
+    assert status == 200 and gzip.decompress(body) == SCRIPT
+    assert headers['Cache-Control'] == LONG_CACHE
+    status, headers, _ = _get(server, '/vendor/d3-7.8.5/d3.js', Accept_Encoding='gzip', If_None_Match=headers['ETag'])
+    assert status == 304 and headers['Cache-Control'] == LONG_CACHE
+    assert _get(server, '/viz/page.html')[1]['Cache-Control'] == REVALIDATE
+
+
+def test_head_and_missing_files(server):
+    status, headers, body = _get(server, '/viz/page.html', method='HEAD', Accept_Encoding='gzip')
+    assert status == 200 and body == b'' and headers['Content-Encoding'] == 'gzip'
+    assert _get(server, '/viz/missing.html')[0] == 404
+
+
+def test_keep_alive(server):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    try:
+        for path in ('/viz/page.html', '/viz/small.json', '/vendor/d3-7.8.5/d3.js'):
+            connection.request('GET', path)
+            response = connection.getresponse()
+            assert response.status == 200 and response.read()
+    finally:
+        connection.close()
@@ -0,0 +1,147 @@
+"""
+On-disk cache of parsed, typed TSV tables.
+
+Every table is stored as one .npy file per column: numeric columns as-is
+(memory-mapped on load), string columns as int32 dictionary codes plus a
+UTF-8 dictionary. Entries are keyed by the source file's size and content
+hash and by SCHEMA_VERSION, so changed inputs rebuild transparently and a
+change to the parsed dtypes (bump SCHEMA_VERSION) invalidates every entry.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bump whenever parsing/cleaning (clean_tsv_frame, read_csv options) changes the stored dtypes
+SCHEMA_VERSION = 1
+
+HASH_BLOCK = 1 << 20
+
+
+def file_key(filepath):
+    #size + blake2b content hash + schema version
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return f"{os.path.getsize(filepath)}-{digest.hexdigest()}-v{SCHEMA_VERSION}"
+
+
+class TSVCache:
+    """Directory of cached tables, one sub-directory per (table, key)."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, filepath, key):
+        return os.path.join(self.cache_dir, f"{os.path.basename(filepath)}-{key}")
+
+    def lookup(self, filepath, key=None):
+        #Entry directory for filepath if a valid cache entry exists, else None.
+        #key is file_key(filepath) when the caller already has it (hashing reads the whole file).
+        entry = self._entry_dir(filepath, key or file_key(filepath))
+        manifest = os.path.join(entry, 'manifest.json')
+        if not os.path.exists(manifest):
+            return None
+        with open(manifest, encoding='utf-8') as f:
+            if json.load(f).get('schema_version') != SCHEMA_VERSION:
+                return None
+        return entry
+
+    def load(self, filepath, parse):
+        #Cached frame for filepath, or parse(filepath) stored for next time; returns (frame, hit)
+        key = file_key(filepath)
+        entry = self.lookup(filepath, key)
+        if entry is not None:
+            self.hits += 1
+            return read_entry(entry), True
+
+        self.misses += 1
+        frame = parse(filepath)
+        self.store(filepath, frame, key)
+        return frame, False
+
+    def store(self, filepath, frame, key=None):
+        key = key or file_key(filepath)
+        self.clear(os.path.basename(filepath))
+        entry = self._entry_dir(filepath, key)
+        tmp = entry + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        columns = []
+        for i, name in enumerate(frame.columns):
+            series = frame[name]
+            if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+                np.save(os.path.join(tmp, f"{i}.npy"), series.to_numpy())
+                columns.append({'name': name, 'kind': 'numeric'})
+            else:
+                codes, uniques = pd.factorize(series)
+                np.save(os.path.join(tmp, f"{i}.npy"), codes.astype('int32'))
+                _save_strings(os.path.join(tmp, f"{i}.dict"), [str(u) for u in uniques])
+                columns.append({'name': name, 'kind': 'string', 'dtype': str(series.dtype)})
+
+        with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'schema_version': SCHEMA_VERSION, 'source': os.path.basename(filepath),
+                       'key': key, 'rows': len(frame), 'columns': columns,
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, f, indent=2)
+        os.replace(tmp, entry)
+
+    def clear(self, table=None):
+        #Remove every entry (or every entry of one table, e.g. 'ratings.tsv')
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if table is None or name.startswith(table + '-'):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def report(self):
+        return f"cache: {self.hits} hit(s), {self.misses} miss(es) in {self.cache_dir}"
+
+
+def read_entry(entry, start=None, stop=None):
+    #Rebuild the cached frame (or rows [start, stop) of it); numeric columns stay memory-mapped
+    with open(os.path.join(entry, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    data = {}
+    for i, column in enumerate(manifest['columns']):
+        values = np.load(os.path.join(entry, f"{i}.npy"), mmap_mode='r')[start:stop]
+        if column['kind'] == 'numeric':
+            data[column['name']] = values
+        else:
+            uniques = np.array(_load_strings(os.path.join(entry, f"{i}.dict")) + [np.nan], dtype=object)
+            data[column['name']] = pd.Series(uniques[np.asarray(values)]).astype(column['dtype'])
+    return pd.DataFrame(data, copy=False)
+
+
+def iter_entry_chunks(entry, chunksize):
+    with open(os.path.join(entry, 'manifest.json'), encoding='utf-8') as f:
+        rows = json.load(f)['rows']
+    for start in range(0, rows, chunksize):
+        chunk = read_entry(entry, start, start + chunksize)
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
+
+
+def _save_strings(path, strings):
+    #UTF-8 blob plus character offsets
+    text = ''.join(strings)
+    offsets = np.zeros(len(strings) + 1, dtype='int64')
+    np.cumsum([len(s) for s in strings], out=offsets[1:])
+    with open(path, 'wb') as f:
+        np.save(f, offsets)
+        np.save(f, np.frombuffer(text.encode('utf-8'), dtype='uint8'))
+
+
+def _load_strings(path):
+    with open(path, 'rb') as f:
+        offsets = np.load(f)
+        text = np.load(f).tobytes().decode('utf-8')
+    return [text[a:b] for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
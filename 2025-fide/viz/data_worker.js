@@ -0,0 +1,492 @@
+// Data worker for chess_visualization.html: fetches, decodes and indexes the aggregated export and
+// computes the per-year histograms and totals, so the page's main thread only renders.
+//
+// Protocol: the page posts { id, type, ...params } and gets { id, result } or { id, error } back.
+//   load                  -> { mode, metadata, years, ratingExtent }
+//   year { year, genders } -> { histograms, summaries } keyed by gender ('' for all genders)
+//   country { country }    -> { trend, summary }
+//   ageCurves { country }  -> { metadata, byAge, cohorts } for one country ('' for all), or null without the export
+// While loading, the worker also posts { type: 'progress', phase, loaded, total } and, for decode and
+// index, { type: 'timing', name, startTime, duration, timeOrigin } (also marked in its own timeline).
+
+importScripts('../vendor/d3-7.8.5/dist/d3.js');
+
+let allData = [], metadata = {}, allYears = [];
+// Exported per-group histograms (metadata.histogram: bin_size, min_rating, max_rating), if present
+let histogramSpec = null;
+// Lookups built once on load (see buildIndex); requests never scan allData
+let dataIndex = { byYear: new Map(), byYearGender: new Map(), byCountry: new Map(), countryTrends: new Map(), countrySummary: new Map() };
+const histogramCache = new Map();
+const summaryCache = new Map();
+
+function progress(phase, loaded = 0, total = 0) {
+    self.postMessage({ type: 'progress', phase, loaded, total });
+}
+
+// Run fn as a timed phase: marked and measured here, and reported to the page for its own timeline
+function timed(name, fn) {
+    performance.mark(`fide:${name}:start`);
+    const result = fn();
+    const measure = performance.measure(`fide:${name}`, `fide:${name}:start`);
+    self.postMessage({ type: 'timing', name, startTime: measure.startTime, duration: measure.duration,
+                       timeOrigin: performance.timeOrigin });
+    return result;
+}
+
+// Year / year+gender / country lookups, per-country yearly trends and totals.
+// Uses the exporter's index (row positions into data) when present, else derives it once here.
+function buildIndex(jsonData) {
+    const data = jsonData.data;
+    const rows = positions => positions.map(i => data[i]);
+    const index = jsonData.index;
+    if (index) {
+        const byYearGender = new Map(Object.entries(index.by_year_gender).map(([year, genders]) =>
+            [+year, new Map(Object.entries(genders).map(([gender, positions]) => [gender, rows(positions)]))]));
+        return {
+            byYear: new Map(Object.entries(index.by_year).map(([year, positions]) => [+year, rows(positions)])),
+            byYearGender,
+            byCountry: new Map(Object.entries(index.by_country).map(([country, positions]) => [country, rows(positions)])),
+            countryTrends: new Map(Object.entries(index.country_trends)),
+            countrySummary: new Map(Object.entries(index.country_summary || {}))
+        };
+    }
+
+    const byCountry = d3.group(data, d => d.country);
+    const countryTrends = new Map(), countrySummary = new Map();
+    byCountry.forEach((countryData, country) => {
+        countrySummary.set(country, {
+            avg: d3.mean(countryData, d => d.mean_rating),
+            count: d3.sum(countryData, d => d.count)
+        });
+        const byYear = d3.rollup(countryData, v => ({
+            avg: d3.mean(v, d => d.mean_rating),
+            count: d3.sum(v, d => d.count)
+        }), d => d.year);
+        countryTrends.set(country, Array.from(byYear, ([year, vals]) => ({
+            year, avg: vals.avg, count: vals.count
+        })).sort((a, b) => a.year - b.year));
+    });
+    return {
+        byYear: d3.group(data, d => d.year),
+        byYearGender: d3.group(data, d => d.year, d => d.gender),
+        byCountry,
+        countryTrends,
+        countrySummary
+    };
+}
+
+// Typed-array constructors for the dtypes written by columnar_export.py
+const COLUMN_TYPES = {
+    int8: Int8Array, uint8: Uint8Array, int16: Int16Array,
+    int32: Int32Array, float64: Float64Array
+};
+
+// Decode a FIDC buffer: 'FIDC' | uint32 header length | JSON header | 8-byte aligned columns
+function decodeColumnar(buffer) {
+    const bytes = new Uint8Array(buffer);
+    if (String.fromCharCode(...bytes.subarray(0, 4)) !== 'FIDC') {
+        throw new Error('not a columnar data file');
+    }
+    const headerLength = new DataView(buffer).getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(bytes.subarray(8, 8 + headerLength)));
+    const start = 8 + headerLength;
+
+    const columns = header.columns.map(spec => {
+        if (spec.list) {
+            // Flattened integer lists (sparse histograms) with length + 1 row starts
+            const items = new COLUMN_TYPES[spec.dtype](buffer, start + spec.offset, spec.count);
+            const starts = new Int32Array(buffer, start + spec.starts_offset, header.length + 1);
+            return i => Array.from(items.subarray(starts[i], starts[i + 1]));
+        }
+        const values = new COLUMN_TYPES[spec.dtype](buffer, start + spec.offset, header.length);
+        if (spec.dictionary) return i => values[i] < 0 ? null : spec.dictionary[values[i]];
+        if (spec.bool) return i => values[i] !== 0;
+        if (spec.integer) {
+            return i => {
+                const v = values[i];
+                if (v === spec.null || v !== v) return null;
+                return spec.string ? String(v) : v;
+            };
+        }
+        return i => values[i];
+    });
+
+    const data = new Array(header.length);
+    for (let i = 0; i < header.length; i++) {
+        const row = {};
+        header.columns.forEach((spec, c) => { row[spec.name] = columns[c](i); });
+        data[i] = row;
+    }
+    return { metadata: header.metadata, data, ...(header.sections || {}) };
+}
+
+// Typed arrays use the platform byte order; the columnar file is little-endian
+const LITTLE_ENDIAN = new Uint8Array(new Uint16Array([1]).buffer)[0] === 1;
+
+// Response body as one ArrayBuffer, posting download progress at most every 100 ms.
+// A compressed transfer's Content-Length is not the decoded size, so its total is reported as unknown.
+async function readBody(response) {
+    const encoded = response.headers.get('Content-Encoding');
+    const total = encoded && encoded !== 'identity' ? 0 : Number(response.headers.get('Content-Length')) || 0;
+    if (!response.body) return response.arrayBuffer();
+
+    const reader = response.body.getReader();
+    const chunks = [];
+    let loaded = 0, reported = 0;
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        chunks.push(value);
+        loaded += value.length;
+        if (performance.now() - reported > 100) {
+            progress('fetch', loaded, total);
+            reported = performance.now();
+        }
+    }
+    progress('fetch', loaded, total || loaded);
+    const bytes = new Uint8Array(loaded);
+    let offset = 0;
+    chunks.forEach(chunk => { bytes.set(chunk, offset); offset += chunk.length; });
+    return bytes.buffer;
+}
+
+// Fetch one export document: the columnar file when there is one, else the JSON file
+async function fetchDocument(jsonUrl, binUrl) {
+    if (binUrl && LITTLE_ENDIAN) {
+        try {
+            console.log(`Attempting to load ${binUrl}...`);
+            const response = await fetch(binUrl);
+            if (response.ok) {
+                const buffer = await readBody(response);
+                progress('decode');
+                return timed('decode', () => decodeColumnar(buffer));
+            }
+            console.log(`Columnar data unavailable (HTTP ${response.status}), falling back to JSON`);
+        } catch (error) {
+            console.log('Columnar data unavailable, falling back to JSON:', error.message);
+        }
+    }
+
+    console.log(`Attempting to load ${jsonUrl}...`);
+    const response = await fetch(jsonUrl);
+
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    const buffer = await readBody(response);
+    progress('decode');
+    return timed('decode', () => JSON.parse(new TextDecoder().decode(buffer)));
+}
+
+// Partitioned export (data_processor.py --partitions): manifest first, then one file per year/country
+const PARTITIONS_DIR = 'chess_data_partitions';
+let partitionManifest = null;
+const partitionLoads = new Map();  // partition key -> Promise, so every file is fetched once
+const loadedPartitions = new Set();
+
+async function fetchManifest() {
+    try {
+        const response = await fetch(`${PARTITIONS_DIR}/manifest.json`);
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function mergeIndex(index, part) {
+    const append = (map, key, rows) => map.set(key, (map.get(key) || []).concat(rows));
+    part.byYear.forEach((rows, year) => append(index.byYear, year, rows));
+    part.byCountry.forEach((rows, country) => append(index.byCountry, country, rows));
+    part.byYearGender.forEach((genders, year) => {
+        if (!index.byYearGender.has(year)) index.byYearGender.set(year, new Map());
+        genders.forEach((rows, gender) => append(index.byYearGender.get(year), gender, rows));
+    });
+}
+
+function loadPartition(entry) {
+    if (!partitionLoads.has(entry.key)) {
+        const url = file => file && `${PARTITIONS_DIR}/${file}`;
+        const load = fetchDocument(url(entry.files.json), url(entry.files.columnar)).then(doc => {
+            doc.data.forEach(d => allData.push(d));
+            mergeIndex(dataIndex, buildIndex(doc));
+            histogramCache.clear();
+            summaryCache.clear();
+            loadedPartitions.add(entry.key);
+            console.log(`Partition ${entry.key} loaded (${doc.data.length} groups)`);
+        }).catch(error => {
+            partitionLoads.delete(entry.key);  // allow a retry on the next request
+            throw error;
+        });
+        partitionLoads.set(entry.key, load);
+    }
+    return partitionLoads.get(entry.key);
+}
+
+// Partitions a year view needs: its own file, or every file when partitioned by country
+function partitionsForYear(year) {
+    if (!partitionManifest) return [];
+    return partitionManifest.partitions.filter(p => partitionManifest.partition_by !== 'year' || p.key === year);
+}
+
+// Query API (run_visualization.py --api): the server answers per-chart histograms and totals
+let apiMeta = null;
+const apiLoads = new Map();  // query -> Promise, shared by concurrent requests
+
+async function fetchApiMeta() {
+    try {
+        const response = await fetch('/api/meta');
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function apiGet(endpoint, params) {
+    const query = `/api/${endpoint}?${new URLSearchParams(params)}`;
+    if (!apiLoads.has(query)) {
+        apiLoads.set(query, fetch(query).then(response => {
+            if (!response.ok) throw new Error(`HTTP ${response.status}: ${query}`);
+            return response.json();
+        }).catch(error => {
+            apiLoads.delete(query);
+            throw error;
+        }));
+    }
+    return apiLoads.get(query);
+}
+
+// Histogram and totals of one year (and gender) from /api/histogram, stored where yearHistogram looks
+function loadYearFromApi(year, gender) {
+    const key = `${year}|${gender || ''}`;
+    return apiGet('histogram', gender ? { year, gender } : { year }).then(answer => {
+        histogramCache.set(key, answer.bins);
+        summaryCache.set(key, { count: answer.count, avg: answer.avg ?? undefined });
+    });
+}
+
+// Resolves once the groups (or API answers) the year's genders need are in
+async function ensureYear(year, genders) {
+    if (apiMeta) {
+        const missing = genders.filter(gender => !histogramCache.has(`${year}|${gender || ''}`));
+        await Promise.all(missing.map(gender => loadYearFromApi(year, gender)));
+        return;
+    }
+    await Promise.all(partitionsForYear(year).filter(p => !loadedPartitions.has(p.key)).map(loadPartition));
+}
+
+// Rating histogram of one year (optionally one gender), built once and then served from the cache.
+// Uses the exported per-group histograms when available, otherwise createHistogram's approximation.
+function yearHistogram(year, gender = null) {
+    const key = `${year}|${gender || ''}`;
+    if (histogramCache.has(key)) return histogramCache.get(key);
+
+    const groups = gender
+        ? (dataIndex.byYearGender.get(year) || new Map()).get(gender) || []
+        : dataIndex.byYear.get(year) || [];
+
+    let bins;
+    if (histogramSpec) {
+        const { bin_size: binSize, min_rating: minRating, max_rating: maxRating } = histogramSpec;
+        const counts = new Float64Array((maxRating - minRating) / binSize);
+        groups.forEach(d => {
+            for (let i = 0; i < d.hist_bins.length; i++) counts[d.hist_bins[i]] += d.hist_counts[i];
+        });
+        bins = [];
+        counts.forEach((count, i) => {
+            if (count > 0) bins.push({ start: minRating + i * binSize, end: minRating + (i + 1) * binSize, count });
+        });
+    } else {
+        bins = createHistogram(groups);
+    }
+    histogramCache.set(key, bins);
+    return bins;
+}
+
+// Total records and mean of group mean ratings for a year (optionally one gender), cached like yearHistogram
+function yearSummary(year, gender = null) {
+    const key = `${year}|${gender || ''}`;
+    if (!summaryCache.has(key)) {
+        const groups = gender
+            ? (dataIndex.byYearGender.get(year) || new Map()).get(gender) || []
+            : dataIndex.byYear.get(year) || [];
+        summaryCache.set(key, { count: d3.sum(groups, d => d.count), avg: d3.mean(groups, d => d.mean_rating) });
+    }
+    return summaryCache.get(key);
+}
+
+function createHistogram(yearData) {
+    const minRating = 800, maxRating = 2800, binSize = 50;
+    const bins = [];
+
+    for (let i = minRating; i < maxRating; i += binSize) {
+        bins.push({ start: i, end: i + binSize, count: 0 });
+    }
+
+    yearData.forEach(d => {
+        const binIndex = Math.floor((d.mean_rating - minRating) / binSize);
+        if (binIndex >= 0 && binIndex < bins.length) {
+            bins[binIndex].count += d.count;
+        }
+    });
+
+    return bins.filter(b => b.count > 0);
+}
+
+// x-axis range over the whole export: the exporter's extent, else edges of the non-empty bins,
+// else mean ratings rounded to 50
+function ratingExtent(summary) {
+    if (summary) {
+        // Groups arrive later (or never, with the API); the exporter computed the extent over all of them
+        return summary.rating_extent;
+    }
+    const withBins = histogramSpec ? allData.filter(d => d.hist_bins.length > 0) : [];
+    if (withBins.length > 0) {
+        return {
+            min: histogramSpec.min_rating + histogramSpec.bin_size * d3.min(withBins, d => d.hist_bins[0]),
+            max: histogramSpec.min_rating + histogramSpec.bin_size * d3.max(withBins, d => d.hist_bins[d.hist_bins.length - 1])
+        };
+    }
+    return {
+        min: Math.floor(d3.min(allData, d => d.mean_rating) / 50) * 50,
+        max: Math.ceil(d3.max(allData, d => d.mean_rating) / 50) * 50
+    };
+}
+
+async function loadSource() {
+    progress('fetch');
+    apiMeta = await fetchApiMeta();
+    if (apiMeta) {
+        metadata = apiMeta.metadata;
+        allData = [];
+        console.log(` Query API available: ${apiMeta.years.length} years, ${apiMeta.countries.length} countries`);
+        return 'api';
+    }
+
+    partitionManifest = await fetchManifest();
+    if (partitionManifest) {
+        metadata = partitionManifest.metadata;
+        allData = [];
+        dataIndex = buildIndex({ data: [], index: {
+            by_year: {}, by_country: {}, by_year_gender: {},
+            country_trends: partitionManifest.country_trends,
+            country_summary: partitionManifest.country_summary
+        } });
+        console.log(` Manifest loaded: ${partitionManifest.partitions.length} ${partitionManifest.partition_by} partition(s)`);
+        return 'partitions';
+    }
+
+    const jsonData = await fetchDocument('chess_data_aggregated.json', 'chess_data_aggregated.bin');
+    metadata = jsonData.metadata;
+    allData = jsonData.data;
+    progress('index');
+    dataIndex = timed('index', () => buildIndex(jsonData));
+
+    console.log(' Data loaded successfully');
+    console.log('Records:', allData.length);
+    console.log('Countries:', metadata.countries.length);
+    console.log('Years:', metadata.year_range.min, '-', metadata.year_range.max);
+    return 'file';
+}
+
+// Age-curve export (chess_data_age_curves.json, column lists), fetched on the first ageCurves request.
+// Rows for all countries / all genders have null there; both tables are sorted by their keys.
+const AGE_CURVES_FILE = 'chess_data_age_curves.json';
+let ageCurvesLoad = null;
+
+function indexAgeCurves(doc) {
+    const countries = doc.metadata.countries;
+    const seriesKey = (table, i) => `${table.country[i] === null ? '' : countries[table.country[i]]}|${table.gender[i] || ''}`;
+    const point = (table, i, extra) => ({
+        ...extra,
+        count: table.count[i],
+        mean: table.mean_rating[i],
+        median: table.median_rating[i],
+        p25: table.p25_rating[i],
+        p75: table.p75_rating[i]
+    });
+
+    // 'country|gender' -> points by age
+    const byAge = new Map();
+    doc.by_age.count.forEach((_, i) => {
+        const key = seriesKey(doc.by_age, i);
+        if (!byAge.has(key)) byAge.set(key, []);
+        byAge.get(key).push(point(doc.by_age, i, { age: doc.by_age.age[i] }));
+    });
+
+    // 'country|gender' -> cohort -> points by year
+    const byCohort = new Map();
+    doc.by_cohort.count.forEach((_, i) => {
+        const key = seriesKey(doc.by_cohort, i), cohort = doc.by_cohort.cohort[i];
+        if (!byCohort.has(key)) byCohort.set(key, new Map());
+        const cohorts = byCohort.get(key);
+        if (!cohorts.has(cohort)) cohorts.set(cohort, []);
+        cohorts.get(cohort).push(point(doc.by_cohort, i, { year: doc.by_cohort.year[i] }));
+    });
+    return { metadata: doc.metadata, byAge, byCohort };
+}
+
+function loadAgeCurves() {
+    if (!ageCurvesLoad) {
+        ageCurvesLoad = fetch(AGE_CURVES_FILE).then(async response => {
+            // Absent when the processor ran with --no-age-curves
+            if (!response.ok) return null;
+            const doc = await response.json();
+            return timed('age-index', () => indexAgeCurves(doc));
+        }).catch(error => {
+            console.log('Age curves unavailable:', error.message);
+            return null;
+        });
+    }
+    return ageCurvesLoad;
+}
+
+const handlers = {
+    async load() {
+        const mode = await loadSource();
+        const summary = apiMeta || partitionManifest;
+        allYears = summary ? summary.years : [...dataIndex.byYear.keys()].sort((a, b) => a - b);
+        histogramSpec = metadata.histogram && allData.every(d => d.hist_bins) ? metadata.histogram : null;
+        return { mode, metadata, years: allYears, ratingExtent: ratingExtent(summary) };
+    },
+
+    async year({ year, genders }) {
+        await ensureYear(year, genders);
+        const histograms = {}, summaries = {};
+        genders.forEach(gender => {
+            histograms[gender || ''] = yearHistogram(year, gender);
+            summaries[gender || ''] = yearSummary(year, gender);
+        });
+        return { histograms, summaries };
+    },
+
+    async country({ country }) {
+        if (apiMeta && !dataIndex.countryTrends.has(country)) {
+            const answer = await apiGet('country', { country });
+            dataIndex.countryTrends.set(country, answer.trend);
+            dataIndex.countrySummary.set(country, answer.summary);
+        }
+        return { trend: dataIndex.countryTrends.get(country) || [], summary: dataIndex.countrySummary.get(country) };
+    },
+
+    async ageCurves({ country }) {
+        const curves = await loadAgeCurves();
+        if (!curves) return null;
+        const key = gender => `${country || ''}|${gender}`;
+        return {
+            metadata: curves.metadata,
+            // '' is every gender together
+            byAge: Object.fromEntries(['', 'M', 'F'].map(gender => [gender, curves.byAge.get(key(gender)) || []])),
+            cohorts: [...(curves.byCohort.get(key('')) || new Map())].map(([cohort, points]) => ({ cohort, points }))
+        };
+    }
+};
+
+self.onmessage = async ({ data: message }) => {
+    try {
+        const result = await handlers[message.type](message);
+        self.postMessage({ id: message.id, result });
+    } catch (error) {
+        self.postMessage({ id: message.id, error: error.message });
+    }
+};